@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+""" cron-notify benchmark
+
+Benchmarks cron-notify with 10 to 10,000 cronjobs without requiring a system
+bus or notification daemon: DBus (incl. login1 and UPower) and the
+notification service are replaced by in-process stand-ins, whereas GLib's main
+loop is real. Every job count is benchmarked in a separate process, the
+results are written as JSON and can be compared across commits.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3 of the License only.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse, datetime, json, os, platform, subprocess, sys, tempfile, time, types
+
+__app__ = os.path.basename(sys.argv[0])
+
+CRON_EXPRESSIONS = [ "*/5 * * * *", "0 * * * *", "30 12 * * *", "0 3 * * 1", "15 */2 * * *", "0 0 1 * *" ]
+
+class FakeBus(object):
+    _receivers = None
+    _properties = None
+
+    def __init__(self):
+        self._receivers = []
+        self._properties = {
+            ( "/org/freedesktop/UPower", "OnBattery" ): False,
+            ( "/org/freedesktop/UPower/devices/DisplayDevice", "IsPresent" ): True,
+            ( "/org/freedesktop/UPower/devices/DisplayDevice", "Percentage" ): 100.0
+        }
+
+    def add_signal_receiver(self, callback, dbus_interface=None, signal_name=None, bus_name=None, path=None):
+        receiver = FakeSignalReceiver(self, ( dbus_interface, signal_name, path ), callback)
+        self._receivers.append(receiver)
+        return receiver
+
+    def removeReceiver(self, receiver):
+        self._receivers.remove(receiver)
+
+    def get_object(self, busName, path):
+        return FakeBusObject(self, path)
+
+    def getProperty(self, path, name):
+        return self._properties.get(( path, name ))
+
+    def emit(self, interface, signal, path, *args):
+        for receiver in list(self._receivers):
+            if receiver.key == ( interface, signal, path ):
+                receiver.callback(*args)
+
+class FakeSignalReceiver(object):
+    def __init__(self, bus, key, callback):
+        self.bus = bus
+        self.key = key
+        self.callback = callback
+
+    def remove(self):
+        self.bus.removeReceiver(self)
+
+class FakeBusObject(object):
+    def __init__(self, bus, path):
+        self.bus = bus
+        self.path = path
+
+    def Get(self, interface, name, dbus_interface=None):
+        return self.bus.getProperty(self.path, name)
+
+class FakeNotificationServer(object):
+    shown = 0
+    closed = 0
+
+class FakeNotification(object):
+    def __init__(self, summary, message="", icon=""):
+        self.summary = summary
+        self.message = message
+        self.icon = icon
+        self.closeCallback = None
+
+    def set_urgency(self, urgency):
+        pass
+
+    def set_timeout(self, timeout):
+        pass
+
+    def set_category(self, category):
+        pass
+
+    def add_action(self, action, label, callback, userData=None):
+        pass
+
+    def connect(self, event, callback):
+        self.closeCallback = callback
+
+    def show(self):
+        FakeNotificationServer.shown += 1
+        return True
+
+    def close(self):
+        FakeNotificationServer.closed += 1
+        if self.closeCallback is not None:
+            self.closeCallback(self)
+
+def installStandIns():
+    systemBus = FakeBus()
+
+    class DBusException(Exception):
+        pass
+
+    dbusModule = types.ModuleType("dbus")
+    dbusModule.PROPERTIES_IFACE = "org.freedesktop.DBus.Properties"
+    dbusModule.SystemBus = lambda: systemBus
+    dbusModule.exceptions = types.ModuleType("dbus.exceptions")
+    dbusModule.exceptions.DBusException = DBusException
+    dbusModule.mainloop = types.ModuleType("dbus.mainloop")
+    dbusModule.mainloop.glib = types.ModuleType("dbus.mainloop.glib")
+    dbusModule.mainloop.glib.DBusGMainLoop = lambda set_as_default=False: None
+
+    notifyModule = types.ModuleType("notify2")
+    notifyModule.URGENCY_NORMAL = 1
+    notifyModule.EXPIRES_NEVER = 0
+    notifyModule.init = lambda app, mainloop=None: True
+    notifyModule.is_initted = lambda: True
+    notifyModule.get_server_caps = lambda: [ "actions", "body" ]
+    notifyModule.Notification = FakeNotification
+
+    sys.modules.update({
+        "dbus": dbusModule,
+        "dbus.exceptions": dbusModule.exceptions,
+        "dbus.mainloop": dbusModule.mainloop,
+        "dbus.mainloop.glib": dbusModule.mainloop.glib,
+        "pynotify": notifyModule,
+        "notify2": notifyModule
+    })
+
+    return systemBus
+
+def getRss():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def getPercentile(values, percentile):
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(int(round(percentile / 100 * (len(values) - 1))), len(values) - 1)]
+
+def iterateMainLoop(cron_notify, seconds):
+    mainLoop = cron_notify.GLib.MainLoop()
+    cron_notify.GLib.timeout_add(int(seconds * 1000), mainLoop.quit)
+    mainLoop.run()
+
+def countProjectedWakeups(cron_notify, cronNotifies, hours=1):
+    # the scheduler dispatches all timers due within its batch window at once
+    now = datetime.datetime.today().replace(microsecond=0)
+    horizon = now + datetime.timedelta(hours=hours)
+    batchWindow = cron_notify.Scheduler._batchWindow
+
+    executionTimes = set()
+    for cronNotify in cronNotifies:
+        cronExpression = cron_notify.CronExpression.compile(cronNotify.cronExpression)
+
+        executionTime = cronExpression.getNext(now)
+        while executionTime < horizon:
+            executionTimes.add(executionTime)
+            executionTime = cronExpression.getNext(executionTime)
+
+    wakeups = 0
+    batchEnd = None
+    for executionTime in sorted(executionTimes):
+        if batchEnd is None or executionTime > batchEnd:
+            wakeups += 1
+            batchEnd = executionTime + batchWindow
+
+    return wakeups / hours
+
+def benchmark(jobCount, catchUp=0, idleSeconds=2):
+    systemBus = installStandIns()
+
+    import cron_notify
+
+    metrics = cron_notify.Metrics.getInstance()
+    metrics.enabled = True
+    cron_notify.CatchUpPlanner.getInstance().window = catchUp
+
+    results = { "jobs": jobCount }
+
+    # startup: create and initialize all cronjobs, none of them is due yet
+    state = cron_notify.StateStore.getInstance()
+    now = int(time.time())
+
+    rssBefore = getRss()
+    startTime = time.monotonic()
+
+    cronNotifies = []
+    for index in range(jobCount):
+        cronNotify = cron_notify.CronNotify([ [ "true" ] ], app="cron-notify-bench", id="job{}".format(index))
+        cronNotify.logger.setLevel(cron_notify.logging.CRITICAL)
+        cronNotify.cronExpression = CRON_EXPRESSIONS[index % len(CRON_EXPRESSIONS)]
+
+        state.setLastExecution(cronNotify.app, cronNotify.id, now)
+        cronNotifies.append(cronNotify)
+
+    cron_notify.CronNotify.mainBatch(cronNotifies)
+
+    iterateMainLoop(cron_notify, 0.1)
+
+    results["startupSeconds"] = time.monotonic() - startTime - 0.1
+    results["rssPerJobKiB"] = (getRss() - rssBefore) / jobCount / 1024
+
+    # wakeups: the projection is based on the cronjobs' schedules, the measurement on an idle period
+    results["projectedWakeupsPerHour"] = countProjectedWakeups(cron_notify, cronNotifies)
+
+    wakeupsBefore = sum(value for ( name, labels ), value in metrics._counters.items() if name == "timer_wakeups_total")
+    iterateMainLoop(cron_notify, idleSeconds)
+    wakeupsAfter = sum(value for ( name, labels ), value in metrics._counters.items() if name == "timer_wakeups_total")
+    results["idleWakeups"] = { "seconds": idleSeconds, "count": wakeupsAfter - wakeupsBefore }
+
+    # scheduling latency: add timers spread over one second and measure how late they fire
+    scheduler = cron_notify.Scheduler.getInstance()
+    latencies = []
+
+    def createTimerCallback(timeoutTime):
+        return lambda: latencies.append((datetime.datetime.today() - timeoutTime).total_seconds() * 1000)
+
+    timerCount = min(jobCount, 1000)
+    firstTimeoutTime = datetime.datetime.today() + datetime.timedelta(0, 0.5)
+    for index in range(timerCount):
+        timeoutTime = firstTimeoutTime + datetime.timedelta(0, index / timerCount)
+        scheduler.add(timeoutTime, createTimerCallback(timeoutTime))
+
+    iterateMainLoop(cron_notify, 2)
+
+    results["schedulingLatencyMs"] = {
+        "timers": timerCount,
+        "fired": len(latencies),
+        "p50": getPercentile(latencies, 50),
+        "p95": getPercentile(latencies, 95),
+        "max": max(latencies) if latencies else None
+    }
+
+    # resume storm: pretend all timers expired while the system was suspended
+    for cronNotify in cronNotifies:
+        if cronNotify._timeoutId is not None:
+            cronNotify._timeoutTime = datetime.datetime.today() - datetime.timedelta(hours=1)
+
+    startTime = time.monotonic()
+    systemBus.emit("org.freedesktop.login1.Manager", "PrepareForSleep", "/org/freedesktop/login1", True)
+    systemBus.emit("org.freedesktop.login1.Manager", "PrepareForSleep", "/org/freedesktop/login1", False)
+    resumeSeconds = time.monotonic() - startTime
+
+    iterateMainLoop(cron_notify, 0.1)
+
+    timeoutSeconds = {}
+    for cronNotify in cronNotifies:
+        if cronNotify._timeoutTime is not None:
+            timeoutSecond = cronNotify._timeoutTime.replace(microsecond=0)
+            timeoutSeconds[timeoutSecond] = timeoutSeconds.get(timeoutSecond, 0) + 1
+
+    results["resumeStorm"] = {
+        "catchUpWindow": catchUp,
+        "handlingSeconds": resumeSeconds,
+        "maxTimersPerSecond": max(timeoutSeconds.values()) if timeoutSeconds else 0,
+        "distinctSeconds": len(timeoutSeconds)
+    }
+
+    return results
+
+def compareResults(oldResults, newResults):
+    lines = []
+
+    def walk(oldValue, newValue, path):
+        if isinstance(newValue, dict):
+            for key in newValue:
+                if isinstance(oldValue, dict) and key in oldValue:
+                    walk(oldValue[key], newValue[key], path + [ key ])
+        elif isinstance(newValue, (int, float)) and isinstance(oldValue, (int, float)) and path[-1] != "jobs":
+            change = "{:+.1f}%".format((newValue - oldValue) / oldValue * 100) if oldValue else "n/a"
+            lines.append("{:<50} {:>14.4f} {:>14.4f} {:>10}".format(".".join(path), oldValue, newValue, change))
+
+    oldRuns = { run["jobs"]: run for run in oldResults["runs"] }
+    for newRun in newResults["runs"]:
+        if newRun["jobs"] in oldRuns:
+            walk(oldRuns[newRun["jobs"]], newRun, [ str(newRun["jobs"]) ])
+
+    return lines
+
+def getCommit():
+    try:
+        return subprocess.check_output(
+            [ "git", "rev-parse", "--short", "HEAD" ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+try:
+    argumentParser = argparse.ArgumentParser(description="Benchmarks cron-notify using in-process stand-ins for " +
+        "DBus and the notification service.")
+    argumentParser.add_argument("--jobs", dest="jobs", default="10,100,1000,10000", metavar="COUNTS",
+        help="Comma-separated list of job counts to benchmark (default: 10,100,1000,10000)")
+    argumentParser.add_argument("--catch-up", dest="catchUp", type=int, default=0, metavar="SECONDS",
+        help="Spread overdue cronjobs over SECONDS after resuming (see cron-notify --catch-up; default: 0)")
+    argumentParser.add_argument("--idle", dest="idle", type=float, default=2, metavar="SECONDS",
+        help="Number of seconds to count wakeups of the idle scheduler (default: 2)")
+    argumentParser.add_argument("--output", dest="output", metavar="FILE",
+        help="Write the results to FILE instead of stdout")
+    argumentParser.add_argument("--compare", dest="compare", metavar="FILE",
+        help="Compare the results with previous results read from FILE")
+    argumentParser.add_argument("--worker", dest="worker", type=int, help=argparse.SUPPRESS)
+
+    args = argumentParser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    if args.worker is not None:
+        json.dump(benchmark(args.worker, args.catchUp, args.idle), sys.stdout)
+        sys.exit(0)
+
+    results = {
+        "commit": getCommit(),
+        "date": datetime.datetime.today().isoformat(),
+        "python": platform.python_version(),
+        "runs": []
+    }
+
+    for jobCount in [ int(jobCount) for jobCount in args.jobs.split(",") ]:
+        sys.stderr.write("{}: benchmarking {} jobs...\n".format(__app__, jobCount))
+
+        # every run uses a fresh process and cache directory, cron-notify's singletons and caches are process-wide
+        with tempfile.TemporaryDirectory(prefix="cron-notify-bench-") as cacheDir:
+            environment = dict(os.environ, XDG_CACHE_HOME=cacheDir)
+            output = subprocess.check_output([
+                sys.executable, os.path.abspath(__file__),
+                "--worker", str(jobCount), "--catch-up", str(args.catchUp), "--idle", str(args.idle)
+            ], env=environment)
+
+        results["runs"].append(json.loads(output.decode("utf-8")))
+
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            json.dump(results, outputFile, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+    if args.compare:
+        with open(args.compare) as compareFile:
+            sys.stderr.write("{:<50} {:>14} {:>14} {:>10}\n".format("METRIC", "OLD", "NEW", "CHANGE"))
+            for line in compareResults(json.load(compareFile), results):
+                sys.stderr.write(line + "\n")
+except subprocess.CalledProcessError as error:
+    sys.stderr.write("{}: benchmark failed with exit status {}\n".format(__app__, error.returncode))
+    sys.exit(1)
+except KeyboardInterrupt:
+    sys.exit(130)
@@ -23,112 +23,3852 @@ __version__ = "1.0.6"
 __copyright__ = "Copyright (C) 2016-2024 Daniel Rudolf"
 __license__ = "GPL-3"
 
-import croniter, datetime, dbus, dbus.mainloop.glib, errno, hashlib, logging, os, re, subprocess, sys, threading
-from gi.repository import GObject
-from xdg import BaseDirectory
+import bisect, calendar, collections, contextlib, ctypes, ctypes.util, datetime, errno, gzip, hashlib, heapq, html
+import importlib, json, logging, logging.handlers, math, os, pwd, re, shutil, signal, socket, sqlite3, struct
+import subprocess, sys, threading, time
+
+class LazyModule(object):
+    _names = None
+    _submodules = None
+    _module = None
+
+    def __init__(self, *names, submodules=()):
+        self._names = names
+        self._submodules = submodules
+
+    def load(self):
+        if self._module is None:
+            for index, name in enumerate(self._names):
+                try:
+                    module = importlib.import_module(name)
+                    break
+                except ImportError:
+                    if index == len(self._names) - 1:
+                        raise
+
+            for submodule in self._submodules:
+                importlib.import_module(submodule)
+
+            self._module = module
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+# GObject introspection, DBus and libnotify are expensive to import and unavailable on headless hosts, thus import
+# them when they are actually used (i.e. not for `--help`, `--version` or `--check`)
+croniter = LazyModule("croniter")
+dbus = LazyModule("dbus", submodules=( "dbus.exceptions", "dbus.mainloop.glib" ))
+GLib = LazyModule("gi.repository.GLib")
+GObject = LazyModule("gi.repository.GObject")
+BaseDirectory = LazyModule("xdg.BaseDirectory")
+pynotify = LazyModule("pynotify", "notify2")
+
+class Clock(object):
+    @property
+    def virtual(self):
+        return False
+
+    def now(self):
+        return datetime.datetime.today()
+
+    def monotonic(self):
+        return time.monotonic()
+
+class VirtualClock(Clock):
+    _now = None
+
+    def __init__(self, now):
+        self._now = now
+
+    @property
+    def virtual(self):
+        return True
+
+    def now(self):
+        return self._now
+
+    def monotonic(self):
+        return self._now.timestamp()
+
+    def advance(self, now):
+        # virtual time never goes backwards, timers due in the past are simply late
+        if now > self._now:
+            self._now = now
+
+class WallClockTimer(object):
+    _CLOCK_REALTIME = 0
+    _TFD_TIMER_ABSTIME = 1
+    _TFD_TIMER_CANCEL_ON_SET = 2
+
+    _libc = None
+    _fd = None
+
+    class _itimerspec(ctypes.Structure):
+        _fields_ = [ ("it_interval", ctypes.c_long * 2), ("it_value", ctypes.c_long * 2) ]
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+        fd = self._libc.timerfd_create(self._CLOCK_REALTIME, os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        self._fd = fd
+
+    def fileno(self):
+        return self._fd
+
+    def arm(self, timestamp):
+        seconds = int(timestamp)
+        nanoseconds = int((timestamp - seconds) * 1000000000)
+
+        timerSpec = self._itimerspec()
+        timerSpec.it_value[0] = seconds
+        timerSpec.it_value[1] = nanoseconds
+
+        flags = self._TFD_TIMER_ABSTIME | self._TFD_TIMER_CANCEL_ON_SET
+        if self._libc.timerfd_settime(self._fd, flags, ctypes.byref(timerSpec), None) < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def read(self):
+        try:
+            os.read(self._fd, 8)
+        except OSError as error:
+            if error.errno == errno.ECANCELED:
+                return False
+            if error.errno == errno.EAGAIN:
+                return None
+            raise
+
+        return True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+class _ExtendedSyntaxError(Exception):
+    pass
+
+class CronExpression(object):
+    _FIELDS = (
+        ( "minute", 0, 59, None ),
+        ( "hour", 0, 23, None ),
+        ( "day of month", 1, 31, None ),
+        ( "month", 1, 12, ( "jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec" ) ),
+        ( "day of week", 0, 7, ( "sun", "mon", "tue", "wed", "thu", "fri", "sat" ) )
+    )
+
+    _ALIASES = {
+        "@yearly": "0 0 1 1 *",
+        "@annually": "0 0 1 1 *",
+        "@monthly": "0 0 1 * *",
+        "@weekly": "0 0 * * 0",
+        "@daily": "0 0 * * *",
+        "@midnight": "0 0 * * *",
+        "@hourly": "0 * * * *"
+    }
+
+    _FIELD_PATTERN = re.compile(r'^(?:(\*)|(\w+)(?:-(\w+))?)(?:/(\d+))?$')
+
+    _MAX_SEARCH_YEARS = 8
+
+    _cache = {}
+
+    _expression = None
+    _masks = None
+    _dayRestrictions = None
+    _croniterExpression = None
+    _monthDayMasks = None
+
+    def __init__(self, expression):
+        self._expression = expression
+        self._monthDayMasks = {}
+
+        try:
+            self._masks, self._dayRestrictions = self._parse(self._ALIASES.get(expression.strip().lower(), expression))
+        except _ExtendedSyntaxError:
+            # let croniter handle its extended syntax (e.g. seconds, "L", "W", "#" or hashed expressions)
+            croniter.croniter(expression, datetime.datetime.today()).get_next(datetime.datetime)
+            self._croniterExpression = expression
+            return
+
+        self.getNext(datetime.datetime.today())
+
+    @classmethod
+    def compile(cls, expression):
+        cronExpression = cls._cache.get(expression)
+        if cronExpression is None:
+            cronExpression = cls._cache[expression] = cls(expression)
+        return cronExpression
+
+    @classmethod
+    def getNextBatch(cls, items):
+        nextExecutions = []
+        nextExecutionsCache = {}
+
+        # many cronjobs share the same cron expression and (e.g. on their first start) the same start time
+        for expression, start in items:
+            if not isinstance(expression, cls):
+                expression = cls.compile(expression)
+
+            key = ( expression._expression, start )
+            if key not in nextExecutionsCache:
+                nextExecutionsCache[key] = expression.getNext(start)
+
+            nextExecutions.append(nextExecutionsCache[key])
+
+        return nextExecutions
+
+    @property
+    def expression(self):
+        return self._expression
+
+    def getNext(self, start):
+        # the bitmasks match wall-clock times; leave skipped and repeated times of timezone-aware dates to croniter
+        if self._croniterExpression is not None or start.tzinfo is not None:
+            return croniter.croniter(self._expression, start).get_next(datetime.datetime)
+
+        minuteMask, hourMask, _, monthMask, _ = self._masks
+
+        start = start.replace(second=0, microsecond=0) + datetime.timedelta(0, 60)
+        year, month, day, hour, minute = start.year, start.month, start.day, start.hour, start.minute
+
+        while year <= start.year + self._MAX_SEARCH_YEARS:
+            nextMonth = self._nextBit(monthMask, month)
+            if nextMonth is None:
+                year, month, day, hour, minute = year + 1, 1, 1, 0, 0
+                continue
+            elif nextMonth != month:
+                month, day, hour, minute = nextMonth, 1, 0, 0
+
+            nextDay = self._nextBit(self._getMonthDayMask(year, month), day)
+            if nextDay is None:
+                month, day, hour, minute = month + 1, 1, 0, 0
+                continue
+            elif nextDay != day:
+                day, hour, minute = nextDay, 0, 0
+
+            nextHour = self._nextBit(hourMask, hour)
+            if nextHour is None:
+                day, hour, minute = day + 1, 0, 0
+                continue
+            elif nextHour != hour:
+                hour, minute = nextHour, 0
+
+            nextMinute = self._nextBit(minuteMask, minute)
+            if nextMinute is None:
+                hour, minute = hour + 1, 0
+                continue
+
+            return datetime.datetime(year, month, day, hour, nextMinute)
+
+        raise ValueError("Invalid cron expression '{}': No matching date found".format(self._expression))
+
+    def _getMonthDayMask(self, year, month):
+        firstWeekday, monthLength = calendar.monthrange(year, month)
+        firstDayOfWeek = (firstWeekday + 1) % 7
+
+        key = ( firstDayOfWeek, monthLength )
+        if key not in self._monthDayMasks:
+            _, _, dayOfMonthMask, _, dayOfWeekMask = self._masks
+            dayOfMonthRestricted, dayOfWeekRestricted = self._dayRestrictions
+
+            validDaysMask = ((1 << monthLength) - 1) << 1
+            weekdaysMask = 0
+            if dayOfWeekRestricted:
+                for day in range(1, monthLength + 1):
+                    if dayOfWeekMask & (1 << ((firstDayOfWeek + day - 1) % 7)):
+                        weekdaysMask |= 1 << day
+
+            if dayOfMonthRestricted and dayOfWeekRestricted:
+                monthDayMask = (dayOfMonthMask & validDaysMask) | weekdaysMask
+            elif dayOfWeekRestricted:
+                monthDayMask = weekdaysMask
+            else:
+                monthDayMask = dayOfMonthMask & validDaysMask
+
+            self._monthDayMasks[key] = monthDayMask
+
+        return self._monthDayMasks[key]
+
+    def _parse(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            if len(fields) in ( 6, 7 ):
+                raise _ExtendedSyntaxError()
+            raise ValueError("Invalid cron expression '{}': Exactly 5 fields expected".format(expression))
+
+        masks = []
+        for index, field in enumerate(fields):
+            name, minValue, maxValue, _ = self._FIELDS[index]
+
+            mask = 0
+            for part in field.split(","):
+                match = self._FIELD_PATTERN.match(part.lower())
+                if not match or re.search(r'[?#]|\b[lwh]\b|\d[lw]|l\d|^l', part.lower()):
+                    if re.search(r'[?#lwh]', part.lower()):
+                        raise _ExtendedSyntaxError()
+                    raise ValueError("Invalid cron expression '{}': Invalid {} '{}'".format(expression, name, part))
+
+                wildcard, first, last, step = match.groups()
+                step = int(step) if step is not None else 1
+
+                if wildcard:
+                    first, last = minValue, maxValue
+                else:
+                    first = self._parseValue(expression, index, first)
+                    if last is not None:
+                        last = self._parseValue(expression, index, last)
+                    elif match.group(4) is not None:
+                        last = maxValue if index != 4 else 6
+                    else:
+                        last = first
+
+                if step < 1:
+                    raise ValueError(
+                        "Invalid cron expression '{}': Invalid step in {} '{}'".format(expression, name, part)
+                    )
+                if first > last:
+                    raise _ExtendedSyntaxError()
+
+                for value in range(first, last + 1, step):
+                    mask |= 1 << value
+
+            masks.append(mask)
+
+        # Sunday might be given as both 0 and 7
+        if masks[4] & (1 << 7):
+            masks[4] = (masks[4] & ~(1 << 7)) | 1
+
+        # if both day of month and day of week are restricted, a day matching either of them matches (like croniter);
+        # a field covering its whole range only counts as unrestricted if the other field uses a wildcard
+        dayOfMonthRestricted = "*" not in fields[2].split(",") \
+            and not (masks[2] == self._fullMask(2) and "*" in fields[4])
+        dayOfWeekRestricted = "*" not in fields[4].split(",") \
+            and not (masks[4] == self._fullMask(4) and "*" in fields[2])
+
+        return tuple(masks), ( dayOfMonthRestricted, dayOfWeekRestricted )
+
+    def _parseValue(self, expression, index, value):
+        name, minValue, maxValue, names = self._FIELDS[index]
+
+        if value.isdigit():
+            value = int(value)
+        elif names is not None and value in names:
+            value = names.index(value) + minValue
+        else:
+            raise ValueError("Invalid cron expression '{}': Invalid {} '{}'".format(expression, name, value))
+
+        if value < minValue or value > maxValue:
+            raise ValueError("Invalid cron expression '{}': {} {} is out of range".format(expression, name, value))
+
+        return value
+
+    @classmethod
+    def _fullMask(cls, index):
+        _, minValue, maxValue, _ = cls._FIELDS[index]
+        if index == 4:
+            maxValue = 6
+        return ((1 << (maxValue - minValue + 1)) - 1) << minValue
+
+    @staticmethod
+    def _nextBit(mask, start):
+        mask >>= start
+        if not mask:
+            return None
+        return start + (mask & -mask).bit_length() - 1
+
+class Inotify(object):
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_IGNORED = 0x00008000
+
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    _libc = None
+    _fd = None
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        self._fd = fd
+
+    def fileno(self):
+        return self._fd
+
+    def addWatch(self, path, mask):
+        watchDescriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if watchDescriptor < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+
+        return watchDescriptor
+
+    def removeWatch(self, watchDescriptor):
+        self._libc.inotify_rm_watch(self._fd, watchDescriptor)
+
+    def read(self):
+        events = []
+
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as error:
+                if error.errno == errno.EAGAIN:
+                    break
+                raise
+
+            offset = 0
+            while offset < len(data):
+                watchDescriptor, mask, cookie, nameLength = self._EVENT_HEADER.unpack_from(data, offset)
+                offset += self._EVENT_HEADER.size
+
+                name = os.fsdecode(data[offset:offset + nameLength].rstrip(b"\0"))
+                offset += nameLength
+
+                events.append(( watchDescriptor, mask, cookie, name ))
+
+        return events
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+class Metrics(object):
+    _instance = None
+
+    _COUNTER = "counter"
+    _HISTOGRAM = "histogram"
+
+    _SHORT_BUCKETS = ( 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5 )
+    _LONG_BUCKETS = ( 1, 5, 15, 60, 300, 900, 3600, 14400 )
+
+    _DEFINITIONS = {
+        "timer_wakeups_total": (
+            _COUNTER, "Number of scheduler wakeups, by whether any timer was due", None
+        ),
+        "scheduling_drift_seconds": (
+            _HISTOGRAM, "Delay between a cronjob's scheduled and actual wakeup", _SHORT_BUCKETS
+        ),
+        "notification_latency_seconds": (
+            _HISTOGRAM, "Time needed to send a notification", _SHORT_BUCKETS
+        ),
+        "notification_response_seconds": (
+            _HISTOGRAM, "Time until the user responded to a notification, by response", _LONG_BUCKETS
+        ),
+        "command_duration_seconds": (
+            _HISTOGRAM, "Duration of commands, by cronjob", _LONG_BUCKETS
+        ),
+        "command_exit_status_total": (
+            _COUNTER, "Number of finished commands, by cronjob and exit status", None
+        ),
+        "run_duration_seconds": (
+            _HISTOGRAM, "Duration of cronjob runs, by cronjob and overall status", _LONG_BUCKETS
+        ),
+        "dbus_reconnects_total": (
+            _COUNTER, "Number of times the notification service was re-initialized after DBus failures", None
+        )
+    }
+
+    _prefix = "cron_notify_"
+
+    _enabled = False
+    _lock = None
+
+    _counters = None
+    _histograms = None
+
+    _exportPath = None
+    _exportInterval = 15
+    _exportTimeoutId = None
+
+    _logger = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "metrics"))
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled):
+        self._enabled = not not enabled
+
+    def increment(self, name, labels=None, value=1):
+        if not self._enabled:
+            return
+
+        key = ( name, tuple(sorted(labels.items())) if labels else () )
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+        self._scheduleExport()
+
+    def observe(self, name, value, labels=None):
+        if not self._enabled:
+            return
+
+        buckets = self._DEFINITIONS[name][2]
+
+        key = ( name, tuple(sorted(labels.items())) if labels else () )
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [ [ 0 ] * len(buckets), 0.0, 0 ]
+
+            bucketIndex = bisect.bisect_left(buckets, value)
+            if bucketIndex < len(buckets):
+                histogram[0][bucketIndex] += 1
+
+            histogram[1] += value
+            histogram[2] += 1
+
+        self._scheduleExport()
+
+    def toDict(self):
+        metrics = {}
+
+        with self._lock:
+            for ( name, labels ), value in sorted(self._counters.items()):
+                metrics.setdefault(self._prefix + name, []).append({ "labels": dict(labels), "value": value })
+
+            for ( name, labels ), ( bucketCounts, total, count ) in sorted(self._histograms.items()):
+                metrics.setdefault(self._prefix + name, []).append({
+                    "labels": dict(labels),
+                    "buckets": dict(zip(self._DEFINITIONS[name][2], self._accumulate(bucketCounts))),
+                    "sum": total,
+                    "count": count
+                })
+
+        return metrics
+
+    def toPrometheus(self):
+        lines = []
+
+        with self._lock:
+            for name, ( metricType, description, buckets ) in sorted(self._DEFINITIONS.items()):
+                if metricType == self._COUNTER:
+                    series = sorted(( labels, value ) for ( seriesName, labels ), value in self._counters.items()
+                        if seriesName == name)
+                else:
+                    series = sorted(( labels, value ) for ( seriesName, labels ), value in self._histograms.items()
+                        if seriesName == name)
+
+                if not series:
+                    continue
+
+                lines.append("# HELP {}{} {}".format(self._prefix, name, description))
+                lines.append("# TYPE {}{} {}".format(self._prefix, name, metricType))
+
+                for labels, value in series:
+                    if metricType == self._COUNTER:
+                        lines.append("{}{}{} {}".format(self._prefix, name, self._formatLabels(labels), value))
+                        continue
+
+                    bucketCounts, total, count = value
+                    for bucket, bucketCount in zip(buckets + ( "+Inf", ), self._accumulate(bucketCounts) + [ count ]):
+                        bucketLabels = labels + (( "le", str(bucket) ),)
+                        lines.append("{}{}_bucket{} {}".format(
+                            self._prefix,
+                            name,
+                            self._formatLabels(bucketLabels),
+                            bucketCount
+                        ))
+
+                    lines.append("{}{}_sum{} {}".format(self._prefix, name, self._formatLabels(labels), total))
+                    lines.append("{}{}_count{} {}".format(self._prefix, name, self._formatLabels(labels), count))
+
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def startExport(self, path, interval=None):
+        self._exportPath = path
+        if interval is not None:
+            self._exportInterval = interval
+
+        self.writeTextfile(path)
+
+    def writeTextfile(self, path):
+        temporaryPath = "{}.{}.tmp".format(path, os.getpid())
+
+        try:
+            with open(temporaryPath, "w") as textfile:
+                textfile.write(self.toPrometheus())
+            os.replace(temporaryPath, path)
+        except OSError as error:
+            self._logger.error(
+                "While writing the metrics textfile, a exception occurred: %s: %s",
+                type(error).__name__,
+                str(error)
+            )
+
+    def _scheduleExport(self):
+        # export changed metrics in batches, but don't wake up regularly if nothing changed
+        if self._exportPath is not None and self._exportTimeoutId is None:
+            scheduler = Scheduler.getInstance()
+            exportTime = scheduler.clock.now() + datetime.timedelta(0, self._exportInterval)
+            self._exportTimeoutId = scheduler.add(exportTime, self._exportCallback)
+
+    def _exportCallback(self):
+        self._exportTimeoutId = None
+        self.writeTextfile(self._exportPath)
+
+    @staticmethod
+    def _accumulate(bucketCounts):
+        cumulativeCounts = []
+        for bucketCount in bucketCounts:
+            cumulativeCounts.append((cumulativeCounts[-1] if cumulativeCounts else 0) + bucketCount)
+        return cumulativeCounts
+
+    @staticmethod
+    def _formatLabels(labels):
+        if not labels:
+            return ""
+
+        return "{" + ",".join('{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        ) for name, value in labels) + "}"
+
+class Scheduler(object):
+    _instance = None
+
+    _queue = None
+    _sequence = 0
+    _lock = None
+
+    _batchWindow = datetime.timedelta(0, 0.5)
+    _maxSleepTime = 3600
+    _idleSleepTime = 86400 * 365
+
+    _clockTimer = None
+    _clockTimerWatchId = None
+    _clockTimerInitialized = False
+
+    _timeoutId = None
+    _timeoutTime = None
+
+    _clock = None
+
+    _logger = None
+
+    def __init__(self, clock=None):
+        self._queue = []
+        self._lock = threading.RLock()
+        self._clock = clock if clock is not None else Clock()
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "scheduler"))
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def clock(self):
+        return self._clock
+
+    def add(self, timeoutTime, callback):
+        with self._lock:
+            self._sequence += 1
+
+            entry = [ timeoutTime, self._sequence, callback ]
+            heapq.heappush(self._queue, entry)
+
+            self._arm()
+
+        return entry
+
+    def remove(self, entry):
+        with self._lock:
+            entry[2] = None
+            self._arm()
+
+    def runUntil(self, endTime):
+        # with a virtual clock there's nothing to wait for, thus jump from one timer to the next
+        while True:
+            with self._lock:
+                while self._queue and self._queue[0][2] is None:
+                    heapq.heappop(self._queue)
+
+                if not self._queue or self._queue[0][0] > endTime:
+                    break
+
+                self._clock.advance(self._queue[0][0])
+
+            self._dispatch()
+
+        self._clock.advance(endTime)
+
+    def _initClockTimer(self):
+        self._clockTimerInitialized = True
+
+        try:
+            self._clockTimer = WallClockTimer()
+            self._clockTimerWatchId = GLib.io_add_watch(
+                self._clockTimer.fileno(),
+                GLib.PRIORITY_DEFAULT,
+                GLib.IO_IN,
+                self._clockTimerCallback
+            )
+        except (AttributeError, OSError) as error:
+            self._logger.debug(
+                "Unable to create wall-clock timer, falling back to polling: %s: %s",
+                type(error).__name__,
+                str(error)
+            )
+
+            self._clockTimer = None
+
+    def _arm(self, force=False):
+        if self._clock.virtual:
+            return
+
+        # the wall-clock timer is created on first use, so that merely creating cronjobs doesn't require GLib
+        if not self._clockTimerInitialized:
+            self._initClockTimer()
+
+        while self._queue and self._queue[0][2] is None:
+            heapq.heappop(self._queue)
+
+        nextTime = self._queue[0][0] if self._queue else None
+        if nextTime == self._timeoutTime and not force:
+            return
+
+        if self._clockTimer is not None:
+            self._armClockTimer(nextTime)
+        else:
+            self._armTimeout(nextTime)
+
+    def _armClockTimer(self, nextTime):
+        # the timer stays armed even without any pending timers, otherwise the kernel won't tell us about clock changes
+        if nextTime is not None:
+            self._clockTimer.arm(nextTime.timestamp())
+        else:
+            self._clockTimer.arm(time.time() + self._idleSleepTime)
+
+        self._timeoutTime = nextTime
+
+    def _armTimeout(self, nextTime):
+        if self._timeoutId is not None:
+            GObject.source_remove(self._timeoutId)
+
+            self._timeoutId = None
+            self._timeoutTime = None
+
+        if nextTime is None:
+            return
+
+        # without a wall-clock timer we must poll regularly to notice clock changes
+        timeDifference = max((nextTime - self._clock.now()).total_seconds(), 0)
+        timeDifference = min(timeDifference, self._maxSleepTime)
+
+        self._timeoutId = GObject.timeout_add(int(math.ceil(timeDifference * 1000)), self._timeoutCallback)
+        self._timeoutTime = nextTime
+
+    def _clockTimerCallback(self, fd, condition):
+        try:
+            expired = self._clockTimer.read()
+        except OSError as error:
+            self._logger.critical(
+                "While reading the wall-clock timer, a exception occurred: %s: %s",
+                type(error).__name__,
+                str(error)
+            )
+            raise
+
+        if expired is False:
+            self._logger.info("System clock was changed, re-evaluating timers...")
+
+        if expired is not None:
+            self._dispatch()
+
+        return True
+
+    def _timeoutCallback(self):
+        self._timeoutId = None
+        self._timeoutTime = None
+
+        self._dispatch()
+        return False
+
+    def _dispatch(self):
+        callbacks = []
+
+        with self._lock:
+            dispatchTime = self._clock.now() + self._batchWindow
+            while self._queue and self._queue[0][0] <= dispatchTime:
+                entry = heapq.heappop(self._queue)
+                if entry[2] is not None:
+                    callbacks.append(entry[2])
+                    entry[2] = None
+
+        Metrics.getInstance().increment("timer_wakeups_total", { "result": "useful" if callbacks else "idle" })
+
+        if len(callbacks) > 1:
+            self._logger.debug("Dispatching %s due timers...", len(callbacks))
+
+        # a failing callback mustn't keep the other cronjobs of the batch from being re-armed
+        try:
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as error:
+                    self._logger.critical(
+                        "While dispatching a timer, a exception occurred: %s: %s",
+                        type(error).__name__,
+                        str(error),
+                        exc_info=True
+                    )
+        finally:
+            with self._lock:
+                self._arm(force=True)
+
+class RunStatistics(object):
+    _runs = 0
+    _successfulRuns = 0
+    _failedRuns = 0
+    _medianDuration = None
+    _p95Duration = None
+    _lastRun = None
+
+    def __init__(self, runs=0, successfulRuns=0, failedRuns=0, medianDuration=None, p95Duration=None, lastRun=None):
+        self._runs = runs
+        self._successfulRuns = successfulRuns
+        self._failedRuns = failedRuns
+        self._medianDuration = medianDuration
+        self._p95Duration = p95Duration
+        self._lastRun = lastRun
+
+    @property
+    def runs(self):
+        return self._runs
+
+    @property
+    def successfulRuns(self):
+        return self._successfulRuns
+
+    @property
+    def failedRuns(self):
+        return self._failedRuns
+
+    @property
+    def failureRate(self):
+        return self._failedRuns / self._runs if self._runs > 0 else None
+
+    @property
+    def medianDuration(self):
+        return self._medianDuration
+
+    @property
+    def p95Duration(self):
+        return self._p95Duration
+
+    @property
+    def lastRun(self):
+        return self._lastRun
+
+    @staticmethod
+    def formatDuration(duration):
+        if duration < 90:
+            return "{} s".format(int(round(duration)))
+        if duration < 5400:
+            return "{} min".format(int(round(duration / 60)))
+        return "{:.1f} h".format(duration / 3600)
+
+class StateStore(object):
+    _instance = None
+
+    _path = None
+    _connection = None
+    _lock = None
+
+    _lastExecutions = None
+    _dataVersion = None
+    _listeners = None
+
+    _watching = False
+    _inotify = None
+    _inotifyWatchId = None
+
+    _impersonate = None
+    _logger = None
+
+    def __init__(self, path=None, impersonate=None):
+        if path is None:
+            path = self.getDefaultPath(BaseDirectory.save_cache_path("cron-notify"))
+
+        self._path = path
+        self._lock = threading.RLock()
+        self._listeners = {}
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "state"))
+
+        # the state databases of other users are accessed with their credentials only
+        self._impersonate = impersonate if impersonate is not None else contextlib.nullcontext
+
+        with self._impersonate():
+            self._open()
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def getDefaultPath(cachePath):
+        # the database lives in a directory of its own, otherwise writing the log files would wake the inotify watch
+        statePath = os.path.join(cachePath, "state")
+        if not os.path.isdir(statePath):
+            os.mkdir(statePath, 0o700)
+
+        return os.path.join(statePath, "state.sqlite")
+
+    @property
+    def path(self):
+        return self._path
+
+    def getLastExecution(self, app, id):
+        with self._lock:
+            return self._lastExecutions.get(( app, id ))
+
+    def setLastExecution(self, app, id, timestamp):
+        with self._lock, self._impersonate():
+            self._connection.execute(
+                "INSERT OR REPLACE INTO last_execution (app, id, timestamp) VALUES (?, ?, ?)",
+                ( app, id, int(timestamp) )
+            )
+
+            self._lastExecutions[( app, id )] = int(timestamp)
+
+    def removeLastExecution(self, app, id):
+        with self._lock, self._impersonate():
+            self._connection.execute("DELETE FROM last_execution WHERE app = ? AND id = ?", ( app, id ))
+            self._lastExecutions.pop(( app, id ), None)
+
+    def addRun(self, app, id, startTime, endTime, duration, status, exitCodes, maxAge=None):
+        expireTime = endTime + maxAge if maxAge is not None else None
+
+        with self._lock, self._impersonate():
+            self._connection.execute(
+                "INSERT OR REPLACE INTO run_history "
+                + "(app, id, start_time, end_time, duration, status, exit_codes, expire_time) "
+                + "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ( app, id, startTime, endTime, duration, status, json.dumps(exitCodes, separators=( ",", ":" )),
+                    expireTime )
+            )
+
+            if maxAge is not None:
+                self._connection.execute(
+                    "DELETE FROM run_history WHERE app = ? AND id = ? AND start_time < ?",
+                    ( app, id, endTime - maxAge )
+                )
+
+            self._pruneRuns(endTime)
+
+    def getRunStatistics(self, app, id):
+        with self._lock, self._impersonate():
+            statusCounts = dict(self._connection.execute(
+                "SELECT status, COUNT(*) FROM run_history WHERE app = ? AND id = ? GROUP BY status",
+                ( app, id )
+            ))
+
+            if not statusCounts:
+                return RunStatistics()
+
+            lastRun = self._connection.execute(
+                "SELECT MAX(start_time) FROM run_history WHERE app = ? AND id = ?",
+                ( app, id )
+            ).fetchone()[0]
+
+            successfulRuns = statusCounts.get("success", 0) + statusCounts.get("warning", 0)
+            failedRuns = statusCounts.get("error", 0) + statusCounts.get("timeout", 0)
+
+            return RunStatistics(
+                sum(statusCounts.values()),
+                successfulRuns,
+                failedRuns,
+                self._getDurationPercentile(app, id, 50, successfulRuns),
+                self._getDurationPercentile(app, id, 95, successfulRuns),
+                datetime.datetime.fromtimestamp(lastRun)
+            )
+
+    def _getDurationPercentile(self, app, id, percentile, count):
+        if count == 0:
+            return None
+
+        # nearest-rank method, skipping through the sorted durations of the partial index
+        return self._connection.execute(
+            "SELECT duration FROM run_history WHERE app = ? AND id = ? AND status IN ('success', 'warning') "
+            + "ORDER BY duration LIMIT 1 OFFSET ?",
+            ( app, id, max(math.ceil(count * percentile / 100) - 1, 0) )
+        ).fetchone()[0]
+
+    def importLegacyCacheFile(self, app, id, cacheFile):
+        try:
+            with self._impersonate(), open(cacheFile, "rt") as legacyCacheFile:
+                lastExecutionTime = legacyCacheFile.read(20).strip()
+        except IOError as error:
+            if error.errno == errno.ENOENT:
+                return
+            raise
+
+        try:
+            timestamp = int(lastExecutionTime) if lastExecutionTime else None
+        except ValueError:
+            # keep the file for the user to inspect, but don't warn about it on every start
+            self._logger.warning(
+                "Ignoring invalid legacy cache file '%s', renaming it to '%s'...",
+                cacheFile,
+                cacheFile + ".invalid"
+            )
+            with self._impersonate():
+                os.replace(cacheFile, cacheFile + ".invalid")
+            return
+
+        with self._lock, self._impersonate():
+            if timestamp is not None:
+                if timestamp > (self._lastExecutions.get(( app, id )) or 0):
+                    self._logger.info("Importing legacy cache file '%s'...", cacheFile)
+                    self.setLastExecution(app, id, timestamp)
+
+            os.remove(cacheFile)
+
+    def watch(self, app, id, callback):
+        with self._lock:
+            self._listeners[( app, id )] = callback
+
+            # the database is watched only when needed, e.g. `--history` must work without PyGObject
+            if not self._watching:
+                self._watching = True
+                with self._impersonate():
+                    self._watchChanges()
+
+    def unwatch(self, app, id):
+        with self._lock:
+            self._listeners.pop(( app, id ), None)
+
+    def _open(self):
+        self._connection = sqlite3.connect(self._path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS last_execution ("
+            + "app TEXT NOT NULL, id TEXT NOT NULL, timestamp INTEGER NOT NULL, PRIMARY KEY (app, id)"
+            + ") WITHOUT ROWID"
+        )
+
+        # the run history might grow large, thus all queries are answered by indexes on the cronjob's runs;
+        # the partial index keeps the durations of successful runs sorted to look up percentiles
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS run_history ("
+            + "app TEXT NOT NULL, id TEXT NOT NULL, start_time REAL NOT NULL, end_time REAL NOT NULL, "
+            + "duration REAL NOT NULL, status TEXT NOT NULL, exit_codes TEXT NOT NULL, expire_time REAL, "
+            + "PRIMARY KEY (app, id, start_time)"
+            + ") WITHOUT ROWID"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS run_history_status ON run_history (app, id, status)")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS run_history_duration ON run_history (app, id, duration, status) "
+            + "WHERE status IN ('success', 'warning')"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS run_history_expire_time ON run_history (expire_time) "
+            + "WHERE expire_time IS NOT NULL"
+        )
+
+        self._pruneRuns()
+        self._load()
+
+    def _pruneRuns(self, now=None):
+        # runs expire on their own, otherwise the run history of removed or renamed cronjobs would grow forever
+        self._connection.execute(
+            "DELETE FROM run_history WHERE expire_time < ?",
+            ( now if now is not None else time.time(), )
+        )
+
+    def _watchChanges(self):
+        # an in-memory database can't be changed by other processes
+        if self._path == ":memory:":
+            return
+
+        try:
+            self._inotify = Inotify()
+            self._inotify.addWatch(
+                os.path.dirname(self._path),
+                Inotify.IN_MODIFY | Inotify.IN_CLOSE_WRITE | Inotify.IN_MOVED_TO | Inotify.IN_CREATE
+            )
+
+            self._inotifyWatchId = GLib.io_add_watch(
+                self._inotify.fileno(),
+                GLib.PRIORITY_DEFAULT,
+                GLib.IO_IN,
+                self._inotifyCallback
+            )
+        except (AttributeError, ImportError, OSError) as error:
+            self._logger.warning(
+                "Unable to watch the state database for changes: %s: %s",
+                type(error).__name__,
+                str(error)
+            )
+
+            if self._inotify is not None:
+                self._inotify.close()
+            self._inotify = None
+
+    def _load(self):
+        with self._lock, self._impersonate():
+            self._dataVersion = self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+            rows = self._connection.execute("SELECT app, id, timestamp FROM last_execution")
+            self._lastExecutions = dict(( ( app, id ), timestamp ) for app, id, timestamp in rows)
+
+    def _inotifyCallback(self, fd, condition):
+        stateFileName = os.path.basename(self._path)
+
+        events = self._inotify.read()
+        if not any(name.startswith(stateFileName) for _, _, _, name in events):
+            return True
+
+        callbacks = []
+        with self._lock, self._impersonate():
+            # data_version only changes if another connection committed, our own writes are already cached
+            if self._connection.execute("PRAGMA data_version").fetchone()[0] == self._dataVersion:
+                return True
+
+            self._logger.debug("State database was changed by another process, reloading...")
+
+            previousLastExecutions = self._lastExecutions
+            self._load()
+
+            for key, callback in self._listeners.items():
+                if self._lastExecutions.get(key) != previousLastExecutions.get(key):
+                    callbacks.append(callback)
+
+        for callback in callbacks:
+            callback()
+
+        return True
+
+class CommandStage(object):
+    __slots__ = ( "_name", "_command", "_after", "_always" )
+
+    def __init__(self, name, command, after=(), always=False):
+        if not re.match(r'^[\w.-]+$', str(name)):
+            raise ValueError("Invalid stage name given")
+        if not command or len(command) == 0:
+            raise ValueError("Invalid command given for stage '{}'".format(name))
+
+        self._name = sys.intern(str(name))
+        self._command = tuple(sys.intern(str(argument)) for argument in command)
+        self._after = tuple(sys.intern(str(dependency)) for dependency in after)
+        self._always = not not always
+
+    def __repr__(self):
+        return "CommandStage({!r}, {!r}, after={!r})".format(self._name, self._command, self._after)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def command(self):
+        return self._command
+
+    @property
+    def after(self):
+        return self._after
+
+    @property
+    def always(self):
+        return self._always
+
+class ResourcePolicy(object):
+    IO_CLASSES = { "realtime": 1, "best-effort": 2, "idle": 3 }
+
+    # glibc has no wrapper for ioprio_set(2)
+    _IOPRIO_SET_SYSCALLS = {
+        "x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "riscv64": 30, "armv7l": 314, "ppc64le": 273,
+        "ppc64": 273, "s390x": 282
+    }
+    _IOPRIO_WHO_PROCESS = 1
+    _IOPRIO_CLASS_SHIFT = 13
+
+    _libc = None
+
+    _nice = None
+    _ioClass = None
+    _ioPriority = None
+
+    _scope = False
+    _cpuWeight = None
+    _cpuQuota = None
+    _memoryMax = None
+    _ioWeight = None
+
+    def __init__(self, nice=None, ioClass=None, ioPriority=None, scope=False, cpuWeight=None, cpuQuota=None,
+            memoryMax=None, ioWeight=None):
+        if nice is not None:
+            self._nice = int(nice)
+            if self._nice < -20 or self._nice > 19:
+                raise ValueError("Invalid nice value given")
+
+        if ioClass is not None:
+            if ioClass not in self.IO_CLASSES:
+                raise ValueError("Invalid IO class '{}' given".format(ioClass))
+            self._ioClass = ioClass
+
+        if ioPriority is not None:
+            self._ioPriority = int(ioPriority)
+            if self._ioPriority < 0 or self._ioPriority > 7:
+                raise ValueError("Invalid IO priority given")
+            if self._ioClass is None:
+                self._ioClass = "best-effort"
+            elif self._ioClass == "idle":
+                raise ValueError("Invalid IO priority given: The idle IO class has no priorities")
+
+        for name, weight in ( ( "CPU", cpuWeight ), ( "IO", ioWeight ) ):
+            if weight is not None and (int(weight) < 1 or int(weight) > 10000):
+                raise ValueError("Invalid {} weight given".format(name))
+        if cpuQuota is not None and int(cpuQuota) < 1:
+            raise ValueError("Invalid CPU quota given")
+        if memoryMax is not None and int(memoryMax) < 1:
+            raise ValueError("Invalid memory limit given")
+
+        self._cpuWeight = int(cpuWeight) if cpuWeight is not None else None
+        self._cpuQuota = int(cpuQuota) if cpuQuota is not None else None
+        self._memoryMax = int(memoryMax) if memoryMax is not None else None
+        self._ioWeight = int(ioWeight) if ioWeight is not None else None
+
+        # cgroup limits require a transient systemd scope
+        limits = ( self._cpuWeight, self._cpuQuota, self._memoryMax, self._ioWeight )
+        self._scope = not not scope or any(limit is not None for limit in limits)
+
+    @property
+    def nice(self):
+        return self._nice
+
+    @property
+    def ioClass(self):
+        return self._ioClass
+
+    @property
+    def ioPriority(self):
+        return self._ioPriority
+
+    @property
+    def scope(self):
+        return self._scope
+
+    @property
+    def cpuWeight(self):
+        return self._cpuWeight
+
+    @property
+    def cpuQuota(self):
+        return self._cpuQuota
+
+    @property
+    def memoryMax(self):
+        return self._memoryMax
+
+    @property
+    def ioWeight(self):
+        return self._ioWeight
+
+    @staticmethod
+    def getUnitName(*parts):
+        # escape every part like `systemd-escape` does, systemd rejects non-ASCII unit names
+        escapedParts = []
+        for part in parts:
+            escapedPart = ""
+            for index, byte in enumerate(str(part).encode("utf-8")):
+                char = chr(byte)
+                if char == "/":
+                    escapedPart += "-"
+                elif char.isascii() and (char.isalnum() or char in ":_" or (char == "." and index > 0)):
+                    escapedPart += char
+                else:
+                    escapedPart += "\\x{:02x}".format(byte)
+            escapedParts.append(escapedPart)
+
+        return "-".join(escapedParts)
+
+    def wrapCommand(self, command, unitName):
+        if not self._scope:
+            return command
+
+        properties = []
+        if self._cpuWeight is not None:
+            properties.append("--property=CPUWeight={}".format(self._cpuWeight))
+        if self._cpuQuota is not None:
+            properties.append("--property=CPUQuota={}%".format(self._cpuQuota))
+        if self._memoryMax is not None:
+            properties.append("--property=MemoryMax={}".format(self._memoryMax))
+        if self._ioWeight is not None:
+            properties.append("--property=IOWeight={}".format(self._ioWeight))
+
+        # `systemd-run --scope` executes the command itself, thus it stays our child process
+        scopeCommand = [ "systemd-run", "--user", "--scope", "--quiet", "--collect", "--unit=" + unitName ]
+        return scopeCommand + properties + [ "--" ] + list(command)
+
+    def getPreexecFunction(self):
+        if self._nice is None and self._ioClass is None:
+            return None
+
+        nice = self._nice
+        ioPriority = None
+        ioPrioritySyscall = self._IOPRIO_SET_SYSCALLS.get(os.uname().machine)
+
+        if self._ioClass is not None and ioPrioritySyscall is not None:
+            if ResourcePolicy._libc is None:
+                ResourcePolicy._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+            ioPriority = self.IO_CLASSES[self._ioClass] << self._IOPRIO_CLASS_SHIFT | (self._ioPriority or 0)
+
+        libc = ResourcePolicy._libc
+        ioPriorityWho = self._IOPRIO_WHO_PROCESS
+
+        # runs in the child process between fork and exec; resource policies are best effort, thus ignore errors
+        def preexec():
+            if nice is not None:
+                try:
+                    os.setpriority(os.PRIO_PROCESS, 0, nice)
+                except OSError:
+                    pass
+
+            if ioPriority is not None:
+                libc.syscall(ioPrioritySyscall, ioPriorityWho, 0, ioPriority)
+
+        return preexec
+
+class ResourceUsage(object):
+    _userTime = 0.0
+    _systemTime = 0.0
+    _maxRss = 0
+    _readBytes = 0
+    _writtenBytes = 0
+
+    def __init__(self, userTime=0.0, systemTime=0.0, maxRss=0, readBytes=0, writtenBytes=0):
+        self._userTime = userTime
+        self._systemTime = systemTime
+        self._maxRss = maxRss
+        self._readBytes = readBytes
+        self._writtenBytes = writtenBytes
+
+    @classmethod
+    def fromRusage(cls, resourceUsage):
+        # Linux reports the peak RSS in KiB and block IO in 512-byte units
+        return cls(
+            resourceUsage.ru_utime,
+            resourceUsage.ru_stime,
+            resourceUsage.ru_maxrss * 1024,
+            resourceUsage.ru_inblock * 512,
+            resourceUsage.ru_oublock * 512
+        )
+
+    @property
+    def userTime(self):
+        return self._userTime
+
+    @property
+    def systemTime(self):
+        return self._systemTime
+
+    @property
+    def cpuTime(self):
+        return self._userTime + self._systemTime
+
+    @property
+    def maxRss(self):
+        return self._maxRss
+
+    @property
+    def readBytes(self):
+        return self._readBytes
+
+    @property
+    def writtenBytes(self):
+        return self._writtenBytes
+
+    def add(self, resourceUsage):
+        # commands run one after another or in parallel, thus CPU time and IO add up, but peak RSS doesn't
+        return ResourceUsage(
+            self._userTime + resourceUsage.userTime,
+            self._systemTime + resourceUsage.systemTime,
+            max(self._maxRss, resourceUsage.maxRss),
+            self._readBytes + resourceUsage.readBytes,
+            self._writtenBytes + resourceUsage.writtenBytes
+        )
+
+    def __str__(self):
+        return "CPU time {:.2f}s (user {:.2f}s, system {:.2f}s), peak RSS {}, read {}, written {}".format(
+            self.cpuTime,
+            self._userTime,
+            self._systemTime,
+            self._formatBytes(self._maxRss),
+            self._formatBytes(self._readBytes),
+            self._formatBytes(self._writtenBytes)
+        )
+
+    @staticmethod
+    def _formatBytes(size):
+        for unit in ( "B", "KiB", "MiB", "GiB" ):
+            if size < 1024 or unit == "GiB":
+                return "{:.1f} {}".format(size, unit) if unit != "B" else "{} B".format(size)
+            size /= 1024
+
+class OutputCapture(object):
+    _READ_SIZE = 65536
+    _MAX_LINE_LENGTH = 65536
+
+    _streams = None
+    _logPrefix = ""
+    _tail = None
+    _partialLines = None
+
+    def __init__(self, streams, tailLength=0, logPrefix=""):
+        self._streams = streams
+        self._logPrefix = logPrefix
+        self._tail = collections.deque(maxlen=max(tailLength, 0))
+        self._partialLines = {}
+
+    @property
+    def tail(self):
+        return list(self._tail)
+
+    def watch(self, name, pipe, callback):
+        fd = pipe.fileno()
+        os.set_blocking(fd, False)
+
+        self._partialLines[fd] = b""
+        watchData = ( name, pipe, callback )
+        GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP, self._readCallback, watchData)
+
+    def _readCallback(self, fd, condition, data):
+        name, pipe, callback = data
+
+        try:
+            chunk = os.read(fd, self._READ_SIZE)
+        except OSError as error:
+            if error.errno == errno.EAGAIN:
+                return True
+            chunk = b""
+
+        buffer = self._partialLines[fd] + chunk
+        lines = buffer.split(b"\n")
+        self._partialLines[fd] = lines.pop()
+
+        # never keep more than one overlong line in memory, no matter how chatty the command is
+        if not chunk or len(self._partialLines[fd]) > self._MAX_LINE_LENGTH:
+            if self._partialLines[fd]:
+                lines.append(self._partialLines[fd])
+            self._partialLines[fd] = b""
+
+        if lines:
+            self._write(name, lines)
+
+        if not chunk:
+            del self._partialLines[fd]
+            pipe.close()
+
+            callback()
+            return False
+
+        return True
+
+    def _write(self, name, lines):
+        timestamp = datetime.datetime.today().strftime("%Y-%m-%d %H:%M:%S")
+        linePrefix = "{}: {}: {}".format(timestamp, name.upper(), self._logPrefix)
+
+        outputLines = []
+        for line in lines:
+            line = line.decode("utf-8", errors="replace").rstrip("\r")
+
+            self._tail.append(line)
+            outputLines.append(linePrefix + line + "\n")
+
+        stream = self._streams.get(name) or getattr(sys, name)
+        stream.write("".join(outputLines))
+        stream.flush()
+
+class JobLogHandler(logging.handlers.RotatingFileHandler):
+    _maxAge = None
+    _compress = False
+    _impersonate = None
+    _firstRecordTime = None
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, maxAge=None, compress=False, encoding="utf-8",
+            impersonate=None):
+        # log files of other users' cronjobs are written, rotated and compressed with their credentials only
+        self._impersonate = impersonate if impersonate is not None else contextlib.nullcontext
+
+        super(JobLogHandler, self).__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+
+        self.configure(maxBytes, backupCount, maxAge, compress)
+
+        self._firstRecordTime = self._readFirstRecordTime()
+
+    def configure(self, maxBytes=0, backupCount=0, maxAge=None, compress=False):
+        self.acquire()
+        try:
+            self.maxBytes = maxBytes
+            self.backupCount = backupCount
+
+            self._maxAge = datetime.timedelta(0, maxAge) if maxAge else None
+            self._compress = not not compress
+
+            self.namer = self._compressedNamer if self._compress else None
+            self.rotator = self._compressingRotator if self._compress else None
+        finally:
+            self.release()
+
+    def emit(self, record):
+        # child output is written to the handler directly, thus we must take care of its rollover state, too
+        try:
+            self.write(self.format(record) + self.terminator)
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def write(self, data):
+        self.acquire()
+        try:
+            with self._impersonate():
+                if self.stream is None:
+                    self.stream = self._open()
+
+                if self._shouldRotate(len(data)):
+                    self.doRollover()
+
+            if self._firstRecordTime is None:
+                self._firstRecordTime = datetime.datetime.today()
+
+            self.stream.write(data)
+        finally:
+            self.release()
+
+    def doRollover(self):
+        with self._impersonate():
+            super(JobLogHandler, self).doRollover()
+        self._firstRecordTime = None
+
+    def _open(self):
+        with self._impersonate():
+            return open(self.baseFilename, self.mode, encoding=self.encoding, errors=self.errors,
+                opener=self._opener)
+
+    @staticmethod
+    def _opener(path, flags):
+        # never follow a symlink someone else placed in a shared or another user's log directory
+        return os.open(path, flags | os.O_NOFOLLOW, 0o666)
+
+    def _shouldRotate(self, length):
+        if self.backupCount <= 0 or not os.path.isfile(self.baseFilename):
+            return False
+
+        if self._maxAge is not None and self._firstRecordTime is not None:
+            if datetime.datetime.today() - self._firstRecordTime >= self._maxAge:
+                return True
+
+        if self.maxBytes > 0:
+            self.stream.seek(0, 2)
+            if self.stream.tell() > 0 and self.stream.tell() + length >= self.maxBytes:
+                return True
+
+        return False
+
+    def _readFirstRecordTime(self):
+        try:
+            with self._impersonate(), open(self.baseFilename, "rt", encoding=self.encoding, errors="replace") \
+                    as logFile:
+                firstRecordTime = logFile.read(19)
+        except IOError:
+            return None
+
+        try:
+            return datetime.datetime.strptime(firstRecordTime, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _compressedNamer(name):
+        return name + ".gz"
+
+    @staticmethod
+    def _compressingRotator(source, dest):
+        with open(source, "rb") as sourceFile, gzip.open(dest, "wb") as destFile:
+            shutil.copyfileobj(sourceFile, destFile)
+        os.remove(source)
+
+class JobLogRouter(logging.Handler):
+    _instance = None
+
+    _logger = None
+    _defaultHandler = None
+
+    def __init__(self):
+        super(JobLogRouter, self).__init__()
+
+        self._defaultHandler = logging.StreamHandler(stream=sys.stderr)
+        self._defaultHandler.setFormatter(
+            logging.Formatter("%(asctime)s: %(levelname)s: %(message)s", "%Y-%m-%d %H:%M:%S")
+        )
+
+        # job loggers filter records themselves, the shared logger passes everything on
+        self._logger = logging.getLogger("{}.{}".format(__name__, "jobs"))
+        self._logger.setLevel(logging.DEBUG)
+        self._logger.addHandler(self)
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def logger(self):
+        return self._logger
+
+    def emit(self, record):
+        handler = record.jobLogger.handler or self._defaultHandler
+        if record.levelno >= handler.level:
+            handler.handle(record)
+
+class JobLogger(object):
+    __slots__ = ( "_name", "_level", "_handler" )
+
+    _instances = {}
+
+    def __init__(self, name):
+        self._name = name
+        self._level = logging.WARNING
+        self._handler = None
+
+    @classmethod
+    def getInstance(cls, app, id, user=None):
+        name = "{}/{}".format(app, id) if user is None else "{}/{}/{}".format(user, app, id)
+        if name not in cls._instances:
+            cls._instances[name] = cls(name)
+        return cls._instances[name]
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def level(self):
+        return self._level
+
+    @property
+    def handler(self):
+        return self._handler
+
+    @handler.setter
+    def handler(self, handler):
+        self._handler = handler
+
+    def setLevel(self, level):
+        self._level = level
+
+    def isEnabledFor(self, level):
+        return level >= self._level
+
+    def log(self, level, msg, *args, **kwargs):
+        if level >= self._level:
+            kwargs["extra"] = { "job": self._name, "jobLogger": self }
+            JobLogRouter.getInstance().logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self.log(logging.CRITICAL, msg, *args, **kwargs)
+
+class ExecutorTask(object):
+    _owner = None
+    _callback = None
+    _kwargs = None
+
+    _group = None
+    _priority = 0
+    _sequence = 0
+
+    _executor = None
+    _done = False
+    _result = None
+    _event = None
+
+    def __init__(self, executor, owner, callback, kwargs=None, group=None, priority=0, sequence=0):
+        self._executor = executor
+
+        self._owner = owner
+        self._callback = callback
+        self._kwargs = kwargs or {}
+
+        self._group = group
+        self._priority = int(priority)
+        self._sequence = sequence
+
+        self._event = threading.Event()
+
+    def __lt__(self, other):
+        return ( -self._priority, self._sequence ) < ( -other._priority, other._sequence )
+
+    @property
+    def owner(self):
+        return self._owner
+
+    @property
+    def group(self):
+        return self._group
+
+    @property
+    def priority(self):
+        return self._priority
+
+    @property
+    def result(self):
+        return self._result
+
+    @property
+    def done(self):
+        return self._done
+
+    def finish(self, result=None):
+        assert not self._done
+
+        self._done = True
+        self._result = result
+        self._event.set()
+
+        self._executor._finish(self)
+
+    def wait(self):
+        mainContext = GLib.MainContext.default()
+
+        # some other thread is running the main loop, it will finish the task eventually
+        if not mainContext.acquire():
+            self._event.wait()
+            return
+
+        try:
+            while not self._done:
+                mainContext.iteration(True)
+        finally:
+            mainContext.release()
+
+class Executor(object):
+    _instance = None
+
+    _maxWorkers = None
+    _groupLimits = None
+
+    _queue = None
+    _running = None
+    _processes = None
+    _sequence = 0
+
+    _scheduler = None
+    _logger = None
+
+    def __init__(self, maxWorkers=None, scheduler=None):
+        self._groupLimits = {}
+        self._queue = []
+        self._running = []
+        self._processes = {}
+
+        self._scheduler = scheduler if scheduler is not None else Scheduler.getInstance()
+        self._logger = logging.getLogger("{}.{}".format(__name__, "executor"))
+
+        self.maxWorkers = maxWorkers
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def maxWorkers(self):
+        return self._maxWorkers
+
+    @maxWorkers.setter
+    def maxWorkers(self, maxWorkers):
+        self._maxWorkers = int(maxWorkers) if maxWorkers else None
+        self._schedule()
+
+    @property
+    def groupLimits(self):
+        return dict(self._groupLimits)
+
+    @groupLimits.setter
+    def groupLimits(self, groupLimits):
+        self._groupLimits = dict(( group, int(limit) ) for group, limit in groupLimits.items() if limit)
+        self._schedule()
+
+    def getGroupLimit(self, group):
+        return self._groupLimits.get(group)
+
+    def setGroupLimit(self, group, limit):
+        if limit:
+            self._groupLimits[group] = int(limit)
+        else:
+            self._groupLimits.pop(group, None)
+
+        self._schedule()
+
+    def submit(self, owner, callback, kwargs=None, group=None, priority=0):
+        self._sequence += 1
+
+        task = ExecutorTask(self, owner, callback, kwargs, group, priority, self._sequence)
+        heapq.heappush(self._queue, task)
+
+        self._schedule()
+
+        if task in self._queue:
+            self._logger.debug("Queueing execution (%s running, %s queued)...", len(self._running), len(self._queue))
+
+        return task
+
+    def spawn(self, command, callback, output=None, task=None, **kwargs):
+        if output is not None:
+            kwargs["stdout"] = subprocess.PIPE
+            kwargs["stderr"] = subprocess.PIPE
+
+        # run every command in its own process group, so that cancelling it also terminates its children
+        kwargs.setdefault("start_new_session", True)
+
+        process = subprocess.Popen(command, **kwargs)
+        self._addProcess(task, process)
+
+        # the callback is called after the process exited and all of its output was read
+        pendingEvents = [ 1 if output is None else 3 ]
+        resourceUsages = [ None ]
+
+        def eventCallback(resourceUsage=None):
+            if resourceUsage is not None:
+                resourceUsages[0] = resourceUsage
+
+            pendingEvents[0] -= 1
+            if pendingEvents[0] == 0:
+                self._removeProcess(task, process)
+                callback(process, resourceUsages[0])
+
+        if output is not None:
+            output.watch("stdout", process.stdout, eventCallback)
+            output.watch("stderr", process.stderr, eventCallback)
+
+        try:
+            pidFd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            watchData = ( process, eventCallback )
+            GLib.child_watch_add(GLib.PRIORITY_DEFAULT, process.pid, self._childWatchCallback, watchData)
+        else:
+            watchData = ( process, eventCallback )
+            GLib.io_add_watch(pidFd, GLib.PRIORITY_DEFAULT, GLib.IO_IN, self._pidFdCallback, watchData)
+
+        return process
+
+    def cancel(self, owner, gracePeriod=30):
+        for task in list(self._queue):
+            if task.owner is owner:
+                self._logger.debug("Cancelling queued execution...")
+
+                self._queue.remove(task)
+                heapq.heapify(self._queue)
+
+                task.finish(None)
+                return True
+
+        for task in self._running:
+            if task.owner is owner:
+                processes = self._processes.get(task, ())
+                for process in processes:
+                    self.terminate(process, gracePeriod)
+
+                return len(processes) > 0
+
+        return False
+
+    def terminate(self, process, gracePeriod=30):
+        self._logger.debug("Terminating process group %s...", process.pid)
+        self._killProcessGroup(process, signal.SIGTERM)
+
+        # kill processes ignoring SIGTERM, and children keeping the output pipes open after the process exited
+        def killCallback():
+            if any(process in processes for processes in self._processes.values()):
+                self._logger.debug("Killing process group %s...", process.pid)
+                self._killProcessGroup(process, signal.SIGKILL)
+
+        self._scheduler.add(self._scheduler.clock.now() + datetime.timedelta(0, gracePeriod), killCallback)
+
+    def isRunning(self, owner):
+        return any(task.owner is owner for task in self._running)
+
+    def isQueued(self, owner):
+        return any(task.owner is owner for task in self._queue)
+
+    def getQueuePosition(self, owner):
+        for position, task in enumerate(sorted(self._queue), 1):
+            if task.owner is owner:
+                return position
+        return None
+
+    def _schedule(self):
+        admittedTasks = []
+        for task in sorted(self._queue):
+            if self._maxWorkers is not None and len(self._running) >= self._maxWorkers:
+                break
+
+            if not self._isAdmissible(task):
+                continue
+
+            self._queue.remove(task)
+            self._running.append(task)
+            admittedTasks.append(task)
+
+        heapq.heapify(self._queue)
+
+        for task in admittedTasks:
+            self._execute(task)
+
+    def _isAdmissible(self, task):
+        # executions of the same owner must never overlap
+        if any(runningTask.owner is task.owner for runningTask in self._running):
+            return False
+
+        if task.group is not None and task.group in self._groupLimits:
+            groupRunning = sum(1 for runningTask in self._running if runningTask.group == task.group)
+            if groupRunning >= self._groupLimits[task.group]:
+                return False
+
+        return True
+
+    def _execute(self, task):
+        try:
+            task._callback(task, **task._kwargs)
+        except Exception:
+            if not task.done:
+                task.finish(None)
+            raise
+
+    def _finish(self, task):
+        if task in self._running:
+            self._running.remove(task)
+
+        self._processes.pop(task, None)
+        self._schedule()
+
+    def _addProcess(self, task, process):
+        self._processes.setdefault(task, []).append(process)
+
+    def _removeProcess(self, task, process):
+        processes = self._processes.get(task)
+        if processes and process in processes:
+            processes.remove(process)
+
+    def _killProcessGroup(self, process, signalNumber):
+        try:
+            os.killpg(process.pid, signalNumber)
+        except ProcessLookupError:
+            pass
+        except OSError as error:
+            self._logger.warning(
+                "While sending signal %s to process group %s, a exception occurred: %s: %s",
+                signalNumber,
+                process.pid,
+                type(error).__name__,
+                str(error)
+            )
+
+    def _pidFdCallback(self, pidFd, condition, data):
+        process, callback = data
+
+        pid, status, resourceUsage = os.wait4(process.pid, os.WNOHANG)
+        if pid == 0:
+            return True
+
+        os.close(pidFd)
+
+        process.returncode = os.waitstatus_to_exitcode(status)
+        callback(resourceUsage)
+        return False
+
+    def _childWatchCallback(self, pid, status, data):
+        process, callback = data
+
+        process.returncode = os.waitstatus_to_exitcode(status)
+        callback()
+
+class Execution(object):
+    _executionId = None
+    _previousExecution = None
+    _logPrefix = ""
+
+    _task = None
+    _output = None
+
+    _pendingStages = None
+    _stageStatus = None
+    _exitCodes = None
+    _processes = None
+    _overallStatus = 0
+
+    _startTime = None
+    _resourceUsage = None
+
+    _timeoutId = None
+    _cancelStatus = None
+    _notification = None
+
+    def __init__(self, task, stages, executionId, previousExecution, logPrefix="", output=None, startTime=None):
+        self._task = task
+        self._output = output
+
+        self._executionId = executionId
+        self._previousExecution = previousExecution
+        self._logPrefix = logPrefix
+
+        self._pendingStages = list(stages)
+        self._stageStatus = {}
+        self._exitCodes = {}
+        self._processes = {}
+
+        self._startTime = startTime if startTime is not None else time.monotonic()
+
+    @property
+    def startTime(self):
+        return self._startTime
+
+    @property
+    def executionId(self):
+        return self._executionId
+
+    @property
+    def previousExecution(self):
+        return self._previousExecution
+
+    @property
+    def logPrefix(self):
+        return self._logPrefix
+
+    @property
+    def task(self):
+        return self._task
+
+    @property
+    def output(self):
+        return self._output
+
+    @property
+    def pendingStages(self):
+        return self._pendingStages
+
+    @property
+    def stageStatus(self):
+        return self._stageStatus
+
+    @property
+    def exitCodes(self):
+        return self._exitCodes
+
+    @property
+    def processes(self):
+        return self._processes
+
+    @property
+    def overallStatus(self):
+        return self._overallStatus
+
+    @property
+    def finished(self):
+        return not self._pendingStages and not self._processes
+
+    @property
+    def resourceUsage(self):
+        return self._resourceUsage
+
+    @property
+    def timeoutId(self):
+        return self._timeoutId
+
+    @timeoutId.setter
+    def timeoutId(self, timeoutId):
+        self._timeoutId = timeoutId
+
+    @property
+    def cancelStatus(self):
+        return self._cancelStatus
+
+    @property
+    def notification(self):
+        return self._notification
+
+    @notification.setter
+    def notification(self, notification):
+        self._notification = notification
+
+    def cancel(self, status):
+        self._cancelStatus = status
+        self._overallStatus = max(self._overallStatus, status)
+
+    def addResourceUsage(self, resourceUsage):
+        if self._resourceUsage is None:
+            self._resourceUsage = resourceUsage
+        else:
+            self._resourceUsage = self._resourceUsage.add(resourceUsage)
+
+    def setStageStatus(self, stage, status):
+        self._stageStatus[stage.name] = status
+        if status is not None:
+            self._overallStatus = max(self._overallStatus, status)
+
+class BusSubscription(object):
+    _busManager = None
+    _key = None
+    _callback = None
+
+    def __init__(self, busManager, key, callback):
+        self._busManager = busManager
+        self._key = key
+        self._callback = callback
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def callback(self):
+        return self._callback
+
+    def remove(self):
+        self._busManager.unsubscribe(self)
+
+class BusManager(object):
+    _instance = None
+
+    _bus = None
+    _receivers = None
+    _subscriptions = None
+
+    _logger = None
+
+    def __init__(self):
+        self._receivers = {}
+        self._subscriptions = {}
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "bus"))
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def bus(self):
+        if self._bus is None:
+            dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+
+            self._bus = dbus.SystemBus()
+            if not self._bus:
+                raise RuntimeError("Failed to initialize DBus system bus")
+
+        return self._bus
+
+    def subscribe(self, callback, interface, signal, busName, path):
+        key = ( interface, signal, busName, path )
+
+        if key not in self._receivers:
+            self._logger.debug("Subscribing to %s.%s signal of %s...", interface, signal, path)
+
+            self._receivers[key] = self.bus.add_signal_receiver(
+                lambda *args: self._dispatch(key, *args),
+                dbus_interface=interface,
+                signal_name=signal,
+                bus_name=busName,
+                path=path
+            )
+            self._subscriptions[key] = []
+
+        subscription = BusSubscription(self, key, callback)
+        self._subscriptions[key].append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self._subscriptions.get(subscription.key)
+        if not subscriptions or subscription not in subscriptions:
+            return
+
+        subscriptions.remove(subscription)
+
+        if not subscriptions:
+            self._receivers.pop(subscription.key).remove()
+            del self._subscriptions[subscription.key]
+
+    def _dispatch(self, key, *args):
+        for subscription in list(self._subscriptions.get(key, ())):
+            # a previous subscriber might have removed this subscription in the meantime
+            if subscription in self._subscriptions.get(key, ()):
+                subscription.callback(*args)
+
+class PowerState(object):
+    _UPOWER_PATH = "/org/freedesktop/UPower"
+    _DISPLAY_DEVICE_PATH = "/org/freedesktop/UPower/devices/DisplayDevice"
+
+    _instance = None
+
+    _busManager = None
+    _subscriptions = None
+
+    _available = False
+    _onBattery = False
+    _percentage = None
+
+    _waiters = None
+
+    _logger = None
+
+    def __init__(self, busManager=None):
+        self._busManager = busManager if busManager is not None else BusManager.getInstance()
+        self._subscriptions = []
+        self._waiters = []
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "power"))
+
+        try:
+            self._subscriptions.append(self._busManager.subscribe(
+                self._upowerCallback,
+                "org.freedesktop.DBus.Properties",
+                "PropertiesChanged",
+                "org.freedesktop.UPower",
+                self._UPOWER_PATH
+            ))
+
+            self._subscriptions.append(self._busManager.subscribe(
+                self._displayDeviceCallback,
+                "org.freedesktop.DBus.Properties",
+                "PropertiesChanged",
+                "org.freedesktop.UPower",
+                self._DISPLAY_DEVICE_PATH
+            ))
+
+            upower = self._busManager.bus.get_object("org.freedesktop.UPower", self._UPOWER_PATH)
+            self._onBattery = not not upower.Get(
+                "org.freedesktop.UPower",
+                "OnBattery",
+                dbus_interface=dbus.PROPERTIES_IFACE
+            )
+
+            self._available = True
+        except dbus.exceptions.DBusException as error:
+            self._logger.warning("Unable to query UPower: %s", str(error))
+            return
+
+        try:
+            displayDevice = self._busManager.bus.get_object("org.freedesktop.UPower", self._DISPLAY_DEVICE_PATH)
+            if displayDevice.Get("org.freedesktop.UPower.Device", "IsPresent", dbus_interface=dbus.PROPERTIES_IFACE):
+                self._percentage = float(displayDevice.Get(
+                    "org.freedesktop.UPower.Device",
+                    "Percentage",
+                    dbus_interface=dbus.PROPERTIES_IFACE
+                ))
+        except dbus.exceptions.DBusException:
+            self._logger.debug("Unable to query the battery percentage")
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def available(self):
+        return self._available
+
+    @property
+    def onBattery(self):
+        return self._onBattery
+
+    @property
+    def percentage(self):
+        return self._percentage
+
+    def isSatisfied(self, minBattery=None):
+        if not self._available or not self._onBattery:
+            return True
+
+        if minBattery is not None and self._percentage is not None:
+            return self._percentage >= minBattery
+
+        return False
+
+    def addWaiter(self, callback):
+        if callback not in self._waiters:
+            self._waiters.append(callback)
+
+    def removeWaiter(self, callback):
+        if callback in self._waiters:
+            self._waiters.remove(callback)
+
+    def _upowerCallback(self, interfaceName, changedProperties, invalidatedProperties):
+        if "OnBattery" in changedProperties:
+            self._available = True
+            self._onBattery = not not changedProperties["OnBattery"]
+            self._notifyWaiters()
+
+    def _displayDeviceCallback(self, interfaceName, changedProperties, invalidatedProperties):
+        if "Percentage" in changedProperties:
+            self._percentage = float(changedProperties["Percentage"])
+            self._notifyWaiters()
+
+    def _notifyWaiters(self):
+        for callback in list(self._waiters):
+            callback()
+
+class PressureTrigger(object):
+    # unprivileged users may only create triggers with windows that are multiples of 2 seconds
+    WINDOW = 10
+
+    # the kernel signals at most once per window, thus the next event of sustained pressure arrives a bit later
+    QUIET_TIME = 2 * WINDOW
+
+    _resource = None
+    _threshold = None
+    _callback = None
+
+    _fd = None
+    _watchId = None
+    _lastEvent = None
+    _quietTimeoutId = None
+
+    _scheduler = None
+    _logger = None
+
+    def __init__(self, resource, threshold, callback, scheduler=None):
+        self._resource = resource
+        self._threshold = threshold
+        self._callback = callback
+
+        self._scheduler = scheduler if scheduler is not None else Scheduler.getInstance()
+        self._logger = logging.getLogger("{}.{}".format(__name__, "load"))
+
+    @property
+    def resource(self):
+        return self._resource
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    @property
+    def armed(self):
+        return self._fd is not None
+
+    @property
+    def busy(self):
+        return self._lastEvent is not None and self._scheduler.clock.monotonic() - self._lastEvent < self.QUIET_TIME
+
+    def arm(self):
+        assert self._fd is None
+
+        # the kernel signals POLLPRI whenever tasks stalled longer than the threshold within the window
+        stallTime = int(self._threshold * self.WINDOW * 10000)
+        trigger = "some {} {}\0".format(max(stallTime, 1), self.WINDOW * 1000000).encode("ascii")
+
+        try:
+            fd = os.open("/proc/pressure/" + self._resource, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError as error:
+            self._logger.warning(
+                "Unable to monitor %s pressure: %s: %s",
+                self._resource.upper(),
+                type(error).__name__,
+                str(error)
+            )
+            return False
+
+        try:
+            os.write(fd, trigger)
+        except OSError as error:
+            os.close(fd)
+
+            self._logger.warning(
+                "Unable to create %s pressure trigger: %s: %s",
+                self._resource.upper(),
+                type(error).__name__,
+                str(error)
+            )
+            return False
+
+        self._fd = fd
+        self._watchId = GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, GLib.IO_PRI | GLib.IO_ERR, self._eventCallback)
+        return True
+
+    def disarm(self):
+        if self._watchId is not None:
+            GLib.source_remove(self._watchId)
+            self._watchId = None
+
+        if self._quietTimeoutId is not None:
+            self._scheduler.remove(self._quietTimeoutId)
+            self._quietTimeoutId = None
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+        self._lastEvent = None
+
+    def notice(self):
+        self._lastEvent = self._scheduler.clock.monotonic()
+
+        # pressure is low again if the trigger didn't fire for a while
+        if self._quietTimeoutId is None:
+            self._quietTimeoutId = self._scheduler.add(
+                self._scheduler.clock.now() + datetime.timedelta(0, self.QUIET_TIME),
+                self._quietCallback
+            )
+
+    def _eventCallback(self, fd, condition):
+        if condition & GLib.IO_ERR:
+            self._logger.warning("%s pressure trigger was destroyed", self._resource.upper())
+
+            self._watchId = None
+            self.disarm()
+            self._callback()
+            return False
+
+        self.notice()
+        return True
+
+    def _quietCallback(self):
+        self._quietTimeoutId = None
+
+        remainingTime = self._lastEvent + self.QUIET_TIME - self._scheduler.clock.monotonic()
+        if remainingTime > 0:
+            self._quietTimeoutId = self._scheduler.add(
+                self._scheduler.clock.now() + datetime.timedelta(0, remainingTime),
+                self._quietCallback
+            )
+            return
+
+        self._callback()
+
+class SessionIdleHint(object):
+    _LOGIND_PATH = "/org/freedesktop/login1"
+
+    _busManager = None
+    _uid = None
+    _callback = None
+
+    _sessionPath = None
+    _idleHint = False
+    _subscription = None
+
+    _logger = None
+
+    def __init__(self, busManager, callback, uid=None):
+        self._busManager = busManager
+        self._callback = callback
+        self._uid = uid
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "load"))
+
+    @property
+    def uid(self):
+        return self._uid
+
+    @property
+    def sessionPath(self):
+        return self._sessionPath
+
+    @property
+    def available(self):
+        return self._sessionPath is not None
+
+    @property
+    def idleHint(self):
+        return self._idleHint
+
+    def resolve(self):
+        assert self._sessionPath is None
+
+        try:
+            bus = self._busManager.bus
+            manager = bus.get_object("org.freedesktop.login1", self._LOGIND_PATH)
+
+            if self._uid is None:
+                # logind resolves "auto" to the caller's session, or the user's graphical session
+                sessionPath = manager.GetSession("auto", dbus_interface="org.freedesktop.login1.Manager")
+            else:
+                # the daemon serving other users has no session itself, thus use the user's graphical session
+                userPath = manager.GetUser(self._uid, dbus_interface="org.freedesktop.login1.Manager")
+                user = bus.get_object("org.freedesktop.login1", userPath)
+                sessionPath = user.Get(
+                    "org.freedesktop.login1.User",
+                    "Display",
+                    dbus_interface=dbus.PROPERTIES_IFACE
+                )[1]
+
+                if sessionPath == "/":
+                    self._logger.debug("User %s has no graphical session, ignoring the idle hint", self._uid)
+                    return False
+
+            self._subscription = self._busManager.subscribe(
+                self._propertiesCallback,
+                "org.freedesktop.DBus.Properties",
+                "PropertiesChanged",
+                "org.freedesktop.login1",
+                sessionPath
+            )
+
+            session = bus.get_object("org.freedesktop.login1", sessionPath)
+            self._idleHint = not not session.Get(
+                "org.freedesktop.login1.Session",
+                "IdleHint",
+                dbus_interface=dbus.PROPERTIES_IFACE
+            )
+
+            self._sessionPath = str(sessionPath)
+        except dbus.exceptions.DBusException as error:
+            if self._uid is None:
+                self._logger.warning("Unable to query the session's idle hint: %s", str(error))
+            else:
+                self._logger.warning("Unable to query the idle hint of user %s's session: %s", self._uid, str(error))
+
+            self.close()
+            return False
+
+        return True
+
+    def close(self):
+        if self._subscription is not None:
+            self._subscription.remove()
+            self._subscription = None
+
+        self._sessionPath = None
+        self._idleHint = False
+
+    def _propertiesCallback(self, interfaceName, changedProperties, invalidatedProperties):
+        if "IdleHint" in changedProperties:
+            self._idleHint = not not changedProperties["IdleHint"]
+            self._callback()
+
+class SystemLoad(object):
+    PRESSURE_RESOURCES = ( "cpu", "io", "memory" )
+
+    _LOGIND_PATH = "/org/freedesktop/login1"
+
+    # there's no way to be notified about load average changes, so it's sampled while someone waits for it
+    _SAMPLING_INTERVAL = 30
+
+    _instance = None
+
+    _scheduler = None
+    _busManager = None
+
+    _triggers = None
+    _failedTriggers = None
+    _samplingTimeoutId = None
+
+    # idle hints of the sessions of users (or of the own session, if no user is given) by their uid
+    _idleHints = None
+    _sessionSubscriptions = None
+
+    _waiters = None
+
+    _logger = None
+
+    def __init__(self, busManager=None, scheduler=None):
+        self._busManager = busManager if busManager is not None else BusManager.getInstance()
+        self._scheduler = scheduler if scheduler is not None else Scheduler.getInstance()
+
+        self._triggers = {}
+        self._failedTriggers = set()
+        self._idleHints = {}
+        self._waiters = {}
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "load"))
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def loadAverage(self):
+        return os.getloadavg()[0]
+
+    def isIdleAvailable(self, uid=None):
+        return self._getIdleHint(uid).available
+
+    def getIdleHint(self, uid=None):
+        return self._getIdleHint(uid).idleHint
+
+    def getPressure(self, resource):
+        try:
+            with open("/proc/pressure/" + resource) as pressureFile:
+                for line in pressureFile:
+                    fields = line.split()
+                    if fields and fields[0] == "some":
+                        return float(dict(field.split("=", 1) for field in fields[1:])["avg10"])
+        except (OSError, KeyError, ValueError):
+            pass
+
+        return None
+
+    def isPressureExceeded(self, resource, threshold):
+        trigger = self._triggers.get(( resource, threshold ))
+        if trigger is not None and trigger.armed:
+            return trigger.busy
+
+        pressure = self.getPressure(resource)
+        return pressure is not None and pressure > threshold
+
+    def isSatisfied(self, maxLoad=None, maxPressure=None, idle=False, uid=None):
+        if maxLoad is not None and self.loadAverage > maxLoad:
+            return False
+
+        for resource, threshold in (maxPressure or {}).items():
+            if self.isPressureExceeded(resource, threshold):
+                return False
+
+        if idle and self.isIdleAvailable(uid) and not self.getIdleHint(uid):
+            return False
+
+        return True
+
+    def addWaiter(self, callback, maxLoad=None, maxPressure=None, idle=False, uid=None):
+        self._waiters[callback] = ( maxLoad, dict(maxPressure or {}), idle, uid )
+        self._update()
+
+    def removeWaiter(self, callback):
+        if self._waiters.pop(callback, None) is not None:
+            self._update()
+
+    def _update(self):
+        thresholds = set()
+        sampling = False
+        for maxLoad, maxPressure, idle, uid in self._waiters.values():
+            thresholds.update(maxPressure.items())
+            sampling = sampling or maxLoad is not None
+
+        for key, trigger in list(self._triggers.items()):
+            if not trigger.armed:
+                self._failedTriggers.add(key)
+            if key not in thresholds or not trigger.armed:
+                self._triggers.pop(key).disarm()
+
+        for key in thresholds:
+            if key in self._triggers or key in self._failedTriggers:
+                continue
+
+            trigger = self._createTrigger(*key)
+            if trigger is None:
+                self._failedTriggers.add(key)
+                continue
+
+            # the trigger fires on changes only, thus take the current pressure into account
+            pressure = self.getPressure(trigger.resource)
+            if pressure is not None and pressure > trigger.threshold:
+                trigger.notice()
+
+            self._triggers[key] = trigger
+
+        # fall back to sampling if pressure triggers aren't supported
+        sampling = sampling or any(key in self._failedTriggers for key in thresholds)
+
+        if sampling and self._samplingTimeoutId is None:
+            self._samplingTimeoutId = self._scheduler.add(
+                self._scheduler.clock.now() + datetime.timedelta(0, self._SAMPLING_INTERVAL),
+                self._samplingCallback
+            )
+        elif not sampling and self._samplingTimeoutId is not None:
+            self._scheduler.remove(self._samplingTimeoutId)
+            self._samplingTimeoutId = None
+
+    def _createTrigger(self, resource, threshold):
+        trigger = PressureTrigger(resource, threshold, self._triggerCallback, self._scheduler)
+        return trigger if trigger.arm() else None
+
+    def _getIdleHint(self, uid=None):
+        idleHint = self._idleHints.get(uid)
+        if idleHint is None:
+            idleHint = self._idleHints[uid] = self._createIdleHint(uid)
+            idleHint.resolve()
+
+            # the user's graphical session might change, thus resolve it again after users logged in or out
+            if self._sessionSubscriptions is None:
+                self._subscribeSessions()
+
+        return idleHint
+
+    def _createIdleHint(self, uid):
+        return SessionIdleHint(self._busManager, self._notifyWaiters, uid)
+
+    def _subscribeSessions(self):
+        self._sessionSubscriptions = []
+
+        try:
+            for signal in ( "SessionNew", "SessionRemoved" ):
+                self._sessionSubscriptions.append(self._busManager.subscribe(
+                    self._sessionsCallback,
+                    "org.freedesktop.login1.Manager",
+                    signal,
+                    "org.freedesktop.login1",
+                    self._LOGIND_PATH
+                ))
+        except dbus.exceptions.DBusException as error:
+            self._logger.warning("Unable to monitor sessions: %s", str(error))
+
+    def _sessionsCallback(self, sessionId, sessionPath):
+        for idleHint in self._idleHints.values():
+            idleHint.close()
+        self._idleHints.clear()
+
+        self._notifyWaiters()
+
+    def _triggerCallback(self):
+        self._notifyWaiters()
+        self._update()
+
+    def _samplingCallback(self):
+        self._samplingTimeoutId = None
+
+        self._notifyWaiters()
+        self._update()
+
+    def _notifyWaiters(self):
+        for callback in list(self._waiters):
+            if callback in self._waiters:
+                callback()
+
+class SessionNotification(object):
+    _service = None
+
+    _id = 0
+    _summary = None
+    _message = None
+    _icon = None
+
+    _hints = None
+    _timeout = -1
+    _actions = None
+    _closedCallback = None
+
+    def __init__(self, service, summary, message="", icon=""):
+        self._service = service
+        self._summary = summary
+        self._message = message
+        self._icon = icon
+
+        self._hints = {}
+        self._actions = collections.OrderedDict()
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def summary(self):
+        return self._summary
+
+    @property
+    def message(self):
+        return self._message
+
+    @property
+    def icon(self):
+        return self._icon
+
+    def set_urgency(self, urgency):
+        self._hints["urgency"] = dbus.Byte(urgency)
+
+    def set_timeout(self, timeout):
+        self._timeout = int(timeout)
+
+    def set_category(self, category):
+        self._hints["category"] = category
+
+    def add_action(self, action, label, callback):
+        self._actions[action] = ( label, callback )
+
+    def connect(self, signal, callback):
+        if signal == "closed":
+            self._closedCallback = callback
+
+    def show(self):
+        actions = []
+        for action, ( label, callback ) in self._actions.items():
+            actions += [ action, label ]
+
+        self._id = self._service.notify(self, self._icon, self._summary, self._message, actions, self._hints,
+            self._timeout)
+        return True
+
+    def close(self):
+        if self._id != 0:
+            self._service.closeNotification(self._id)
+
+    def invokeAction(self, action):
+        if action in self._actions:
+            self._actions[action][1](self, action)
+
+    def invokeClosed(self):
+        if self._closedCallback is not None:
+            self._closedCallback(self)
+
+class SessionNotificationService(object):
+    URGENCY_LOW = 0
+    URGENCY_NORMAL = 1
+    URGENCY_CRITICAL = 2
+
+    EXPIRES_DEFAULT = -1
+    EXPIRES_NEVER = 0
+
+    _NOTIFICATIONS_NAME = "org.freedesktop.Notifications"
+    _NOTIFICATIONS_PATH = "/org/freedesktop/Notifications"
+
+    _session = None
+    _appName = None
+
+    _bus = None
+    _interface = None
+    _notifications = None
+
+    _logger = None
+
+    def __init__(self, session):
+        self._session = session
+        self._notifications = {}
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "session"))
+
+    def init(self, app):
+        self._appName = app
+
+        # connect on first use; the user might not be logged in yet, or has logged out in the meantime
+        if self._bus is not None and not self._bus.get_is_connected():
+            self._bus = None
+            self._interface = None
+            self._notifications.clear()
+
+        return True
+
+    def is_initted(self):
+        return self._appName is not None
+
+    def get_server_caps(self):
+        return [ str(capability) for capability in self._getInterface().GetCapabilities() ]
+
+    def Notification(self, summary, message="", icon=""):
+        return SessionNotification(self, summary, message, icon)
+
+    def notify(self, notification, icon, summary, message, actions, hints, timeout):
+        notificationId = int(self._getInterface().Notify(self._appName, notification.id, icon, summary, message,
+            actions, hints, timeout))
+
+        self._notifications[notificationId] = notification
+        return notificationId
+
+    def closeNotification(self, notificationId):
+        self._getInterface().CloseNotification(notificationId)
+
+    def _getInterface(self):
+        if self._interface is None:
+            self._logger.debug("Connecting to the session bus of user %s...", self._session.name)
+
+            self._bus = self._session.connectBus()
+
+            notificationsObject = self._bus.get_object(self._NOTIFICATIONS_NAME, self._NOTIFICATIONS_PATH)
+            self._interface = dbus.Interface(notificationsObject, dbus_interface=self._NOTIFICATIONS_NAME)
+            self._interface.connect_to_signal("ActionInvoked", self._actionCallback)
+            self._interface.connect_to_signal("NotificationClosed", self._closedCallback)
+
+        return self._interface
+
+    def _actionCallback(self, notificationId, action):
+        notification = self._notifications.get(int(notificationId))
+        if notification is not None:
+            notification.invokeAction(str(action))
+
+    def _closedCallback(self, notificationId, reason):
+        notification = self._notifications.pop(int(notificationId), None)
+        if notification is not None:
+            notification.invokeClosed()
+
+class UserSession(object):
+    _LOGIND_PATH = "/org/freedesktop/login1"
+
+    # the user's session bus is started shortly after logind announced the user's login
+    _LOGIN_RETRY_INTERVAL = 2
+    _LOGIN_RETRIES = 30
+
+    _name = None
+    _uid = None
+    _gid = None
+    _groups = None
+    _home = None
+    _shell = None
+    _busAddress = None
+
+    _busManager = None
+    _scheduler = None
+
+    _notificationService = None
+    _stateStore = None
+
+    _loginSubscription = None
+    _loginTimeoutId = None
+    _loginRetries = 0
+    _waiters = None
+
+    _logger = None
+
+    def __init__(self, name, busAddress=None, busManager=None, scheduler=None):
+        try:
+            passwd = pwd.getpwnam(name)
+        except KeyError:
+            raise ValueError("Unknown user '{}' given".format(name))
+
+        self._name = passwd.pw_name
+        self._uid = passwd.pw_uid
+        self._gid = passwd.pw_gid
+        self._groups = tuple(os.getgrouplist(passwd.pw_name, passwd.pw_gid))
+        self._home = passwd.pw_dir
+        self._shell = passwd.pw_shell
+
+        self._busAddress = busAddress or "unix:path={}/bus".format(self.runtimeDir)
+
+        self._busManager = busManager
+        self._scheduler = scheduler if scheduler is not None else Scheduler.getInstance()
+        self._waiters = []
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "session"))
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def uid(self):
+        return self._uid
+
+    @property
+    def gid(self):
+        return self._gid
+
+    @property
+    def home(self):
+        return self._home
+
+    @property
+    def runtimeDir(self):
+        return "/run/user/{}".format(self._uid)
+
+    @property
+    def busAddress(self):
+        return self._busAddress
+
+    @property
+    def foreign(self):
+        return self._uid != os.geteuid()
+
+    @property
+    def available(self):
+        # only the user's session bus socket can be checked; other bus addresses are assumed to be available
+        for address in self._busAddress.split(";"):
+            if address.startswith("unix:path="):
+                return os.path.exists(address[10:].split(",", 1)[0])
+        return True
+
+    @property
+    def environment(self):
+        environment = {
+            "HOME": self._home,
+            "USER": self._name,
+            "LOGNAME": self._name,
+            "SHELL": self._shell,
+            "PATH": os.environ.get("PATH", os.defpath),
+            "XDG_RUNTIME_DIR": self.runtimeDir,
+            "DBUS_SESSION_BUS_ADDRESS": self._busAddress
+        }
+
+        if "LANG" in os.environ:
+            environment["LANG"] = os.environ["LANG"]
+
+        return environment
+
+    @property
+    def notificationService(self):
+        if self._notificationService is None:
+            self._notificationService = SessionNotificationService(self)
+        return self._notificationService
+
+    @property
+    def stateStore(self):
+        if self._stateStore is None:
+            with self.impersonate():
+                path = StateStore.getDefaultPath(self.getCachePath("cron-notify"))
+            self._stateStore = StateStore(path, impersonate=self.impersonate)
+
+        return self._stateStore
+
+    def getConfigPaths(self, resource):
+        # the user's environment isn't known, thus XDG_CONFIG_HOME is assumed to be the default
+        configDirs = [ os.path.join(self._home, ".config") ] + list(BaseDirectory.xdg_config_dirs[1:])
+        configPaths = [ os.path.join(configDir, resource) for configDir in configDirs ]
+
+        with self.impersonate():
+            return [ configPath for configPath in configPaths if os.path.isdir(configPath) ]
+
+    def getCachePath(self, resource):
+        cachePath = os.path.join(self._home, ".cache")
+        with self.impersonate():
+            for path in ( cachePath, os.path.join(cachePath, resource) ):
+                if not os.path.isdir(path):
+                    os.mkdir(path, 0o700)
+
+        return os.path.join(cachePath, resource)
+
+    @contextlib.contextmanager
+    def impersonate(self):
+        # the files of other users must be accessed with their credentials only, they might e.g. be symlinks to files
+        # of root; nested calls are no-ops, because the session isn't foreign while impersonating its user
+        if not self.foreign:
+            yield
+            return
+
+        previousGroups, previousGid, previousUid = os.getgroups(), os.getegid(), os.geteuid()
+        os.setgroups(self._groups)
+        os.setegid(self._gid)
+        os.seteuid(self._uid)
+        try:
+            yield
+        finally:
+            os.seteuid(previousUid)
+            os.setegid(previousGid)
+            os.setgroups(previousGroups)
+
+    def getSpawnArgs(self):
+        spawnArgs = { "env": self.environment, "cwd": self._home }
+        if self.foreign:
+            spawnArgs.update({ "user": self._uid, "group": self._gid, "extra_groups": list(self._groups) })
+        return spawnArgs
+
+    def connectBus(self):
+        # session buses accept connections of their own user only
+        mainLoop = dbus.mainloop.glib.DBusGMainLoop()
+        with self.impersonate():
+            return dbus.bus.BusConnection(self._busAddress, mainloop=mainLoop)
+
+    def addWaiter(self, callback):
+        if callback not in self._waiters:
+            self._waiters.append(callback)
+
+        if self._loginSubscription is None:
+            try:
+                busManager = self._busManager if self._busManager is not None else BusManager.getInstance()
+                self._loginSubscription = busManager.subscribe(
+                    self._userNewCallback,
+                    "org.freedesktop.login1.Manager",
+                    "UserNew",
+                    "org.freedesktop.login1",
+                    self._LOGIND_PATH
+                )
+            except dbus.exceptions.DBusException as error:
+                self._logger.warning("Unable to monitor logins of user %s: %s", self._name, str(error))
+
+    def removeWaiter(self, callback):
+        if callback in self._waiters:
+            self._waiters.remove(callback)
+
+        if not self._waiters:
+            if self._loginSubscription is not None:
+                self._loginSubscription.remove()
+                self._loginSubscription = None
+
+            if self._loginTimeoutId is not None:
+                self._scheduler.remove(self._loginTimeoutId)
+                self._loginTimeoutId = None
+
+    def _userNewCallback(self, uid, path):
+        if int(uid) != self._uid:
+            return
+
+        self._logger.debug("User %s logged in", self._name)
+
+        self._loginRetries = self._LOGIN_RETRIES
+        if self._loginTimeoutId is None:
+            self._loginTimeoutCallback()
+
+    def _loginTimeoutCallback(self):
+        self._loginTimeoutId = None
+
+        if self.available:
+            for callback in list(self._waiters):
+                callback()
+            return
+
+        if self._loginRetries > 0:
+            self._loginRetries -= 1
+            self._loginTimeoutId = self._scheduler.add(
+                self._scheduler.clock.now() + datetime.timedelta(0, self._LOGIN_RETRY_INTERVAL),
+                self._loginTimeoutCallback
+            )
+
+class NotificationTemplate(object):
+    __slots__ = ( "_summary", "_message", "_icon" )
+
+    _instances = {}
+
+    def __init__(self, summary, message, icon):
+        self._summary = summary
+        self._message = message
+        self._icon = icon
+
+    @classmethod
+    def getInstance(cls, summary, message, icon):
+        # templates are immutable, thus all cronjobs using the same template share a single instance
+        key = ( sys.intern(summary), sys.intern(message), sys.intern(icon) )
+        if key not in cls._instances:
+            cls._instances[key] = cls(*key)
+        return cls._instances[key]
+
+    @property
+    def summary(self):
+        return self._summary
+
+    @property
+    def message(self):
+        return self._message
+
+    @property
+    def icon(self):
+        return self._icon
+
+    def replace(self, summary=None, message=None, icon=None):
+        return self.getInstance(
+            summary if summary is not None else self._summary,
+            message if message is not None else self._message,
+            icon if icon is not None else self._icon
+        )
+
+    def format(self, *args):
+        return { "summary": self._summary, "message": self._message.format(*args), "icon": self._icon }
+
+    def toDict(self):
+        return { "summary": self._summary, "message": self._message, "icon": self._icon }
+
+class NotificationGroup(object):
+    _notificationTemplate = NotificationTemplate.getInstance(
+        "cron-notify",
+        "It's time to execute {} cronjobs!",
+        "appointment-soon"
+    )
+
+    _members = None
+    _scheduler = None
+
+    _notification = None
+    _timeoutId = None
+
+    def __init__(self, members, scheduler=None):
+        self._members = list(members)
+        self._scheduler = scheduler if scheduler is not None else Scheduler.getInstance()
+
+    @property
+    def members(self):
+        return self._members
+
+    def show(self):
+        notificationData = self._notificationTemplate.format(len(self._members))
+
+        # use the cronjobs' own summary and icon, as long as they agree
+        for variable in ( "summary", "icon" ):
+            memberValues = set(getattr(member.notificationTemplate, variable) for member in self._members)
+            if len(memberValues) == 1:
+                notificationData[variable] = memberValues.pop()
+
+        # all cronjobs of a group share the same notification service, i.e. belong to the same user
+        notificationService = self._members[0].notificationService
+
+        try:
+            serverCaps = notificationService.get_server_caps()
+        except dbus.exceptions.DBusException:
+            self._members[0].logger.error("Failed to send notification")
+            self._reinitNotificationService()
+            self._retry()
+            return
+
+        if "body" in serverCaps:
+            notificationData["message"] += "\n" + "\n".join(
+                "\u2022 " + html.escape(member.formatName(), quote=False) for member in self._members
+            )
+
+        self._notification = notificationService.Notification(**notificationData)
+
+        self._notification.set_urgency(notificationService.URGENCY_NORMAL)
+        self._notification.set_timeout(notificationService.EXPIRES_NEVER)
+        self._notification.set_category("presence")
+
+        self._notification.add_action("start", "Start all", self._notificationCallback)
+        self._notification.add_action("skip", "Skip all", self._notificationCallback)
+        self._notification.add_action("later", "Later", self._notificationCallback)
+        self._notification.add_action("default", "", self._notificationCallback)
+        self._notification.connect("closed", self._notificationCloseCallback)
+
+        for member in self._members:
+            member.attachNotification(self._notification)
+            member.logger.info("Sending notification (combined with %s other cronjobs)...", len(self._members) - 1)
+
+        timeout = min(member.sleepTime for member in self._members)
+        self._timeoutId = self._scheduler.add(
+            self._scheduler.clock.now() + datetime.timedelta(0, timeout),
+            self._notificationTimeoutCallback
+        )
+
+        try:
+            notificationShown = self._members[0].showNotification(self._notification)
+        except RuntimeError:
+            # the notification service couldn't be re-initialized
+            notificationShown = False
 
-try:
-    import pynotify
-except ImportError:
-    import notify2 as pynotify
+        if not notificationShown:
+            self._scheduler.remove(self._timeoutId)
+            self._timeoutId = None
 
-class CronNotify(object):
-    _STATUS_SUCCESS = 0
-    _STATUS_TRY_AGAIN = 1
-    _STATUS_WARNING = 2
-    _STATUS_ERROR = 3
+            self._retry()
 
-    _app = "cron-notify"
+    def _reinitNotificationService(self):
+        try:
+            self._members[0].reinitNotificationService()
+        except RuntimeError:
+            pass
 
-    _id = None
-    _commands = None
-    _async = True
+    def _retry(self):
+        # the coalescer already forgot about the cronjobs, thus they must try again on their own
+        for member in self._members:
+            member.detachNotification()
 
-    _name = None
-    _cronExpression = "0 8 * * *"
-    _sleepTime = 3600
-    _mainPower = False
+    def _notificationCallback(self, notification, action):
+        for member in self._members:
+            member.deliverNotificationResponse(notification, action)
 
-    _bypassMainPower = False
+    def _notificationCloseCallback(self, notification):
+        if self._timeoutId is not None:
+            self._scheduler.remove(self._timeoutId)
+            self._timeoutId = None
 
-    _cacheFile = None
+        for member in self._members:
+            member.deliverNotificationResponse(notification)
 
-    _lastExecution = None
-    _nextExecution = None
+    def _notificationTimeoutCallback(self):
+        self._timeoutId = None
+        self._members = [ member for member in self._members if not member.stopped ]
 
-    _executionId = 0
-    _lock = None
+        for member in self._members:
+            member.deliverNotificationResponse(self._notification, "ignore")
+            member.logger.info("User ignored the notification")
 
-    _bus = None
-    _resumeSignal = None
-    _batterySignal = None
+        try:
+            self._notification.close()
+        except dbus.exceptions.DBusException:
+            if not self._members:
+                return
 
-    _timeoutId = None
-    _timeoutTime = None
+            self._reinitNotificationService()
+            self._retry()
 
-    _notification = None
-    _notificationAction = None
-    _notificationTimeoutId = None
-    _notificationTimeoutTime = None
+class NotificationCoalescer(object):
+    _instance = None
+
+    _window = 0
+    _scheduler = None
+
+    _pending = None
+    _flushTimeoutId = None
+
+    def __init__(self, window=0, scheduler=None):
+        self._window = window
+        self._scheduler = scheduler if scheduler is not None else Scheduler.getInstance()
+        self._pending = []
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def window(self):
+        return self._window
+
+    @window.setter
+    def window(self, window):
+        self._window = max(int(window), 0)
+
+    def add(self, cronNotify):
+        if cronNotify in self._pending:
+            return
+
+        self._pending.append(cronNotify)
 
-    _streams = { "stdin": None, "stdout": None, "stderr": None }
+        if self._flushTimeoutId is None:
+            self._flushTimeoutId = self._scheduler.add(
+                self._scheduler.clock.now() + datetime.timedelta(0, self._window),
+                self._flushCallback
+            )
+
+    def remove(self, cronNotify):
+        if cronNotify in self._pending:
+            self._pending.remove(cronNotify)
+
+    def _flushCallback(self):
+        self._flushTimeoutId = None
+
+        # notifications are combined per user only
+        groups = collections.OrderedDict()
+        for member in self._pending:
+            groups.setdefault(member.session, []).append(member)
+
+        self._pending = []
+
+        for members in groups.values():
+            if len(members) == 1:
+                members[0].notify()
+            else:
+                NotificationGroup(members, self._scheduler).show()
+
+class CatchUpPlanner(object):
+    _instance = None
+
+    _window = 0
+    _scheduler = None
+
+    _pending = None
+    _planTimeoutId = None
+
+    def __init__(self, window=0, scheduler=None):
+        self._window = window
+        self._scheduler = scheduler if scheduler is not None else Scheduler.getInstance()
+        self._pending = []
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def window(self):
+        return self._window
+
+    @window.setter
+    def window(self, window):
+        self._window = max(int(window), 0)
+
+    @staticmethod
+    def getJitter(app, id):
+        digest = hashlib.sha1("{}/{}".format(app, id).encode("utf-8")).digest()
+        return struct.unpack(">I", digest[:4])[0] / 2 ** 32
+
+    def add(self, cronNotify, timeout=0):
+        self.remove(cronNotify)
+        self._pending.append(( cronNotify, timeout ))
+
+        # plan all cronjobs catching up at the same time at once
+        if self._planTimeoutId is None:
+            self._planTimeoutId = self._scheduler.add(self._scheduler.clock.now(), self._planCallback)
+
+    def remove(self, cronNotify):
+        self._pending = [ item for item in self._pending if item[0] is not cronNotify ]
+
+    def _planCallback(self):
+        self._planTimeoutId = None
+
+        pending = self._pending
+        self._pending = []
+
+        if not pending:
+            return
+
+        jitters = { cronNotify: self.getJitter(cronNotify.app, cronNotify.id) for cronNotify, timeout in pending }
+        pending.sort(key=lambda item: ( -item[0].priority, jitters[item[0]], item[0].app, item[0].id ))
+
+        slotLength = self._window / len(pending)
+        for index, ( cronNotify, timeout ) in enumerate(pending):
+            delay = int(slotLength * (index + jitters[cronNotify]))
+            if delay > 0:
+                cronNotify.logger.info("Catching up in %s seconds (%s of %s)...", delay, index + 1, len(pending))
+
+            cronNotify.reschedule(timeout + delay)
+
+class ControlServer(object):
+    _instance = None
+
+    _maxRequestSize = 65536
+    _maxPendingResponseSize = 16 * 1024 * 1024
+
+    _path = None
+    _socket = None
+    _watchId = None
+    _clients = None
+
+    _cronNotifies = None
 
     _logger = None
 
-    _nameTemplate = ( "cronjob", 'cronjob "{}"' )
-    _notificationData = {
-        "summary": "cron-notify",
-        "message": "It's time to execute {}!",
-        "icon": "appointment-soon"
+    def __init__(self):
+        self._clients = {}
+        self._cronNotifies = {}
+
+        self._logger = logging.getLogger("{}.{}".format(__name__, "control"))
+
+    @classmethod
+    def getInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def getDefaultPath():
+        return os.path.join(BaseDirectory.get_runtime_dir(strict=False), "cron-notify", "control.sock")
+
+    @property
+    def path(self):
+        return self._path
+
+    def register(self, cronNotify):
+        self._cronNotifies[cronNotify.key] = cronNotify
+
+    def unregister(self, cronNotify):
+        if self._cronNotifies.get(cronNotify.key) is cronNotify:
+            del self._cronNotifies[cronNotify.key]
+
+    def start(self, path=None):
+        assert self._socket is None
+
+        if path is None:
+            path = self.getDefaultPath()
+
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+        # remove stale sockets of crashed processes, but don't steal the socket of a running process
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except ConnectionRefusedError:
+                os.remove(path)
+            else:
+                raise OSError(errno.EADDRINUSE, os.strerror(errno.EADDRINUSE), path)
+            finally:
+                probe.close()
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.setblocking(False)
+
+        oldUmask = os.umask(0o177)
+        try:
+            self._socket.bind(path)
+        finally:
+            os.umask(oldUmask)
+
+        self._socket.listen(8)
+        self._path = path
+
+        self._watchId = GLib.io_add_watch(
+            self._socket.fileno(),
+            GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN,
+            self._acceptCallback
+        )
+
+        self._logger.debug("Listening on %s...", path)
+
+    def stop(self):
+        if self._socket is None:
+            return
+
+        GLib.source_remove(self._watchId)
+        self._watchId = None
+
+        for client in list(self._clients.keys()):
+            self._closeClient(client)
+
+        self._socket.close()
+        self._socket = None
+
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+    def handleRequest(self, request):
+        command = request.get("command")
+
+        if command == "list":
+            return { "jobs": [ cronNotify.getStatus() for cronNotify in self._cronNotifies.values() ] }
+
+        if command == "metrics":
+            metrics = Metrics.getInstance()
+            if not metrics.enabled:
+                raise RuntimeError("Metrics are disabled")
+
+            if request.get("format") == "prometheus":
+                return { "metrics": metrics.toPrometheus() }
+            return { "metrics": metrics.toDict() }
+
+        cronNotify = self._cronNotifies.get(request.get("job"))
+        if cronNotify is None:
+            raise ValueError("Unknown job '{}' given".format(request.get("job")))
+
+        if command == "status":
+            pass
+        elif command in ( "start", "skip" ):
+            cronNotify.respond(command)
+        elif command == "snooze":
+            cronNotify.respond("later", request.get("seconds"))
+        elif command == "cancel":
+            cronNotify.cancel()
+        elif command == "reset":
+            cronNotify.resetCache()
+            cronNotify.reschedule()
+        else:
+            raise ValueError("Unknown command '{}' given".format(command))
+
+        return { "job": cronNotify.getStatus() }
+
+    def _acceptCallback(self, fd, condition):
+        try:
+            client, address = self._socket.accept()
+        except BlockingIOError:
+            return True
+
+        # never block the main loop, not even for slow or stalled clients; responses are sent when possible
+        client.setblocking(False)
+
+        watchId = GLib.io_add_watch(
+            client.fileno(),
+            GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+            self._clientCallback,
+            client
+        )
+
+        # each client has a watch for reading, a request buffer, a response buffer and a watch for writing
+        self._clients[client] = [ watchId, bytearray(), bytearray(), None ]
+
+        return True
+
+    def _clientCallback(self, fd, condition, client):
+        buffer = self._clients[client][1]
+
+        try:
+            data = client.recv(self._maxRequestSize)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b""
+
+        if not data:
+            self._closeClient(client)
+            return False
+
+        buffer.extend(data)
+        while b"\n" in buffer:
+            line, _, remainder = bytes(buffer).partition(b"\n")
+            buffer[:] = remainder
+
+            if line.strip():
+                if not self._respond(client, line):
+                    self._closeClient(client)
+                    return False
+
+        if len(buffer) > self._maxRequestSize:
+            self._closeClient(client)
+            return False
+
+        return True
+
+    def _respond(self, client, line):
+        try:
+            request = json.loads(line.decode("utf-8"))
+            if not isinstance(request, dict):
+                raise ValueError("Invalid request given")
+
+            response = self.handleRequest(request)
+            response["ok"] = True
+        except (ValueError, RuntimeError) as error:
+            response = { "ok": False, "error": str(error) }
+        except Exception as error:
+            self._logger.error(
+                "While handling a control request, a exception occurred: %s: %s",
+                type(error).__name__,
+                str(error),
+                exc_info=True
+            )
+            response = { "ok": False, "error": "{}: {}".format(type(error).__name__, str(error)) }
+
+        responseBuffer = self._clients[client][2]
+        responseBuffer.extend(json.dumps(response, default=self._serialize).encode("utf-8") + b"\n")
+
+        # don't buffer the responses of clients that don't read them forever
+        if len(responseBuffer) > self._maxPendingResponseSize:
+            return False
+
+        return self._flush(client)
+
+    def _flush(self, client):
+        clientState = self._clients[client]
+        responseBuffer = clientState[2]
+
+        try:
+            while responseBuffer:
+                del responseBuffer[:client.send(responseBuffer)]
+        except BlockingIOError:
+            pass
+        except OSError:
+            return False
+
+        if responseBuffer and clientState[3] is None:
+            clientState[3] = GLib.io_add_watch(
+                client.fileno(),
+                GLib.PRIORITY_DEFAULT,
+                GLib.IO_OUT | GLib.IO_HUP | GLib.IO_ERR,
+                self._writeCallback,
+                client
+            )
+
+        return True
+
+    def _writeCallback(self, fd, condition, client):
+        if not self._flush(client):
+            self._closeClient(client)
+            return False
+
+        if self._clients[client][2]:
+            return True
+
+        self._clients[client][3] = None
+        return False
+
+    def _closeClient(self, client):
+        watchId, buffer, responseBuffer, writeWatchId = self._clients.pop(client)
+        GLib.source_remove(watchId)
+        if writeWatchId is not None:
+            GLib.source_remove(writeWatchId)
+        client.close()
+
+    @staticmethod
+    def _serialize(value):
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
+
+class CronNotify(object):
+    __slots__ = (
+        "_app", "_id", "_commands", "_async", "_name", "_cronExpression", "_sleepTime", "_mainPower", "_minBattery",
+        "_maxLoad", "_maxPressure", "_waitForIdle", "_bypassGates", "_state", "_lastExecution", "_nextExecution",
+        "_executionId", "_execution", "_group", "_maxConcurrent", "_priority", "_scheduler", "_executor", "_busManager",
+        "_bus", "_resumeSignal", "_powerState", "_powerWaiting", "_systemLoad", "_loadWaiting", "_stopped",
+        "_timeoutId", "_timeoutTime", "_catchUpPlanner", "_notificationCoalescer", "_notification",
+        "_notificationAction", "_notificationTimeoutId", "_notificationTimeoutTime", "_notificationTime", "_streams",
+        "_outputTail", "_logger", "_nameTemplate", "_notificationTemplate", "_statusNotificationTemplates",
+        "_resourcePolicy", "_executionTimeout", "_timeoutGrace", "_runningNotification", "_runningNotificationTemplate",
+        "_notificationService", "_session", "_sessionWaiting", "_history", "_historyMaxAge"
+    )
+
+    _STATUS_SUCCESS = 0
+    _STATUS_TRY_AGAIN = 1
+    _STATUS_WARNING = 2
+    _STATUS_ERROR = 3
+    _STATUS_TIMEOUT = 4
+    _STATUS_CANCELLED = 5
+
+    _STATUS_NAMES = {
+        _STATUS_SUCCESS: "success",
+        _STATUS_TRY_AGAIN: "try_again",
+        _STATUS_WARNING: "warning",
+        _STATUS_ERROR: "error",
+        _STATUS_TIMEOUT: "timeout",
+        _STATUS_CANCELLED: "cancelled"
     }
-    _statusNotificationData = {
-        _STATUS_SUCCESS: {
-            "summary": "cron-notify",
-            "message": "Your recent {} was successful. Yay!",
-            "icon": "dialog-information"
-        },
-        _STATUS_WARNING: {
-            "summary": "cron-notify",
-            "message": "Your recent {} finished with warnings. " +
-                "This might not be a problem, but you should check your logs.",
-            "icon": "dialog-warning"
-        },
-        _STATUS_ERROR: {
-            "summary": "cron-notify",
-            "message": "Your recent {} failed. Check your logs!",
-            "icon": "dialog-error"
-        }
+
+    _DEFAULT_STREAMS = { "stdin": None, "stdout": None, "stderr": None }
+    _DEFAULT_MAX_PRESSURE = {}
+    _DEFAULT_RESOURCE_POLICY = ResourcePolicy()
+
+    _DEFAULT_NAME_TEMPLATE = ( "cronjob", 'cronjob "{}"' )
+    _DEFAULT_NOTIFICATION_TEMPLATE = NotificationTemplate.getInstance(
+        "cron-notify",
+        "It's time to execute {}!",
+        "appointment-soon"
+    )
+    _DEFAULT_RUNNING_NOTIFICATION_TEMPLATE = NotificationTemplate.getInstance(
+        "cron-notify",
+        "Your {} is running...",
+        "system-run"
+    )
+    _DEFAULT_STATUS_NOTIFICATION_TEMPLATES = {
+        _STATUS_SUCCESS: NotificationTemplate.getInstance(
+            "cron-notify",
+            "Your recent {} was successful. Yay!",
+            "dialog-information"
+        ),
+        _STATUS_WARNING: NotificationTemplate.getInstance(
+            "cron-notify",
+            "Your recent {} finished with warnings. This might not be a problem, but you should check your logs.",
+            "dialog-warning"
+        ),
+        _STATUS_ERROR: NotificationTemplate.getInstance(
+            "cron-notify",
+            "Your recent {} failed. Check your logs!",
+            "dialog-error"
+        ),
+        _STATUS_TIMEOUT: NotificationTemplate.getInstance(
+            "cron-notify",
+            "Your recent {} timed out and was terminated. Check your logs!",
+            "dialog-error"
+        )
     }
 
-    def __init__(self, commands, app=None, id=None, runAsync=False):
+    # if the user isn't logged in, notifications can't be sent; retry later instead of right away
+    _SESSION_RETRY_TIME = 60
+
+    # don't tell the user how long a cronjob usually takes based on a single run
+    _EXPECTED_DURATION_MIN_RUNS = 3
+
+    def __init__(self, commands, app=None, id=None, runAsync=False, scheduler=None, executor=None, session=None,
+            stateStore=None, busManager=None, powerState=None, systemLoad=None, notificationService=None,
+            notificationCoalescer=None, catchUpPlanner=None):
         if not commands or len(commands) == 0:
             raise ValueError("Invalid commands given")
 
-        if app is not None:
-            if not re.match(r'^[\w.-]*$', app):
-                raise ValueError("Invalid app given")
-            self._app = app
+        if app is not None and not re.match(r'^[\w.-]*$', app):
+            raise ValueError("Invalid app given")
+        if id is not None and not re.match(r'^[\w.-]*$', id):
+            raise ValueError("Invalid id given")
 
-        if id is not None:
-            if not re.match(r'^[\w.-]*$', id):
-                raise ValueError("Invalid id given")
-            self._id = id
-        else:
-            self._id = hashlib.sha1(str(commands).encode("utf-8")).hexdigest()
+        self._app = app if app is not None else "cron-notify"
+        self._id = id if id is not None else hashlib.sha1(str(commands).encode("utf-8")).hexdigest()
 
-        self._commands = commands
+        self._commands = self._initCommands(commands)
         self._async = runAsync
 
-        logHandler = logging.StreamHandler(stream=sys.stderr)
-        logHandler.setFormatter(logging.Formatter("%(asctime)s: %(levelname)s: %(message)s", "%Y-%m-%d %H:%M:%S"))
+        # cronjobs of other users (or rather of other users' sessions) in multi-user mode
+        self._session = session
+        self._sessionWaiting = False
 
-        self._logger = logging.getLogger("{}.{}.{}.{}".format(__name__, self._app, os.getpid(), self._id))
-        self._logger.addHandler(logHandler)
-        self._logger.setLevel(logging.WARNING)
+        self._name = None
+        self._cronExpression = "0 8 * * *"
+        self._sleepTime = 3600
+        self._mainPower = False
+        self._minBattery = None
+        self._maxLoad = None
+        self._maxPressure = self._DEFAULT_MAX_PRESSURE
+        self._waitForIdle = False
+        self._bypassGates = False
 
-        self._cacheFile = BaseDirectory.save_cache_path(self._app) + "/" + self._id
+        self._state = stateStore
+        self._lastExecution = None
+        self._nextExecution = None
 
-        self._lock = threading.Lock()
+        self._executionId = 0
+        self._execution = None
+
+        self._group = None
+        self._maxConcurrent = None
+        self._priority = 0
+
+        self._busManager = busManager
+        self._bus = None
+        self._resumeSignal = None
+
+        self._powerState = powerState
+        self._powerWaiting = False
+
+        self._systemLoad = systemLoad
+        self._loadWaiting = False
+
+        self._notificationService = notificationService
+
+        self._stopped = False
+
+        self._timeoutId = None
+        self._timeoutTime = None
+
+        self._notification = None
+        self._notificationAction = None
+        self._notificationTimeoutId = None
+        self._notificationTimeoutTime = None
+        self._notificationTime = None
+
+        self._streams = self._DEFAULT_STREAMS
+        self._outputTail = 5
+        self._resourcePolicy = self._DEFAULT_RESOURCE_POLICY
+
+        self._executionTimeout = None
+        self._timeoutGrace = 30
+        self._runningNotification = True
+
+        self._history = True
+        self._historyMaxAge = 365 * 86400
+
+        # templates are shared until a cronjob overrides them; they are replaced, never changed
+        self._nameTemplate = self._DEFAULT_NAME_TEMPLATE
+        self._notificationTemplate = self._DEFAULT_NOTIFICATION_TEMPLATE
+        self._statusNotificationTemplates = self._DEFAULT_STATUS_NOTIFICATION_TEMPLATES
+        self._runningNotificationTemplate = self._DEFAULT_RUNNING_NOTIFICATION_TEMPLATE
+
+        # when reconfiguring a cronjob, its new instance shares the logger (and its handler) with the old instance
+        self._logger = JobLogger.getInstance(self._app, self._id, session.name if session is not None else None)
+
+        self._scheduler = scheduler if scheduler is not None else Scheduler.getInstance()
+        self._executor = executor if executor is not None else Executor.getInstance()
+        self._notificationCoalescer = notificationCoalescer if notificationCoalescer is not None \
+            else NotificationCoalescer.getInstance()
+        self._catchUpPlanner = catchUpPlanner if catchUpPlanner is not None else CatchUpPlanner.getInstance()
 
     @property
     def app(self):
@@ -138,6 +3878,31 @@ class CronNotify(object):
     def id(self):
         return self._id
 
+    @property
+    def session(self):
+        return self._session
+
+    @property
+    def key(self):
+        return self._id if self._session is None else "{}/{}".format(self._session.name, self._id)
+
+    @property
+    def notificationService(self):
+        if self._notificationService is not None:
+            return self._notificationService
+        return self._session.notificationService if self._session is not None else pynotify
+
+    @property
+    def notificationTemplate(self):
+        return self._notificationTemplate
+
+    @property
+    def state(self):
+        if self._state is None:
+            self._state = self._session.stateStore if self._session is not None else StateStore.getInstance()
+            self._state.importLegacyCacheFile(self._app, self._id, self._getCacheFile())
+        return self._state
+
     @property
     def name(self):
         return self._name
@@ -152,8 +3917,8 @@ class CronNotify(object):
 
     @cronExpression.setter
     def cronExpression(self, cronExpression):
-        croniter.croniter(cronExpression, datetime.datetime.today()).get_next(datetime.datetime)
-        self._cronExpression = cronExpression
+        # cronjobs with equal cron expressions share the compiled expression's string
+        self._cronExpression = CronExpression.compile(cronExpression).expression
 
     @property
     def sleepTime(self):
@@ -171,6 +3936,88 @@ class CronNotify(object):
     def mainPower(self, mainPower):
         self._mainPower = not not mainPower
 
+    @property
+    def minBattery(self):
+        return self._minBattery
+
+    @minBattery.setter
+    def minBattery(self, minBattery):
+        if minBattery is not None:
+            minBattery = float(minBattery)
+            if minBattery < 0 or minBattery > 100:
+                raise ValueError("Invalid battery percentage given")
+
+        self._minBattery = minBattery
+
+    @property
+    def maxLoad(self):
+        return self._maxLoad
+
+    @maxLoad.setter
+    def maxLoad(self, maxLoad):
+        if maxLoad is not None:
+            maxLoad = float(maxLoad)
+            if maxLoad <= 0:
+                raise ValueError("Invalid load average given")
+
+        self._maxLoad = maxLoad
+
+    @property
+    def maxPressure(self):
+        return dict(self._maxPressure)
+
+    @maxPressure.setter
+    def maxPressure(self, maxPressure):
+        pressureThresholds = {}
+        for resource, threshold in (maxPressure or {}).items():
+            if resource not in SystemLoad.PRESSURE_RESOURCES:
+                raise ValueError("Invalid pressure resource '{}' given".format(resource))
+
+            threshold = float(threshold)
+            if threshold <= 0 or threshold > 100:
+                raise ValueError("Invalid {} pressure percentage given".format(resource.upper()))
+
+            pressureThresholds[resource] = threshold
+
+        self._maxPressure = pressureThresholds if pressureThresholds else self._DEFAULT_MAX_PRESSURE
+
+    @property
+    def waitForIdle(self):
+        return self._waitForIdle
+
+    @waitForIdle.setter
+    def waitForIdle(self, waitForIdle):
+        self._waitForIdle = not not waitForIdle
+
+    @property
+    def group(self):
+        return self._group
+
+    @group.setter
+    def group(self, group):
+        self._group = str(group) if group else None
+
+    @property
+    def maxConcurrent(self):
+        return self._maxConcurrent
+
+    @maxConcurrent.setter
+    def maxConcurrent(self, maxConcurrent):
+        if maxConcurrent is not None:
+            maxConcurrent = int(maxConcurrent)
+            if maxConcurrent < 1:
+                raise ValueError("Invalid max_concurrent given")
+
+        self._maxConcurrent = maxConcurrent
+
+    @property
+    def priority(self):
+        return self._priority
+
+    @priority.setter
+    def priority(self, priority):
+        self._priority = int(priority)
+
     @property
     def streams(self):
         return self._streams
@@ -184,51 +4031,186 @@ class CronNotify(object):
         }
 
     @property
-    def meta(self):
-        return {
-            "nameTemplate": self._nameTemplate,
-            "notification": self._notificationData,
-            "success": self._statusNotificationData[self._STATUS_SUCCESS],
-            "warning": self._statusNotificationData[self._STATUS_WARNING],
-            "failure": self._statusNotificationData[self._STATUS_ERROR]
-        }
+    def outputTail(self):
+        return self._outputTail
+
+    @outputTail.setter
+    def outputTail(self, outputTail):
+        self._outputTail = max(int(outputTail), 0)
+
+    @property
+    def executionTimeout(self):
+        return self._executionTimeout
+
+    @executionTimeout.setter
+    def executionTimeout(self, executionTimeout):
+        if executionTimeout is not None:
+            executionTimeout = int(executionTimeout)
+            if executionTimeout < 1:
+                raise ValueError("Invalid timeout given")
+
+        self._executionTimeout = executionTimeout
+
+    @property
+    def timeoutGrace(self):
+        return self._timeoutGrace
+
+    @timeoutGrace.setter
+    def timeoutGrace(self, timeoutGrace):
+        self._timeoutGrace = max(int(timeoutGrace), 0)
+
+    @property
+    def runningNotification(self):
+        return self._runningNotification
+
+    @runningNotification.setter
+    def runningNotification(self, runningNotification):
+        self._runningNotification = not not runningNotification
+
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        self._history = not not history
+
+    @property
+    def historyMaxAge(self):
+        return self._historyMaxAge
+
+    @historyMaxAge.setter
+    def historyMaxAge(self, historyMaxAge):
+        historyMaxAge = int(historyMaxAge)
+        if historyMaxAge < 1:
+            raise ValueError("Invalid history_max_age given")
+
+        self._historyMaxAge = historyMaxAge
+
+    @property
+    def resourcePolicy(self):
+        return self._resourcePolicy
+
+    @resourcePolicy.setter
+    def resourcePolicy(self, resourcePolicy):
+        self._resourcePolicy = resourcePolicy if resourcePolicy is not None else self._DEFAULT_RESOURCE_POLICY
+
+    @property
+    def meta(self):
+        return {
+            "nameTemplate": self._nameTemplate,
+            "notification": self._notificationTemplate.toDict(),
+            "running": self._runningNotificationTemplate.toDict(),
+            "success": self._statusNotificationTemplates[self._STATUS_SUCCESS].toDict(),
+            "warning": self._statusNotificationTemplates[self._STATUS_WARNING].toDict(),
+            "failure": self._statusNotificationTemplates[self._STATUS_ERROR].toDict(),
+            "timeout": self._statusNotificationTemplates[self._STATUS_TIMEOUT].toDict()
+        }
+
+    @meta.setter
+    def meta(self, meta):
+        if "nameTemplate" in meta:
+            self._checkTemplate(meta["nameTemplate"][1])
+        for group in ( "notification", "running", "success", "warning", "failure", "timeout" ):
+            if "message" in meta.get(group, {}):
+                self._checkTemplate(meta[group]["message"])
+
+        if "nameTemplate" in meta:
+            self._nameTemplate = tuple(sys.intern(template) for template in meta.get("nameTemplate"))
+        if "notification" in meta:
+            self._notificationTemplate = self._notificationTemplate.replace(**meta.get("notification"))
+        if "running" in meta:
+            self._runningNotificationTemplate = self._runningNotificationTemplate.replace(**meta.get("running"))
+
+        statusNotificationTemplates = dict(self._statusNotificationTemplates)
+        for status, group in ( ( self._STATUS_SUCCESS, "success" ), ( self._STATUS_WARNING, "warning" ),
+                ( self._STATUS_ERROR, "failure" ), ( self._STATUS_TIMEOUT, "timeout" ) ):
+            if group in meta:
+                statusNotificationTemplates[status] = statusNotificationTemplates[status].replace(**meta.get(group))
+
+        if statusNotificationTemplates != self._statusNotificationTemplates:
+            self._statusNotificationTemplates = statusNotificationTemplates
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    @property
+    def scheduler(self):
+        return self._scheduler
 
-    @meta.setter
-    def meta(self, meta):
-        if "nameTemplate" in meta:
-            self._nameTemplate = meta.get("nameTemplate")
-        if "notification" in meta:
-            self._notificationData.update(meta.get("notification"))
-        if "success" in meta:
-            self._statusNotificationData[self._STATUS_SUCCESS].update(meta.get("success"))
-        if "warning" in meta:
-            self._statusNotificationData[self._STATUS_WARNING].update(meta.get("warning"))
-        if "failure" in meta:
-            self._statusNotificationData[self._STATUS_ERROR].update(meta.get("failure"))
+    @property
+    def executor(self):
+        return self._executor
 
     @property
     def logger(self):
         return self._logger
 
-    def main(self):
+    @classmethod
+    def mainBatch(cls, cronNotifies):
+        # calculate the next executions of all cronjobs at once, e.g. at startup or after reloading the config
+        lastExecutions = [ cronNotify.getLastExecution() for cronNotify in cronNotifies ]
+        nextExecutions = iter(CronExpression.getNextBatch(
+            ( cronNotify.cronExpression, lastExecution )
+            for cronNotify, lastExecution in zip(cronNotifies, lastExecutions) if lastExecution is not None
+        ))
+
+        for cronNotify, lastExecution in zip(cronNotifies, lastExecutions):
+            cronNotify.main(next(nextExecutions) if lastExecution is not None else None)
+
+    def main(self, nextExecution=None):
         self._logger.info("Initializing...")
 
-        dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+        if self._busManager is None:
+            self._busManager = BusManager.getInstance()
 
-        self._bus = dbus.SystemBus()
-        if not self._bus:
+        try:
+            self._bus = self._busManager.bus
+        except RuntimeError:
             self._logger.critical("Failed to initialize DBus system bus")
-            raise RuntimeError("Failed to initialize DBus system bus")
+            raise
 
         self._initNotificationService()
 
+        if self._mainPower and self._powerState is None:
+            self._powerState = PowerState.getInstance()
+
         self._monitorResuming()
-        self._timeout(0)
+        self.state.watch(self._app, self._id, self._stateCallback)
+        ControlServer.getInstance().register(self)
+
+        lastExecution = self.getLastExecution()
+        if lastExecution is not None and nextExecution is None:
+            nextExecution = self.getNextExecution(lastExecution)
+
+        if lastExecution is None or nextExecution <= self._scheduler.clock.now():
+            self._catchUp(0)
+            return
+
+        self._logger.info("Last execution was on %s", lastExecution)
+        self._logger.info("Next execution is scheduled for %s", nextExecution)
+
+        self._lastExecution = lastExecution
+        self._nextExecution = nextExecution
+        self._timeoutUntil(nextExecution)
 
     def resetCache(self):
         try:
             self._logger.info("Resetting cache...")
-            os.remove(self._cacheFile)
+            self.state.removeLastExecution(self._app, self._id)
+        except sqlite3.Error as error:
+            self._logger.critical(
+                "While resetting the cache, a exception occurred: %s: %s",
+                type(error).__name__,
+                str(error)
+            )
+            raise
+
+        impersonate = self._session.impersonate if self._session is not None else contextlib.nullcontext
+        try:
+            with impersonate():
+                os.remove(self._getCacheFile())
         except OSError as error:
             if error.errno != errno.ENOENT:
                 self._logger.critical(
@@ -238,6 +4220,167 @@ class CronNotify(object):
                 )
                 raise
 
+    def reconfigure(self, cronNotify):
+        if cronNotify.app != self._app or cronNotify.id != self._id or cronNotify.session is not self._session:
+            raise ValueError("Unable to reconfigure a cronjob using a different cronjob")
+
+        self._logger.info("Reconfiguring...")
+
+        self._commands = cronNotify._commands
+        self._name = cronNotify._name
+        self._cronExpression = cronNotify._cronExpression
+        self._sleepTime = cronNotify._sleepTime
+        self._mainPower = cronNotify._mainPower
+        self._minBattery = cronNotify._minBattery
+        self._maxLoad = cronNotify._maxLoad
+        self._maxPressure = cronNotify._maxPressure
+        self._waitForIdle = cronNotify._waitForIdle
+        self._group = cronNotify._group
+        self._maxConcurrent = cronNotify._maxConcurrent
+        self._priority = cronNotify._priority
+        self._streams = cronNotify._streams
+        self._outputTail = cronNotify._outputTail
+        self._resourcePolicy = cronNotify._resourcePolicy
+        self._executionTimeout = cronNotify._executionTimeout
+        self._timeoutGrace = cronNotify._timeoutGrace
+        self._runningNotification = cronNotify._runningNotification
+        self._history = cronNotify._history
+        self._historyMaxAge = cronNotify._historyMaxAge
+        self._runningNotificationTemplate = cronNotify._runningNotificationTemplate
+        self._nameTemplate = cronNotify._nameTemplate
+        self._notificationTemplate = cronNotify._notificationTemplate
+        self._statusNotificationTemplates = cronNotify._statusNotificationTemplates
+
+        # re-evaluate when to notify the user; shown notifications and running commands aren't affected
+        if self._sessionWaiting or self._powerWaiting or self._loadWaiting or self._timeoutId is not None:
+            self._cancelWait()
+            self._timeout(0)
+
+    def reschedule(self, timeout=0):
+        if self._stopped or self._notification is not None:
+            return
+
+        self._cancelWait()
+        self._timeout(timeout)
+
+    def respond(self, action, sleepTime=None):
+        if action not in ( "start", "skip", "later" ):
+            raise ValueError("Invalid action '{}' given".format(action))
+        if self._stopped:
+            raise RuntimeError("Cronjob has been stopped")
+        if action == "start" and (self._executor.isRunning(self) or self._executor.isQueued(self)):
+            raise RuntimeError("Command is already running")
+
+        if self._notification is not None:
+            if self._notificationTimeoutId is None:
+                raise RuntimeError("Unable to respond to a notification combined with other cronjobs")
+
+            notification = self._notification
+            self._observeResponseTime(action)
+
+            self._resetNotificationTimeout()
+            self._resetNotification()
+
+            try:
+                notification.close()
+            except dbus.exceptions.DBusException:
+                pass
+        else:
+            self._cancelWait()
+
+        if action == "later":
+            self._logger.info("User requested to notify again later")
+            self._timeout(int(sleepTime) if sleepTime is not None else self._sleepTime)
+            return
+
+        self._logger.info("User requested to %s the command", action)
+
+        if action == "start":
+            self.run()
+        else:
+            self.updateLastExecution()
+
+        self._timeout(0)
+
+    def attachNotification(self, notification):
+        # the notification is shown by a notification group, combining the notifications of multiple cronjobs
+        assert self._notification is None
+
+        self._notification = notification
+        self._notificationAction = None
+        self._notificationTime = self._scheduler.clock.now()
+
+    def detachNotification(self):
+        # the notification group's notification couldn't be shown or closed, thus try again on our own
+        self._notification = None
+        self._notificationAction = None
+        self._notificationTime = None
+
+        self._retryNotification()
+
+    def deliverNotificationResponse(self, notification, action=None):
+        # the notification group passes the user's response on; no action means that the notification was closed
+        if action is None:
+            self._notificationCloseCallback(notification)
+        else:
+            self._notificationCallback(notification, action)
+
+    def cancel(self):
+        if self._execution is not None:
+            self._logger.info("%sUser requested to cancel the command", self._execution.logPrefix)
+            self._cancelExecution(self._execution, self._STATUS_CANCELLED)
+        elif self._executor.isQueued(self):
+            self._logger.info("User requested to cancel the waiting command")
+            self._executor.cancel(self)
+        else:
+            raise RuntimeError("Command isn't running")
+
+    def getStatus(self):
+        lastExecution = self.getLastExecution()
+
+        return {
+            "id": self._id,
+            "user": self._session.name if self._session is not None else None,
+            "app": self._app,
+            "name": self._name,
+            "cron": self._cronExpression,
+            "lastExecution": lastExecution,
+            "nextExecution": self.getNextExecution(lastExecution) if lastExecution is not None else None,
+            "running": self._executor.isRunning(self),
+            "queuePosition": self._executor.getQueuePosition(self),
+            "waitingForSession": self._sessionWaiting,
+            "waitingForPower": self._powerWaiting,
+            "waitingForLoad": self._loadWaiting,
+            "notification": self._notification is not None,
+            "sleepingUntil": self._timeoutTime
+        }
+
+    def stop(self):
+        self._logger.info("Stopping...")
+        self._stopped = True
+
+        self._cancelWait()
+        ControlServer.getInstance().unregister(self)
+
+        # notifications combined with other cronjobs stay open, but ignore this cronjob
+        if self._notificationTimeoutId is not None:
+            self._resetNotificationTimeout()
+
+            notification = self._notification
+            self._resetNotification()
+
+            try:
+                notification.close()
+            except dbus.exceptions.DBusException:
+                pass
+
+        if self._resumeSignal is not None:
+            self._resumeSignal.remove()
+            self._resumeSignal = None
+
+        if self._state is not None:
+            self._state.unwatch(self._app, self._id)
+
     def run(self, blocking=None):
         self._executionId += 1
 
@@ -249,151 +4392,381 @@ class CronNotify(object):
 
         self.updateLastExecution()
 
-        if self._async:
-            commandThreadArgs = {
-                "executionId": self._executionId,
-                "previousExecution": self._lastExecution,
-                "logPrefix": "[#{}] ".format(self._executionId)
-            }
+        commandArgs = {
+            "executionId": self._executionId,
+            "previousExecution": self._lastExecution,
+            "logPrefix": "[#{}] ".format(self._executionId) if self._async else ""
+        }
 
-            commandThread = threading.Thread(target=self._run, kwargs=commandThreadArgs)
-            commandThread.start()
+        task = self._executor.submit(self, self._run, commandArgs, group=self._group, priority=self._priority)
+        if not task.done and self._executor.isQueued(self):
+            self._logger.info("%sWaiting for a free execution slot...", commandArgs["logPrefix"])
+
+        if blocking:
+            task.wait()
+
+        return task.result if not self._async else None
+
+    def _initCommands(self, commands):
+        if not all(isinstance(command, CommandStage) for command in commands):
+            # plain command lists are executed one after another, no matter whether a previous command failed
+            stages = []
+            for index, command in enumerate(commands):
+                after = ( str(index - 1), ) if index > 0 else ()
+                stages.append(CommandStage(index, command, after=after, always=True))
+            return tuple(stages)
+
+        stageNames = [ stage.name for stage in commands ]
+        if len(set(stageNames)) != len(stageNames):
+            raise ValueError("Invalid commands given: Duplicate stage names")
+
+        for stage in commands:
+            for dependency in stage.after:
+                if dependency not in stageNames:
+                    raise ValueError("Invalid commands given: Stage '{}' depends on unknown stage '{}'".format(
+                        stage.name,
+                        dependency
+                    ))
+
+        resolvedStages = set()
+        while len(resolvedStages) < len(commands):
+            resolvableStages = [
+                stage.name for stage in commands
+                if stage.name not in resolvedStages and all(dependency in resolvedStages for dependency in stage.after)
+            ]
+
+            if not resolvableStages:
+                raise ValueError("Invalid commands given: Circular stage dependencies")
+
+            resolvedStages.update(resolvableStages)
+
+        return tuple(commands)
+
+    def _run(self, task, executionId, previousExecution, logPrefix=""):
+        output = OutputCapture(self._streams, self._outputTail, logPrefix)
+        startTime = self._scheduler.clock.monotonic()
+        execution = Execution(task, self._commands, executionId, previousExecution, logPrefix, output, startTime)
+        self._execution = execution
+
+        if self._executionTimeout is not None:
+            timeoutTime = self._scheduler.clock.now() + datetime.timedelta(0, self._executionTimeout)
+            execution.timeoutId = self._scheduler.add(timeoutTime, lambda: self._executionTimeoutCallback(execution))
+
+        if self._async and self._runningNotification:
+            self._showRunningNotification(execution)
+
+        self._advanceExecution(execution)
+
+    def _advanceExecution(self, execution):
+        # don't start any more commands of a cancelled execution
+        if execution.cancelStatus is not None:
+            for stage in list(execution.pendingStages):
+                execution.pendingStages.remove(stage)
+                execution.setStageStatus(stage, None)
+
+        readyStages = True
+        while readyStages:
+            readyStages = [
+                stage for stage in execution.pendingStages
+                if all(dependency in execution.stageStatus for dependency in stage.after)
+            ]
+
+            for stage in readyStages:
+                execution.pendingStages.remove(stage)
+
+                failedDependencies = [
+                    dependency for dependency in stage.after
+                    if execution.stageStatus[dependency] not in ( self._STATUS_SUCCESS, self._STATUS_WARNING )
+                ]
+
+                if failedDependencies and not stage.always:
+                    self._logger.warning(
+                        "%sSkipping `%s` due to failed dependencies: %s",
+                        execution.logPrefix,
+                        " ".join(stage.command),
+                        ", ".join(failedDependencies)
+                    )
 
-            if blocking:
-                commandThread.join()
+                    execution.setStageStatus(stage, None)
+                    continue
 
-            return None
-        else:
-            return self._run(self._executionId, self._lastExecution)
+                process = self._spawnCommand(execution, stage)
+                if process is not None:
+                    execution.processes[stage.name] = process
+                else:
+                    execution.setStageStatus(stage, self._STATUS_ERROR)
 
-    def _run(self, executionId, previousExecution, logPrefix=""):
-        self._logger.debug("%sAcquiring lock...", logPrefix)
-        self._lock.acquire()
+        if execution.finished:
+            self._runFinished(execution)
 
-        overallStatus = self._STATUS_SUCCESS
-        for command in self._commands:
-            self._logger.info("%sExecuting `%s`...", logPrefix, " ".join(command))
+    def _spawnCommand(self, execution, stage):
+        self._logger.info("%sExecuting `%s`...", execution.logPrefix, " ".join(stage.command))
 
-            try:
-                subprocess.check_call(command, **self._streams)
-            except OSError as error:
-                if overallStatus < self._STATUS_ERROR:
-                    overallStatus = self._STATUS_ERROR
-
-                if error.errno == errno.ENOENT:
-                    self._logger.error(
-                        "%sExecution of `%s` failed: No such file or directory",
-                        logPrefix,
-                        " ".join(command)
-                    )
-                elif error.errno == errno.EACCES:
-                    self._logger.error(
-                        "%sExecution of `%s` failed: Permission denied",
-                        logPrefix,
-                        " ".join(command)
-                    )
-                else:
-                    self._logger.critical(
-                        "%sExecution of `%s` failed: %s: %s",
-                        logPrefix,
-                        " ".join(command),
-                        type(error).__name__,
-                        str(error)
-                    )
-                    raise
-            except subprocess.CalledProcessError as error:
-                status = self._STATUS_ERROR
-                logLevel = logging.ERROR
-
-                if error.returncode == 254:
-                    status = self._STATUS_WARNING
-                    logLevel = logging.WARNING
-                elif error.returncode == 75:
-                    status = self._STATUS_TRY_AGAIN
-                    logLevel = logging.INFO
-
-                if overallStatus < status:
-                    overallStatus = status
-
-                self._logger.log(
-                    logLevel,
-                    "%sExecution of `%s` finished with exit status %s",
-                    logPrefix,
+        startTime = self._scheduler.clock.monotonic()
+
+        def callback(process, resourceUsage):
+            duration = self._scheduler.clock.monotonic() - startTime
+            Metrics.getInstance().observe("command_duration_seconds", duration, { "job": self.key })
+
+            self._commandFinished(execution, stage, process, resourceUsage)
+
+        # the resource policy's limits apply to a transient systemd scope per command; a scope of a previous
+        # execution (or of a previous cron-notify process) might still linger, thus make the unit name unique
+        unitName = ResourcePolicy.getUnitName(self._app or __name__, self._id, stage.name, os.getpid(),
+            execution.executionId)
+        command = self._resourcePolicy.wrapCommand(stage.command, unitName)
+
+        spawnArgs = { "stdin": self._streams.get("stdin") }
+        if self._session is not None:
+            spawnArgs.update(self._session.getSpawnArgs())
+        preexecFunction = self._resourcePolicy.getPreexecFunction()
+        if preexecFunction is not None:
+            spawnArgs["preexec_fn"] = preexecFunction
+
+        try:
+            return self._executor.spawn(command, callback, output=execution.output, task=execution.task, **spawnArgs)
+        except OSError as error:
+            if error.errno == errno.ENOENT:
+                self._logger.error(
+                    "%sExecution of `%s` failed: No such file or directory",
+                    execution.logPrefix,
+                    " ".join(command)
+                )
+            elif error.errno == errno.EACCES:
+                self._logger.error(
+                    "%sExecution of `%s` failed: Permission denied",
+                    execution.logPrefix,
+                    " ".join(command)
+                )
+            else:
+                self._logger.critical(
+                    "%sExecution of `%s` failed: %s: %s",
+                    execution.logPrefix,
                     " ".join(command),
-                    error.returncode
+                    type(error).__name__,
+                    str(error)
                 )
 
+            return None
+
+    def _commandFinished(self, execution, stage, process, resourceUsage):
+        del execution.processes[stage.name]
+        execution.exitCodes[stage.name] = process.returncode
+
+        if resourceUsage is not None:
+            resourceUsage = ResourceUsage.fromRusage(resourceUsage)
+            execution.addResourceUsage(resourceUsage)
+
+            self._logger.debug(
+                "%sResource usage of `%s`: %s",
+                execution.logPrefix,
+                " ".join(stage.command),
+                resourceUsage
+            )
+
+        metricLabels = { "job": self.key, "status": str(process.returncode) }
+        Metrics.getInstance().increment("command_exit_status_total", metricLabels)
+
+        if process.returncode == 0:
+            execution.setStageStatus(stage, self._STATUS_SUCCESS)
+        elif execution.cancelStatus is not None:
+            self._logger.warning(
+                "%sExecution of `%s` was terminated with exit status %s",
+                execution.logPrefix,
+                " ".join(stage.command),
+                process.returncode
+            )
+
+            execution.setStageStatus(stage, execution.cancelStatus)
+        else:
+            status = self._STATUS_ERROR
+            logLevel = logging.ERROR
+
+            if process.returncode == 254:
+                status = self._STATUS_WARNING
+                logLevel = logging.WARNING
+            elif process.returncode == 75:
+                status = self._STATUS_TRY_AGAIN
+                logLevel = logging.INFO
+
+            self._logger.log(
+                logLevel,
+                "%sExecution of `%s` finished with exit status %s",
+                execution.logPrefix,
+                " ".join(stage.command),
+                process.returncode
+            )
+
+            execution.setStageStatus(stage, status)
+
+        self._advanceExecution(execution)
+
+    def _runFinished(self, execution):
+        overallStatus = execution.overallStatus
+        logPrefix = execution.logPrefix
+
+        runDuration = self._scheduler.clock.monotonic() - execution.startTime
+        metricLabels = { "job": self.key, "status": self._STATUS_NAMES[overallStatus] }
+        Metrics.getInstance().observe("run_duration_seconds", runDuration, metricLabels)
+
+        if execution.timeoutId is not None:
+            self._scheduler.remove(execution.timeoutId)
+            execution.timeoutId = None
+
+        if execution.notification is not None:
+            self._closeRunningNotification(execution)
+
+        if execution.resourceUsage is not None:
+            self._logger.info("%sResource usage: %s", logPrefix, execution.resourceUsage)
+
+        if self._history:
+            self._addRun(execution, runDuration)
+
         if overallStatus == self._STATUS_TRY_AGAIN:
             self._logger.info("%sCommand finished with a temporary error", logPrefix)
 
-            if executionId == self._executionId:
+            if execution.executionId == self._executionId:
                 self._logger.info("Resetting cache...")
-                self.updateLastExecution(previousExecution)
+                self.updateLastExecution(execution.previousExecution)
 
                 if self._timeoutId is not None:
-                    GObject.source_remove(self._timeoutId)
+                    self._scheduler.remove(self._timeoutId)
 
                     self._timeoutId = None
                     self._timeoutTime = None
 
                     self._timeout(0)
+        elif overallStatus == self._STATUS_CANCELLED:
+            self._logger.warning("%sCommand was cancelled", logPrefix)
         else:
             if overallStatus == self._STATUS_SUCCESS:
                 self._logger.info("%sCommand finished successfully", logPrefix)
             elif overallStatus == self._STATUS_WARNING:
                 self._logger.warning("%sCommand finished with warnings", logPrefix)
+            elif overallStatus == self._STATUS_TIMEOUT:
+                self._logger.error("%sCommand timed out", logPrefix)
             else:
                 self._logger.error("%sCommand failed", logPrefix)
 
-            self._showStatusNotification(overallStatus)
+            self._showStatusNotification(overallStatus, execution.output.tail)
 
-        self._lock.release()
-        return overallStatus != self._STATUS_ERROR
+        self._execution = None
+        execution.task.finish(overallStatus < self._STATUS_ERROR)
+
+    def _addRun(self, execution, runDuration):
+        endTime = self._scheduler.clock.now().timestamp()
+        # skipped commands and commands that failed to start have no exit code
+        exitCodes = dict(( name, execution.exitCodes.get(name) ) for name in execution.stageStatus)
 
-    def getLastExecution(self):
-        lastExecution = None
         try:
-            with open(self._cacheFile, "rt") as cacheFile:
-                lastExecutionTime = cacheFile.read(20)
-                if lastExecutionTime:
-                    lastExecution = datetime.datetime.fromtimestamp(int(lastExecutionTime))
-        except IOError as error:
-            if error.errno != errno.ENOENT:
-                self._logger.critical(
-                    "While reading the last execution time, a exception occurred: %s: %s",
-                    type(error).__name__,
-                    str(error)
-                )
-                raise
+            self.state.addRun(
+                self._app,
+                self._id,
+                endTime - runDuration,
+                endTime,
+                runDuration,
+                self._STATUS_NAMES[execution.overallStatus],
+                exitCodes,
+                self._historyMaxAge
+            )
+        except sqlite3.Error as error:
+            self._logger.error(
+                "%sWhile adding the run to the run history, a exception occurred: %s: %s",
+                execution.logPrefix,
+                type(error).__name__,
+                str(error)
+            )
+
+    def getRunStatistics(self):
+        return self.state.getRunStatistics(self._app, self._id)
+
+    def getExpectedDuration(self):
+        try:
+            runStatistics = self.getRunStatistics()
+        except sqlite3.Error as error:
+            self._logger.error(
+                "While querying the run history, a exception occurred: %s: %s",
+                type(error).__name__,
+                str(error)
+            )
+            return None
+
+        if runStatistics.successfulRuns < self._EXPECTED_DURATION_MIN_RUNS:
+            return None
+
+        return runStatistics.medianDuration
+
+    def _executionTimeoutCallback(self, execution):
+        execution.timeoutId = None
+
+        self._logger.warning(
+            "%sCommand didn't finish within %s seconds, terminating...",
+            execution.logPrefix,
+            self._executionTimeout
+        )
+
+        self._cancelExecution(execution, self._STATUS_TIMEOUT)
 
-        return lastExecution
+    def _cancelExecution(self, execution, status):
+        if execution.cancelStatus is not None:
+            return
+
+        execution.cancel(status)
+        self._executor.cancel(self, self._timeoutGrace)
+
+    def getLastExecution(self):
+        lastExecutionTime = self.state.getLastExecution(self._app, self._id)
+        if lastExecutionTime is None:
+            return None
+
+        return datetime.datetime.fromtimestamp(lastExecutionTime)
 
     def getNextExecution(self, lastExecution=None):
         if lastExecution is None:
-            lastExecution = datetime.datetime.today()
+            lastExecution = self._scheduler.clock.now()
 
-        nextExecutionCroniter = croniter.croniter(self._cronExpression, lastExecution)
-        return nextExecutionCroniter.get_next(datetime.datetime)
+        return CronExpression.compile(self._cronExpression).getNext(lastExecution)
 
     def updateLastExecution(self, lastExecution=None):
         if lastExecution is None:
-            lastExecution = datetime.datetime.today()
+            lastExecution = self._scheduler.clock.now()
+
+        try:
+            self.state.setLastExecution(self._app, self._id, int(lastExecution.timestamp()))
+        except sqlite3.Error as error:
+            self._logger.critical(
+                "While updating the last execution time, a exception occurred: %s: %s",
+                type(error).__name__,
+                str(error)
+            )
+            raise
+
+    def _getCacheFile(self):
+        if self._session is not None:
+            return self._session.getCachePath(self._app) + "/" + self._id
+        return BaseDirectory.save_cache_path(self._app) + "/" + self._id
+
+    def _stateCallback(self):
+        if self._timeoutId is not None:
+            self._logger.debug("Last execution time was changed by another process")
+
+            self._scheduler.remove(self._timeoutId)
+
+            self._timeoutId = None
+            self._timeoutTime = None
 
-        with open(self._cacheFile, "wt") as cacheFile:
-            timezoneOffset = datetime.datetime.utcnow() - datetime.datetime.today()
-            timestamp = int((lastExecution + timezoneOffset - datetime.datetime(1970, 1, 1)).total_seconds())
-            cacheFile.write(str(timestamp))
+            self._timeout(0)
 
     def _monitorResuming(self):
         try:
             self._logger.info("Registering system suspend/hibernate callback...")
 
-            self._resumeSignal = self._bus.add_signal_receiver(
+            self._resumeSignal = self._busManager.subscribe(
                 self._resumeCallback,
-                dbus_interface="org.freedesktop.login1.Manager",
-                signal_name="PrepareForSleep",
-                bus_name="org.freedesktop.login1",
-                path="/org/freedesktop/login1"
+                "org.freedesktop.login1.Manager",
+                "PrepareForSleep",
+                "org.freedesktop.login1",
+                "/org/freedesktop/login1"
             )
         except dbus.exceptions.DBusException:
             self._logger.warning("Unable to register suspend/hibernate callback")
@@ -406,20 +4779,22 @@ class CronNotify(object):
             self._logger.debug("System resumes from suspend/hibernate")
 
             if self._timeoutId is not None:
-                GObject.source_remove(self._timeoutId)
+                self._scheduler.remove(self._timeoutId)
 
-                timeDifference = int((self._timeoutTime - datetime.datetime.today()).total_seconds())
-                sleepTime = max(timeDifference, 120)
+                timeDifference = int((self._timeoutTime - self._scheduler.clock.now()).total_seconds())
 
                 self._timeoutId = None
                 self._timeoutTime = None
 
-                self._timeout(sleepTime)
+                if timeDifference < 120:
+                    self._catchUp(120)
+                else:
+                    self._timeout(timeDifference)
 
             if self._notificationTimeoutId is not None:
-                GObject.source_remove(self._notificationTimeoutId)
+                self._scheduler.remove(self._notificationTimeoutId)
 
-                timeDifference = int((self._notificationTimeoutTime - datetime.datetime.today()).total_seconds())
+                timeDifference = int((self._notificationTimeoutTime - self._scheduler.clock.now()).total_seconds())
                 sleepTime = max(timeDifference, 120)
 
                 self._notificationTimeoutId = None
@@ -430,30 +4805,40 @@ class CronNotify(object):
     def _wait(self):
         try:
             if self._waitUntilScheduled():
-                if self._waitUntilMainPower():
-                    self._initNotification()
-
-                    self._notificationTimeout(self._sleepTime)
-
-                    self._logger.info("Sending notification...")
-                    if not self._showNotification(self._notification):
-                        self._resetNotificationTimeout()
-                        self._resetNotification()
-                        self._timeout(0)
+                if self._waitUntilReady():
+                    if self._notificationCoalescer.window > 0:
+                        self._logger.debug("Waiting for other cronjobs becoming due...")
+                        self._notificationCoalescer.add(self)
+                    else:
+                        self.notify()
         except Exception as error:
             self.logger.critical("%s: %s", type(error).__name__, str(error), exc_info=True)
             raise
 
+    def notify(self):
+        self._initNotification()
+
+        self._notificationTimeout(self._sleepTime)
+
+        self._logger.info("Sending notification...")
+        if not self.showNotification(self._notification):
+            self._resetNotificationTimeout()
+            self._resetNotification()
+            self._retryNotification()
+
+    def _retryNotification(self):
+        self._timeout(0 if self._session is None else self._SESSION_RETRY_TIME)
+
     def _waitUntilScheduled(self):
         self._lastExecution = self.getLastExecution()
 
         if self._lastExecution is None:
             self._logger.info("Command has never been executed")
-            self._nextExecution = datetime.datetime.today()
+            self._nextExecution = self._scheduler.clock.now()
             return True
 
         nextExecution = self.getNextExecution(self._lastExecution)
-        timeDifference = int((nextExecution - datetime.datetime.today()).total_seconds())
+        timeDifference = int((nextExecution - self._scheduler.clock.now()).total_seconds())
 
         logLevel = logging.DEBUG if nextExecution == self._nextExecution and timeDifference > 0 else logging.INFO
         self._logger.log(logLevel, "Last execution was on %s", self._lastExecution)
@@ -462,87 +4847,216 @@ class CronNotify(object):
         self._nextExecution = nextExecution
 
         if timeDifference > 0:
-            sleepTime = min(timeDifference, 3600)
-            self._timeout(sleepTime)
+            self._timeoutUntil(nextExecution)
             return False
 
         return True
 
+    def _catchUp(self, timeout):
+        if self._catchUpPlanner.window > 0:
+            self._catchUpPlanner.add(self, timeout)
+        else:
+            self._timeout(timeout)
+
+    def _cancelWait(self):
+        if self._timeoutId is not None:
+            self._scheduler.remove(self._timeoutId)
+
+            self._timeoutId = None
+            self._timeoutTime = None
+
+        if self._sessionWaiting:
+            self._sessionWaiting = False
+            self._session.removeWaiter(self._sessionCallback)
+
+        if self._powerWaiting:
+            self._powerWaiting = False
+            self._powerState.removeWaiter(self._powerCallback)
+
+        if self._loadWaiting:
+            self._loadWaiting = False
+            self._systemLoad.removeWaiter(self._loadCallback)
+
+        self._catchUpPlanner.remove(self)
+        self._notificationCoalescer.remove(self)
+
     def _timeout(self, timeout):
         assert self._timeoutId is None
         assert self._timeoutTime is None
 
-        self._timeoutId = GObject.timeout_add(timeout * 1000, self._timeoutCallback)
-        self._timeoutTime = datetime.datetime.today() + datetime.timedelta(0, timeout)
+        self._timeoutTime = self._scheduler.clock.now() + datetime.timedelta(0, timeout)
+        self._timeoutId = self._scheduler.add(self._timeoutTime, self._timeoutCallback)
 
         if timeout > 0:
             self._logger.debug("Sleeping for %s seconds...", timeout)
 
+    def _timeoutUntil(self, timeoutTime):
+        assert self._timeoutId is None
+        assert self._timeoutTime is None
+
+        self._timeoutTime = timeoutTime
+        self._timeoutId = self._scheduler.add(self._timeoutTime, self._timeoutCallback)
+
+        self._logger.debug("Sleeping until %s...", timeoutTime)
+
     def _timeoutCallback(self):
+        drift = (self._scheduler.clock.now() - self._timeoutTime).total_seconds()
+        Metrics.getInstance().observe("scheduling_drift_seconds", max(drift, 0))
+
         self._timeoutId = None
         self._timeoutTime = None
 
         self._wait()
+
+    def _waitUntilReady(self):
+        # the user dismissed the notification, show it again right away
+        if self._bypassGates:
+            self._bypassGates = False
+            return True
+
+        return self._waitUntilSession() and self._waitUntilMainPower() and self._waitUntilIdle()
+
+    def _waitUntilSession(self):
+        if self._session is None or self._session.available:
+            return True
+
+        self._sessionWaiting = True
+        self._session.addWaiter(self._sessionCallback)
+
+        self._logger.info("Sleeping until user %s logs in...", self._session.name)
         return False
 
+    def _sessionCallback(self):
+        if self._session.available:
+            self._sessionWaiting = False
+            self._session.removeWaiter(self._sessionCallback)
+
+            self._logger.info("User %s is now logged in", self._session.name)
+
+            self._wait()
+
     def _waitUntilMainPower(self):
-        if self._bypassMainPower:
-            self._bypassMainPower = False
+        if not self._mainPower:
             return True
 
-        if not self._mainPower:
+        if self._powerState is None:
+            self._powerState = PowerState.getInstance()
+
+        if not self._powerState.available:
+            self._logger.warning("Unable to check the system's power source; assuming it's on main power")
             return True
 
-        try:
-            upower = self._bus.get_object("org.freedesktop.UPower", "/org/freedesktop/UPower")
-            onBattery = upower.Get("org.freedesktop.UPower", "OnBattery", dbus_interface=dbus.PROPERTIES_IFACE)
-            self._logger.info("System is currently on %s power", (onBattery and "battery" or "main"))
+        self._logger.info("System is currently on %s power", (self._powerState.onBattery and "battery" or "main"))
 
-            if onBattery:
-                self._batterySignal = self._bus.add_signal_receiver(
-                    self._batteryCallback,
-                    dbus_interface="org.freedesktop.DBus.Properties",
-                    signal_name="PropertiesChanged",
-                    bus_name="org.freedesktop.UPower",
-                    path="/org/freedesktop/UPower"
-                )
+        if self._powerState.isSatisfied(self._minBattery):
+            return True
 
-                self._logger.info("Sleeping until the system is connected to main power...")
-                return False
-        except dbus.exceptions.DBusException:
-            self._logger.warning("Unable to check the system's power source; assuming it's on main power")
-            pass
+        if self._minBattery is not None and self._powerState.percentage is not None:
+            self._logger.info(
+                "Battery is at %s%%, but at least %s%% are required",
+                self._powerState.percentage,
+                self._minBattery
+            )
 
-        return True
+        self._powerWaiting = True
+        self._powerState.addWaiter(self._powerCallback)
 
-    def _batteryCallback(self, interfaceName, changedProperties, invalidatedProperties):
-        if "OnBattery" in changedProperties:
-            if not changedProperties["OnBattery"]:
-                self._batterySignal.remove()
+        self._logger.info("Sleeping until the system is connected to main power...")
+        return False
 
+    def _powerCallback(self):
+        if self._powerState.isSatisfied(self._minBattery):
+            self._powerWaiting = False
+            self._powerState.removeWaiter(self._powerCallback)
+
+            if not self._powerState.onBattery:
                 self._logger.info("System is now connected to main power")
-                self._wait()
+            else:
+                self._logger.info("Battery is now sufficiently charged")
+
+            self._wait()
+
+    def _waitUntilIdle(self):
+        if self._maxLoad is None and not self._maxPressure and not self._waitForIdle:
+            return True
+
+        if self._systemLoad is None:
+            self._systemLoad = SystemLoad.getInstance()
+
+        uid = self._session.uid if self._session is not None else None
+        if self._systemLoad.isSatisfied(self._maxLoad, self._maxPressure, self._waitForIdle, uid):
+            return True
+
+        if self._maxLoad is not None and self._systemLoad.loadAverage > self._maxLoad:
+            self._logger.info(
+                "Load average is at %.2f, but at most %s is allowed",
+                self._systemLoad.loadAverage,
+                self._maxLoad
+            )
+
+        for resource, threshold in sorted(self._maxPressure.items()):
+            if self._systemLoad.isPressureExceeded(resource, threshold):
+                self._logger.info("%s pressure exceeds %s%%", resource.upper(), threshold)
+
+        if self._waitForIdle and self._systemLoad.isIdleAvailable(uid) and not self._systemLoad.getIdleHint(uid):
+            self._logger.info("User session isn't idle")
+
+        self._loadWaiting = True
+        self._systemLoad.addWaiter(self._loadCallback, self._maxLoad, self._maxPressure, self._waitForIdle, uid)
+
+        self._logger.info("Sleeping until the system is idle...")
+        return False
+
+    def _loadCallback(self):
+        uid = self._session.uid if self._session is not None else None
+        if self._systemLoad.isSatisfied(self._maxLoad, self._maxPressure, self._waitForIdle, uid):
+            self._loadWaiting = False
+            self._systemLoad.removeWaiter(self._loadCallback)
+
+            self._logger.info("System is now idle")
+
+            self._wait()
+
+    @staticmethod
+    def _checkTemplate(template):
+        try:
+            template.format("")
+        except (IndexError, KeyError, ValueError) as error:
+            raise ValueError("Invalid template '{}' given: {}: {}".format(template, type(error).__name__, str(error)))
+
+    def formatName(self):
+        return self._nameTemplate[1].format(self._name) if self._name else self._nameTemplate[0]
 
     def _initNotificationService(self):
-        if not pynotify.init(self._app or __name__):
+        if not self.notificationService.init(self._app or __name__):
             self._logger.critical("Failed to initialize notification service")
             raise RuntimeError("Failed to initialize notification service")
 
+    def reinitNotificationService(self):
+        self._logger.warning("DBus interface died, re-initializing...")
+        Metrics.getInstance().increment("dbus_reconnects_total")
+
+        self._initNotificationService()
+
     def _initNotification(self):
         assert self._notification is None
         assert self._notificationAction is None
 
         self._logger.debug("Initializing notification...")
 
-        name = self._nameTemplate[1].format(self._name) if self._name else self._nameTemplate[0]
+        notificationService = self.notificationService
+        notificationData = self._notificationTemplate.format(self.formatName())
 
-        notificationData = self._notificationData.copy()
-        notificationData["message"] = notificationData["message"].format(name)
+        expectedDuration = self.getExpectedDuration() if self._history else None
+        if expectedDuration is not None:
+            expectedDuration = RunStatistics.formatDuration(expectedDuration)
+            notificationData["message"] += " It usually takes ~{}.".format(expectedDuration)
 
-        self._notification = pynotify.Notification(**notificationData)
+        self._notification = notificationService.Notification(**notificationData)
+        self._notificationTime = self._scheduler.clock.now()
 
-        self._notification.set_urgency(pynotify.URGENCY_NORMAL)
-        self._notification.set_timeout(pynotify.EXPIRES_NEVER)
+        self._notification.set_urgency(notificationService.URGENCY_NORMAL)
+        self._notification.set_timeout(notificationService.EXPIRES_NEVER)
         self._notification.set_category("presence")
 
         self._notification.add_action("start", "Start", self._notificationCallback)
@@ -556,15 +5070,21 @@ class CronNotify(object):
 
         self._notification = None
         self._notificationAction = None
+        self._notificationTime = None
 
     def _notificationCallback(self, notification, action):
-        assert notification == self._notification
+        # ignore notifications the user already responded to using the control socket
+        if self._stopped or notification is not self._notification:
+            return
 
         if action != "default":
             self._notificationAction = action
 
     def _notificationCloseCallback(self, notification):
-        assert notification == self._notification
+        if self._stopped or notification is not self._notification:
+            return
+
+        self._observeResponseTime(self._notificationAction or "dismiss")
 
         if self._notificationTimeoutId is not None:
             self._resetNotificationTimeout()
@@ -572,7 +5092,7 @@ class CronNotify(object):
         if self._notificationAction is None:
             self._logger.info("User dismissed the notification")
 
-            self._bypassMainPower = True
+            self._bypassGates = True
         elif self._notificationAction == "later":
             self._logger.info("User requested to notify again later")
 
@@ -592,13 +5112,21 @@ class CronNotify(object):
 
         self._timeout(0)
 
+    def _observeResponseTime(self, response):
+        if self._notificationTime is not None:
+            responseTime = (self._scheduler.clock.now() - self._notificationTime).total_seconds()
+            Metrics.getInstance().observe("notification_response_seconds", responseTime, { "response": response })
+
     def _notificationTimeout(self, timeout):
         assert self._notification is not None
         assert self._notificationTimeoutId is None
         assert self._notificationTimeoutTime is None
 
-        self._notificationTimeoutId = GObject.timeout_add(timeout * 1000, self._notificationTimeoutCallback)
-        self._notificationTimeoutTime = datetime.datetime.today() + datetime.timedelta(0, timeout)
+        self._notificationTimeoutTime = self._scheduler.clock.now() + datetime.timedelta(0, timeout)
+        self._notificationTimeoutId = self._scheduler.add(
+            self._notificationTimeoutTime,
+            self._notificationTimeoutCallback
+        )
 
         if timeout > 0:
             self._logger.debug("Giving user %s seconds to respond...", timeout)
@@ -606,7 +5134,7 @@ class CronNotify(object):
     def _resetNotificationTimeout(self):
         assert self._notificationTimeoutId is not None
 
-        GObject.source_remove(self._notificationTimeoutId)
+        self._scheduler.remove(self._notificationTimeoutId)
 
         self._notificationTimeoutId = None
         self._notificationTimeoutTime = None
@@ -623,8 +5151,7 @@ class CronNotify(object):
         try:
             self._notification.close()
         except dbus.exceptions.DBusException:
-            self._logger.warning("DBus interface died, re-initializing...")
-            self._initNotificationService()
+            self.reinitNotificationService()
 
             self._notificationAction = None
             self._notification = None
@@ -634,37 +5161,69 @@ class CronNotify(object):
             self.logger.critical("%s: %s", type(error).__name__, str(error), exc_info=True)
             raise
 
-        return False
-
-    def _showStatusNotification(self, status):
-        assert status in ( self._STATUS_SUCCESS, self._STATUS_WARNING, self._STATUS_ERROR )
+    def _showStatusNotification(self, status, outputTail=None):
+        assert status in ( self._STATUS_SUCCESS, self._STATUS_WARNING, self._STATUS_ERROR, self._STATUS_TIMEOUT )
 
-        if not pynotify.is_initted():
+        notificationService = self.notificationService
+        if not notificationService.is_initted():
             self._initNotificationService()
 
-        name = self._nameTemplate[1].format(self._name) if self._name else self._nameTemplate[0]
+        notificationData = self._statusNotificationTemplates[status].format(self.formatName())
 
-        notificationData = self._statusNotificationData[status].copy()
-        notificationData["message"] = notificationData["message"].format(name)
+        if outputTail and status != self._STATUS_SUCCESS:
+            notificationData["message"] += "\n\n" + "\n".join(html.escape(line, quote=False) for line in outputTail)
 
-        notification = pynotify.Notification(**notificationData)
-        notification.set_urgency(pynotify.URGENCY_NORMAL)
-        notification.set_timeout(pynotify.EXPIRES_NEVER)
+        notification = notificationService.Notification(**notificationData)
+        notification.set_urgency(notificationService.URGENCY_NORMAL)
+        notification.set_timeout(notificationService.EXPIRES_NEVER)
         notification.set_category("presence")
 
         self._logger.info("Sending status notification...")
-        self._showNotification(notification)
+        self.showNotification(notification)
+
+    def _showRunningNotification(self, execution):
+        notificationService = self.notificationService
+        if not notificationService.is_initted():
+            self._initNotificationService()
+
+        notification = notificationService.Notification(**self._runningNotificationTemplate.format(self.formatName()))
+        notification.set_urgency(notificationService.URGENCY_LOW)
+        notification.set_timeout(notificationService.EXPIRES_NEVER)
+        notification.set_category("presence")
+
+        notification.add_action("cancel", "Cancel", lambda notification, action: self._runningCallback(execution))
+
+        self._logger.debug("%sSending running notification...", execution.logPrefix)
+        if self.showNotification(notification):
+            execution.notification = notification
+
+    def _runningCallback(self, execution):
+        if execution is not self._execution or execution.cancelStatus is not None:
+            return
+
+        self._logger.info("%sUser requested to cancel the command", execution.logPrefix)
+        self._cancelExecution(execution, self._STATUS_CANCELLED)
+
+    def _closeRunningNotification(self, execution):
+        notification = execution.notification
+        execution.notification = None
+
+        try:
+            notification.close()
+        except dbus.exceptions.DBusException:
+            pass
 
-    def _showNotification(self, notification):
+    def showNotification(self, notification):
         assert notification is not None
 
         notificationShown = False
 
         try:
+            showTime = time.monotonic()
             notificationShown = notification.show()
+            Metrics.getInstance().observe("notification_latency_seconds", time.monotonic() - showTime)
         except dbus.exceptions.DBusException:
-            self._logger.warning("DBus interface died, re-initializing...")
-            self._initNotificationService()
+            self.reinitNotificationService()
         except Exception as error:
             self._logger.critical(
                 "While sending a notification, a exception occurred: %s: %s",
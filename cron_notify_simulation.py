@@ -0,0 +1,459 @@
+""" cron-notify simulation
+
+Replays cron-notify's configuration in virtual time, replacing everything
+talking to the outside world (DBus, the notification service, UPower and
+the commands) by simulated stand-ins.
+
+Copyright (C) 2016-2024 Daniel Rudolf
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, version 3 of the License only.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import cron_notify
+import collections, datetime, logging, signal, subprocess, sys
+
+class SimulatedBusManager(cron_notify.BusManager):
+    @property
+    def bus(self):
+        return None
+
+    def subscribe(self, callback, interface, signal, busName, path):
+        key = ( interface, signal, busName, path )
+
+        subscription = cron_notify.BusSubscription(self, key, callback)
+        self._subscriptions.setdefault(key, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self._subscriptions.get(subscription.key)
+        if subscriptions and subscription in subscriptions:
+            subscriptions.remove(subscription)
+
+class SimulatedPowerState(cron_notify.PowerState):
+    _simulation = None
+    _batteryTimes = ()
+
+    def __init__(self, simulation, batteryTimes=()):
+        self._simulation = simulation
+        self._batteryTimes = tuple(batteryTimes)
+        self._subscriptions = []
+        self._waiters = []
+
+        self._logger = logging.getLogger("{}.{}".format(cron_notify.__name__, "power"))
+
+        self._available = True
+        self._onBattery = self._isBatteryTime(simulation.clock.now().time())
+
+        self._scheduleChange()
+
+    def _isBatteryTime(self, timeOfDay):
+        for startTime, endTime in self._batteryTimes:
+            if startTime <= endTime and startTime <= timeOfDay < endTime:
+                return True
+            if startTime > endTime and (timeOfDay >= startTime or timeOfDay < endTime):
+                return True
+
+        return False
+
+    def _scheduleChange(self):
+        if not self._batteryTimes:
+            return
+
+        now = self._simulation.clock.now()
+        changeTimes = []
+        for day in ( now.date(), now.date() + datetime.timedelta(1) ):
+            for startTime, endTime in self._batteryTimes:
+                changeTimes.append(datetime.datetime.combine(day, startTime))
+                changeTimes.append(datetime.datetime.combine(day, endTime))
+
+        self._simulation.scheduler.add(min(time for time in changeTimes if time > now), self._changeCallback)
+
+    def _changeCallback(self):
+        onBattery = self._isBatteryTime(self._simulation.clock.now().time())
+        if onBattery != self._onBattery:
+            self._onBattery = onBattery
+            self._simulation.record(None, "System is now on {} power".format("battery" if onBattery else "main"))
+            self._notifyWaiters()
+
+        self._scheduleChange()
+
+class SimulatedSystemLoad(cron_notify.SystemLoad):
+    # the simulated system is always idle; load and pressure depend on what else runs on the real system
+    @property
+    def loadAverage(self):
+        return 0.0
+
+    def getPressure(self, resource):
+        return 0.0
+
+    def _createTrigger(self, resource, threshold):
+        return None
+
+    def isIdleAvailable(self, uid=None):
+        return True
+
+    def getIdleHint(self, uid=None):
+        return True
+
+class SimulatedExecutor(cron_notify.Executor):
+    _simulation = None
+
+    _exitStatuses = ( 0, )
+    _duration = 300
+
+    _owner = None
+    _spawnCounts = None
+    _exitEntries = None
+
+    def __init__(self, simulation, exitStatuses=( 0, ), duration=300, maxWorkers=None):
+        self._simulation = simulation
+        self._exitStatuses = tuple(exitStatuses) or ( 0, )
+        self._duration = duration
+        self._spawnCounts = collections.Counter()
+        self._exitEntries = {}
+
+        super().__init__(maxWorkers, simulation.scheduler)
+
+    def spawn(self, command, callback, output=None, task=None, **kwargs):
+        owner = self._owner
+
+        # commands exit with the given statuses in turn, e.g. to fail temporarily first and succeed on retry
+        spawnKey = ( owner, tuple(command) )
+        exitStatus = self._exitStatuses[self._spawnCounts[spawnKey] % len(self._exitStatuses)]
+        self._spawnCounts[spawnKey] += 1
+
+        process = subprocess.CompletedProcess(command, None)
+        self._addProcess(task, process)
+
+        self._simulation.counters["commands"] += 1
+        self._simulation.record(owner, "Executing `{}`...".format(" ".join(command)))
+
+        def exitCallback(exitStatus=exitStatus):
+            self._exitEntries.pop(process, None)
+            self._removeProcess(task, process)
+
+            process.returncode = exitStatus
+            if exitStatus < 0:
+                self._simulation.counters["terminations"] += 1
+            elif exitStatus != 0:
+                counter = { 75: "temporaryFailures", 254: "warnings" }.get(exitStatus, "failures")
+                self._simulation.counters[counter] += 1
+
+            self._simulation.record(owner, "`{}` exited with status {}".format(" ".join(command), exitStatus))
+
+            previousOwner = self._owner
+            self._owner = owner
+            try:
+                callback(process, None)
+            finally:
+                self._owner = previousOwner
+
+        exitTime = self._simulation.clock.now() + datetime.timedelta(0, self._duration)
+        self._exitEntries[process] = ( self._simulation.scheduler.add(exitTime, exitCallback), exitCallback )
+
+        return process
+
+    def terminate(self, process, gracePeriod=30):
+        # simulated commands always honour SIGTERM right away
+        exitEntry, exitCallback = self._exitEntries.pop(process, ( None, None ))
+        if exitEntry is None:
+            return
+
+        self._simulation.scheduler.remove(exitEntry)
+        self._simulation.scheduler.add(self._simulation.clock.now(), lambda: exitCallback(-signal.SIGTERM))
+
+    def _execute(self, task):
+        previousOwner = self._owner
+        self._owner = task.owner
+        try:
+            super()._execute(task)
+        finally:
+            self._owner = previousOwner
+
+class SimulatedNotification(object):
+    _simulation = None
+
+    _summary = None
+    _message = None
+    _icon = None
+
+    _actions = None
+    _closedCallback = None
+    _closed = False
+
+    def __init__(self, simulation, summary, message="", icon=""):
+        self._simulation = simulation
+        self._summary = summary
+        self._message = message
+        self._icon = icon
+        self._actions = {}
+
+    @property
+    def message(self):
+        return self._message
+
+    @property
+    def actions(self):
+        return self._actions
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def owners(self):
+        # a notification is owned by a single cronjob, or by a group of cronjobs
+        if self._closedCallback is None:
+            return []
+
+        owner = self._closedCallback.__self__
+        return list(owner.members) if isinstance(owner, cron_notify.NotificationGroup) else [ owner ]
+
+    def set_urgency(self, urgency):
+        pass
+
+    def set_timeout(self, timeout):
+        pass
+
+    def set_category(self, category):
+        pass
+
+    def add_action(self, action, label, callback):
+        self._actions[action] = callback
+
+    def connect(self, signal, callback):
+        if signal == "closed":
+            self._closedCallback = callback
+
+    def show(self):
+        self._simulation.showNotification(self)
+        return True
+
+    def close(self, action=None):
+        if self._closed:
+            return
+
+        self._closed = True
+
+        # like a real notification server, emit the actions and the closed signal asynchronously
+        def closeCallback():
+            if action is not None:
+                self._actions[action](self, action)
+            if self._closedCallback is not None:
+                self._closedCallback(self)
+
+        self._simulation.scheduler.add(self._simulation.clock.now(), closeCallback)
+
+class SimulatedNotificationService(object):
+    URGENCY_LOW = 0
+    URGENCY_NORMAL = 1
+    URGENCY_CRITICAL = 2
+
+    EXPIRES_DEFAULT = -1
+    EXPIRES_NEVER = 0
+
+    _simulation = None
+    _initted = False
+
+    def __init__(self, simulation):
+        self._simulation = simulation
+
+    def init(self, app):
+        self._initted = True
+        return True
+
+    def is_initted(self):
+        return self._initted
+
+    def get_server_caps(self):
+        return [ "actions", "body" ]
+
+    def Notification(self, summary, message="", icon=""):
+        return SimulatedNotification(self._simulation, summary, message, icon)
+
+class SimulationLogHandler(logging.Handler):
+    _simulation = None
+    _cronNotify = None
+
+    def __init__(self, simulation, cronNotify):
+        super().__init__()
+
+        self._simulation = simulation
+        self._cronNotify = cronNotify
+
+        self.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+
+    def emit(self, record):
+        self._simulation.record(self._cronNotify, self.format(record))
+
+class Simulation(object):
+    _RESPONSES = ( "start", "skip", "later", "dismiss", "ignore" )
+    _STATES = ( "start", "real", "never" )
+
+    _startTime = None
+    _endTime = None
+
+    _response = "start"
+    _responseDelay = 60
+
+    _state = "start"
+    _realStateStore = None
+
+    _clock = None
+    _scheduler = None
+    _stream = None
+
+    _stateStore = None
+    _busManager = None
+    _powerState = None
+    _systemLoad = None
+    _executor = None
+    _notificationService = None
+    _notificationCoalescer = None
+    _catchUpPlanner = None
+
+    _cronNotifies = None
+    _counters = None
+
+    def __init__(self, startTime, endTime, response="start", responseDelay=60, exitStatuses=( 0, ), duration=300,
+            batteryTimes=(), state="start", realStateStore=None, stream=None):
+        if endTime <= startTime:
+            raise ValueError("Invalid simulation period given: {} is not after {}".format(endTime, startTime))
+        if response not in self._RESPONSES:
+            raise ValueError("Invalid response '{}' given".format(response))
+        if state not in self._STATES:
+            raise ValueError("Invalid state '{}' given".format(state))
+        if duration < 0:
+            raise ValueError("Invalid duration '{}' given".format(duration))
+
+        self._startTime = startTime
+        self._endTime = endTime
+        self._response = response
+        self._responseDelay = max(int(responseDelay), 1)
+        self._state = state
+        self._realStateStore = realStateStore
+        self._stream = stream if stream is not None else sys.stdout
+
+        self._cronNotifies = []
+        self._counters = collections.Counter()
+
+        self._clock = cron_notify.VirtualClock(startTime)
+        self._scheduler = cron_notify.Scheduler(self._clock)
+
+        # replace everything talking to the outside world; everything else runs unchanged, just in virtual time
+        self._stateStore = cron_notify.StateStore(":memory:")
+        self._busManager = SimulatedBusManager()
+        self._powerState = SimulatedPowerState(self, batteryTimes)
+        self._systemLoad = SimulatedSystemLoad(self._busManager, self._scheduler)
+        self._executor = SimulatedExecutor(self, exitStatuses, duration)
+        self._notificationService = SimulatedNotificationService(self)
+        self._notificationCoalescer = cron_notify.NotificationCoalescer(scheduler=self._scheduler)
+        self._catchUpPlanner = cron_notify.CatchUpPlanner(scheduler=self._scheduler)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @property
+    def executor(self):
+        return self._executor
+
+    @property
+    def notificationCoalescer(self):
+        return self._notificationCoalescer
+
+    @property
+    def catchUpPlanner(self):
+        return self._catchUpPlanner
+
+    @property
+    def services(self):
+        # the simulated cronjobs must be created using these, see CronNotify's constructor
+        return {
+            "scheduler": self._scheduler,
+            "executor": self._executor,
+            "stateStore": self._stateStore,
+            "busManager": self._busManager,
+            "powerState": self._powerState,
+            "systemLoad": self._systemLoad,
+            "notificationService": self._notificationService,
+            "notificationCoalescer": self._notificationCoalescer,
+            "catchUpPlanner": self._catchUpPlanner
+        }
+
+    @property
+    def counters(self):
+        return self._counters
+
+    def add(self, cronNotify, logLevel=logging.WARNING):
+        cronNotify.logger.handler = SimulationLogHandler(self, cronNotify)
+        cronNotify.logger.setLevel(logLevel)
+
+        # cronjobs start as if they were executed right before the simulation, as recorded in the real state
+        # database, or as if they were never executed
+        if self._state == "start":
+            cronNotify.updateLastExecution(self._startTime)
+        elif self._state == "real":
+            lastExecution = self._realStateStore.getLastExecution(cronNotify.app, cronNotify.id)
+            if lastExecution is not None:
+                self._stateStore.setLastExecution(cronNotify.app, cronNotify.id, lastExecution)
+
+        self._cronNotifies.append(cronNotify)
+
+    def run(self):
+        cron_notify.CronNotify.mainBatch(self._cronNotifies)
+        self._scheduler.runUntil(self._endTime)
+
+        for cronNotify in self._cronNotifies:
+            cronNotify.stop()
+
+        return self._counters
+
+    def record(self, cronNotify, event):
+        self._stream.write("{:%Y-%m-%d %H:%M:%S}  {:<24} {}\n".format(
+            self._clock.now(),
+            cronNotify.id if cronNotify is not None else "-",
+            event
+        ))
+
+    def showNotification(self, notification):
+        owners = notification.owners
+        message = notification.message.split("\n", 1)[0]
+
+        if not owners:
+            self._counters["statusNotifications"] += 1
+            self.record(None, "Status notification: {}".format(message))
+            return
+
+        self._counters["notifications"] += 1
+        for owner in owners:
+            self.record(owner, "Notification: {}".format(message))
+
+        if self._response == "ignore":
+            return
+
+        def responseCallback():
+            if notification.closed:
+                return
+
+            self._counters[self._response] += 1
+            for owner in owners:
+                self.record(owner, "User responds: {}".format(self._response))
+
+            notification.close(self._response if self._response != "dismiss" else None)
+
+        responseTime = self._clock.now() + datetime.timedelta(0, self._responseDelay)
+        self._scheduler.add(responseTime, responseCallback)
@@ -1,5 +1,9 @@
 from distutils.core import setup
-import cron_notify
+import re
+
+# don't import cron_notify, it requires GObject introspection and DBus
+with open("cron_notify.py") as f:
+    version = re.search(r'^__version__ = "([^"]+)"', f.read(), re.MULTILINE).group(1)
 
 with open("README.md") as f:
     readme = f.read()
@@ -9,7 +13,7 @@ with open("LICENSE") as f:
 
 setup(
     name="cron_notify",
-    version=cron_notify.__version__,
+    version=version,
     description="FreeDesktop.org-compatible notification service to periodically ask for " +
         "acknowledgement before executing a cronjob. It is often used for backup software.",
     long_description=readme,
@@ -17,6 +21,6 @@ setup(
     author_email="cron-notify@daniel-rudolf.de",
     url="https://github.com/PhrozenByte/cron-notify",
     license=license,
-    py_modules=[ "cron_notify" ],
-    scripts=[ "cron-notify" ]
+    py_modules=[ "cron_notify", "cron_notify_simulation" ],
+    scripts=[ "cron-notify", "cron-notify-ctl" ]
 )
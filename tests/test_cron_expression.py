@@ -0,0 +1,144 @@
+import datetime, random, unittest
+
+from cron_notify import CronExpression
+
+try:
+    import croniter
+except ImportError:
+    croniter = None
+
+try:
+    import zoneinfo
+    berlin = zoneinfo.ZoneInfo("Europe/Berlin")
+except (ImportError, KeyError, OSError):
+    berlin = None
+
+EXPRESSIONS = [
+    "* * * * *", "0 8 * * *", "30 12 * * *", "*/15 * * * *", "5-10/2 3-5 * * *", "0 */6 * * *",
+    "0 0 1 * *", "0 0 30 * *", "0 0 31 * *", "0 0 29 2 *", "59 23 31 12 *", "0 0 */2 * *", "0 0 * */3 *",
+    "0 9 * jan,jul *", "0 0 * * 0", "0 0 * * 7", "0 0 * * sun", "0 0 * * mon-fri", "0 12 * * 5/2",
+    "0 0 13 * 5", "0 0 1,15 * mon", "0 0 1-7 * 1", "0 0 1-31 * 1", "0 0 * * 1-7", "0 0 31 * fri",
+    "@yearly", "@monthly", "@weekly", "@daily", "@hourly"
+]
+
+class CronExpressionTest(unittest.TestCase):
+    @unittest.skipIf(croniter is None, "croniter is not installed")
+    def testCroniterEquivalence(self):
+        random.seed(1)
+        for expression in EXPRESSIONS:
+            cronExpression = CronExpression(expression)
+            for _ in range(500):
+                start = datetime.datetime(2020, 1, 1) + datetime.timedelta(0, random.randrange(0, 8 * 366 * 86400))
+                with self.subTest(expression=expression, start=start):
+                    self.assertEqual(
+                        cronExpression.getNext(start),
+                        croniter.croniter(expression, start).get_next(datetime.datetime)
+                    )
+
+    def testDayOfMonthOrDayOfWeek(self):
+        # if both fields are restricted, a day matching either of them matches
+        cronExpression = CronExpression("0 0 13 * 5")
+        self.assertEqual(cronExpression.getNext(datetime.datetime(2024, 9, 1)), datetime.datetime(2024, 9, 6))
+        self.assertEqual(cronExpression.getNext(datetime.datetime(2024, 9, 12)), datetime.datetime(2024, 9, 13))
+        self.assertEqual(cronExpression.getNext(datetime.datetime(2024, 9, 13)), datetime.datetime(2024, 9, 20))
+
+        # a wildcard in either field restricts the days by the other field only
+        self.assertEqual(
+            CronExpression("0 0 13 * *").getNext(datetime.datetime(2024, 9, 1)),
+            datetime.datetime(2024, 9, 13)
+        )
+        self.assertEqual(
+            CronExpression("0 0 * * 5").getNext(datetime.datetime(2024, 9, 7)),
+            datetime.datetime(2024, 9, 13)
+        )
+
+    def testMonthEndRollover(self):
+        self.assertEqual(
+            CronExpression("0 0 31 * *").getNext(datetime.datetime(2024, 1, 31)),
+            datetime.datetime(2024, 3, 31)
+        )
+        self.assertEqual(
+            CronExpression("0 0 30 * *").getNext(datetime.datetime(2023, 2, 1)),
+            datetime.datetime(2023, 3, 30)
+        )
+        self.assertEqual(
+            CronExpression("0 0 29 2 *").getNext(datetime.datetime(2021, 3, 1)),
+            datetime.datetime(2024, 2, 29)
+        )
+        self.assertEqual(
+            CronExpression("59 23 31 12 *").getNext(datetime.datetime(2024, 12, 31, 23, 59)),
+            datetime.datetime(2025, 12, 31, 23, 59)
+        )
+        self.assertEqual(
+            CronExpression("* * * * *").getNext(datetime.datetime(2024, 2, 29, 23, 59, 30)),
+            datetime.datetime(2024, 3, 1)
+        )
+
+    def testDaylightSavingTime(self):
+        # naive dates are wall-clock times: a skipped time is returned as-is and is due as soon as the clock passed
+        # it, a repeated hour doesn't match twice
+        self.assertEqual(
+            CronExpression("30 2 * * *").getNext(datetime.datetime(2024, 3, 31, 1, 59)),
+            datetime.datetime(2024, 3, 31, 2, 30)
+        )
+        self.assertEqual(
+            CronExpression("0 * * * *").getNext(datetime.datetime(2024, 10, 27, 2, 10, fold=1)),
+            datetime.datetime(2024, 10, 27, 3, 0)
+        )
+
+    @unittest.skipIf(croniter is None or berlin is None, "croniter or the tz database is not available")
+    def testTimezoneAwareDaylightSavingTime(self):
+        starts = [
+            datetime.datetime(2024, 3, 31, 0, 0, tzinfo=berlin),
+            datetime.datetime(2024, 3, 31, 1, 59, tzinfo=berlin),
+            datetime.datetime(2024, 10, 27, 1, 59, tzinfo=berlin),
+            datetime.datetime(2024, 10, 27, 2, 10, tzinfo=berlin),
+            datetime.datetime(2024, 10, 27, 2, 10, fold=1, tzinfo=berlin)
+        ]
+
+        for expression in ( "30 2 * * *", "0 3 * * *", "0 * * * *", "*/30 * * * *", "0 1 * * *" ):
+            for start in starts:
+                with self.subTest(expression=expression, start=start):
+                    nextExecution = CronExpression(expression).getNext(start)
+                    self.assertEqual(nextExecution, croniter.croniter(expression, start).get_next(datetime.datetime))
+                    # dates of the same timezone are compared by wall-clock time, ignoring fold
+                    self.assertGreater(nextExecution.timestamp(), start.timestamp())
+
+    def testAliases(self):
+        start = datetime.datetime(2024, 5, 17, 13, 37)
+        for alias, expression in ( ( "@daily", "0 0 * * *" ), ( "@weekly", "0 0 * * 0" ), ( "@yearly", "0 0 1 1 *" ) ):
+            self.assertEqual(CronExpression(alias).getNext(start), CronExpression(expression).getNext(start))
+
+    def testInvalidExpressions(self):
+        for expression in ( "* * *", "60 * * * *", "0 24 * * *", "0 0 32 * *", "0 0 * 13 *", "0 0 * * 8",
+                "*/0 * * * *", "0 0 * foo *" ):
+            with self.subTest(expression=expression):
+                self.assertRaises(ValueError, CronExpression, expression)
+
+    @unittest.skipIf(croniter is None, "croniter is not installed")
+    def testExtendedSyntax(self):
+        start = datetime.datetime(2024, 2, 3, 4, 5)
+        for expression in ( "0 0 L * *", "0 0 * * 5#2", "0 0 0 * * *" ):
+            with self.subTest(expression=expression):
+                self.assertEqual(
+                    CronExpression(expression).getNext(start),
+                    croniter.croniter(expression, start).get_next(datetime.datetime)
+                )
+
+    def testNextBatch(self):
+        start = datetime.datetime(2024, 5, 17, 13, 37)
+        items = [ ( "0 8 * * *", start ), ( CronExpression("@hourly"), start ), ( "0 8 * * *", start ),
+            ( "0 8 * * *", datetime.datetime(2024, 5, 18, 9, 0) ) ]
+
+        self.assertEqual(CronExpression.getNextBatch(items), [
+            datetime.datetime(2024, 5, 18, 8, 0),
+            datetime.datetime(2024, 5, 17, 14, 0),
+            datetime.datetime(2024, 5, 18, 8, 0),
+            datetime.datetime(2024, 5, 19, 8, 0)
+        ])
+
+    def testCompile(self):
+        self.assertIs(CronExpression.compile("0 8 * * *"), CronExpression.compile("0 8 * * *"))
+
+if __name__ == "__main__":
+    unittest.main()
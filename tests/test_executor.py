@@ -0,0 +1,200 @@
+import datetime, os, signal, sqlite3, tempfile, time, unittest
+
+from cron_notify import CronNotify, Executor, Scheduler, StateStore, VirtualClock
+
+try:
+    from gi.repository import GLib
+except ImportError:
+    GLib = None
+
+class NotificationService(object):
+    URGENCY_LOW = 0
+    URGENCY_NORMAL = 1
+    URGENCY_CRITICAL = 2
+
+    EXPIRES_DEFAULT = -1
+    EXPIRES_NEVER = 0
+
+    def __init__(self):
+        self.shown = []
+
+    def init(self, app):
+        return True
+
+    def is_initted(self):
+        return True
+
+    def get_server_caps(self):
+        return [ "actions", "body" ]
+
+    def Notification(self, summary, message="", icon=""):
+        return Notification(self, summary, message, icon)
+
+class Notification(object):
+    def __init__(self, service, summary, message="", icon=""):
+        self.service = service
+        self.summary = summary
+        self.message = message
+        self.icon = icon
+
+    def set_urgency(self, urgency):
+        pass
+
+    def set_timeout(self, timeout):
+        pass
+
+    def set_category(self, category):
+        pass
+
+    def add_action(self, action, label, callback):
+        pass
+
+    def connect(self, signal, callback):
+        pass
+
+    def show(self):
+        self.service.shown.append(self)
+        return True
+
+    def close(self):
+        pass
+
+@unittest.skipIf(GLib is None, "PyGObject is not installed")
+class ExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock(datetime.datetime(2024, 1, 1))
+        self.scheduler = Scheduler(self.clock)
+        self.executor = Executor(scheduler=self.scheduler)
+
+        self.processes = []
+        self.tempDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        for process in self.processes:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        self.tempDir.cleanup()
+
+    def iterate(self, condition, timeout=10):
+        mainContext = GLib.MainContext.default()
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            if not mainContext.iteration(False):
+                time.sleep(0.01)
+        return True
+
+    def advance(self, seconds):
+        self.scheduler.runUntil(self.clock.now() + datetime.timedelta(0, seconds))
+
+    def spawn(self, owner, command, finished):
+        def callback(task):
+            def processCallback(process, resourceUsage):
+                finished.append(process.returncode)
+                task.finish(process.returncode == 0)
+
+            self.processes.append(self.executor.spawn(command, processCallback, task=task))
+
+        return self.executor.submit(owner, callback)
+
+    def isAlive(self, pid):
+        try:
+            with open("/proc/{}/stat".format(pid), "rt") as statFile:
+                return statFile.read().rsplit(")", 1)[1].split()[0] not in ( "Z", "X" )
+        except FileNotFoundError:
+            return False
+
+    def testCancelEscalatesToSigkill(self):
+        # both the shell and its child ignore SIGTERM, thus only SIGKILL sent to the process group ends them
+        pidFile = os.path.join(self.tempDir.name, "pid")
+        command = [ "sh", "-c", "trap '' TERM; sleep 60 & echo $! > \"$0\"; wait", pidFile ]
+
+        owner = object()
+        finished = []
+        self.spawn(owner, command, finished)
+        self.assertTrue(self.iterate(lambda: os.path.exists(pidFile) and os.path.getsize(pidFile) > 0))
+
+        with open(pidFile, "rt") as pidFileHandle:
+            childPid = int(pidFileHandle.read())
+
+        self.assertTrue(self.executor.cancel(owner, gracePeriod=5))
+
+        self.iterate(lambda: finished, timeout=0.5)
+        self.assertEqual(finished, [])
+        self.assertTrue(self.isAlive(childPid))
+
+        self.advance(5)
+
+        self.assertTrue(self.iterate(lambda: finished))
+        self.assertEqual(finished, [ -signal.SIGKILL ])
+        self.assertTrue(self.iterate(lambda: not self.isAlive(childPid)))
+        self.assertFalse(self.executor.isRunning(owner))
+
+    def testCancelReleasesSlot(self):
+        self.executor.maxWorkers = 1
+
+        firstOwner, secondOwner = object(), object()
+        firstFinished, secondFinished = [], []
+        self.spawn(firstOwner, [ "sleep", "60" ], firstFinished)
+        self.spawn(secondOwner, [ "true" ], secondFinished)
+
+        self.assertTrue(self.executor.isRunning(firstOwner))
+        self.assertTrue(self.executor.isQueued(secondOwner))
+
+        self.assertTrue(self.executor.cancel(firstOwner, gracePeriod=5))
+
+        self.assertTrue(self.iterate(lambda: secondFinished))
+        self.assertEqual(firstFinished, [ -signal.SIGTERM ])
+        self.assertEqual(secondFinished, [ 0 ])
+        self.assertFalse(self.executor.isRunning(firstOwner))
+        self.assertFalse(self.executor.isRunning(secondOwner))
+
+    def testCancelQueued(self):
+        self.executor.maxWorkers = 1
+
+        firstOwner, secondOwner = object(), object()
+        self.spawn(firstOwner, [ "sleep", "60" ], [])
+        secondTask = self.spawn(secondOwner, [ "true" ], [])
+
+        self.assertTrue(self.executor.cancel(secondOwner))
+        self.assertTrue(secondTask.done)
+        self.assertIsNone(secondTask.result)
+        self.assertFalse(self.executor.isQueued(secondOwner))
+
+    def testTimeoutStatus(self):
+        statePath = os.path.join(self.tempDir.name, "state.sqlite")
+        notificationService = NotificationService()
+
+        cronNotify = CronNotify(
+            [ [ "sleep", "60" ] ],
+            id="timeout",
+            runAsync=True,
+            scheduler=self.scheduler,
+            executor=self.executor,
+            stateStore=StateStore(statePath),
+            notificationService=notificationService
+        )
+        cronNotify.executionTimeout = 10
+        cronNotify.timeoutGrace = 5
+        cronNotify.runningNotification = False
+
+        cronNotify.run()
+        self.assertTrue(self.executor.isRunning(cronNotify))
+
+        self.advance(10)
+
+        self.assertTrue(self.iterate(lambda: not self.executor.isRunning(cronNotify)))
+
+        self.assertEqual(len(notificationService.shown), 1)
+        self.assertIn("timed out", notificationService.shown[0].message)
+
+        with sqlite3.connect(statePath) as connection:
+            statuses = [ row[0] for row in connection.execute("SELECT status FROM run_history") ]
+        self.assertEqual(statuses, [ "timeout" ])
+
+if __name__ == "__main__":
+    unittest.main()
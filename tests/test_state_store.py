@@ -0,0 +1,107 @@
+import datetime, os, tempfile, time, unittest
+
+from cron_notify import StateStore
+
+class StateStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.stateStore = StateStore(":memory:")
+
+    def addRuns(self, id, durations, status="success", startTime=1000000, maxAge=None):
+        for index, duration in enumerate(durations):
+            runStartTime = startTime + index * 3600
+            self.stateStore.addRun("app", id, runStartTime, runStartTime + duration, duration, status, {}, maxAge)
+
+    def countRuns(self, id):
+        return self.stateStore.getRunStatistics("app", id).runs
+
+    def testEmptyStatistics(self):
+        runStatistics = self.stateStore.getRunStatistics("app", "job")
+        self.assertEqual(runStatistics.runs, 0)
+        self.assertIsNone(runStatistics.failureRate)
+        self.assertIsNone(runStatistics.medianDuration)
+        self.assertIsNone(runStatistics.p95Duration)
+        self.assertIsNone(runStatistics.lastRun)
+
+    def testPercentiles(self):
+        # nearest-rank method: p50 of 1..20 is the 10th value, p95 is the 19th value
+        self.addRuns("job", [ 20 - index for index in range(20) ])
+
+        runStatistics = self.stateStore.getRunStatistics("app", "job")
+        self.assertEqual(runStatistics.medianDuration, 10)
+        self.assertEqual(runStatistics.p95Duration, 19)
+
+        self.stateStore = StateStore(":memory:")
+        self.addRuns("job", [ 30, 10, 20 ])
+
+        runStatistics = self.stateStore.getRunStatistics("app", "job")
+        self.assertEqual(runStatistics.medianDuration, 20)
+        self.assertEqual(runStatistics.p95Duration, 30)
+
+    def testPercentilesIgnoreFailedRuns(self):
+        self.addRuns("job", [ 10 ])
+        self.addRuns("job", [ 20 ], status="warning", startTime=2000000)
+        self.addRuns("job", [ 1000, 1000 ], status="error", startTime=3000000)
+        self.addRuns("job", [ 1000 ], status="timeout", startTime=4000000)
+
+        runStatistics = self.stateStore.getRunStatistics("app", "job")
+        self.assertEqual(runStatistics.medianDuration, 10)
+        self.assertEqual(runStatistics.p95Duration, 20)
+
+    def testFailureCounts(self):
+        self.addRuns("job", [ 10, 10 ])
+        self.addRuns("job", [ 10 ], status="warning", startTime=2000000)
+        self.addRuns("job", [ 10, 10 ], status="error", startTime=3000000)
+        self.addRuns("job", [ 10 ], status="timeout", startTime=4000000)
+        self.addRuns("job", [ 10 ], status="try_again", startTime=5000000)
+        self.addRuns("job", [ 10 ], status="cancelled", startTime=6000000)
+        self.addRuns("other", [ 10 ], status="error")
+
+        runStatistics = self.stateStore.getRunStatistics("app", "job")
+        self.assertEqual(runStatistics.runs, 8)
+        self.assertEqual(runStatistics.successfulRuns, 3)
+        self.assertEqual(runStatistics.failedRuns, 3)
+        self.assertEqual(runStatistics.failureRate, 3 / 8)
+        self.assertEqual(runStatistics.lastRun, datetime.datetime.fromtimestamp(6000000))
+
+    def testRetention(self):
+        self.addRuns("job", [ 10, 10, 10 ], maxAge=3 * 3600)
+        self.assertEqual(self.countRuns("job"), 3)
+
+        # a run removes the cronjob's runs that started more than maxAge before it ended
+        self.addRuns("job", [ 10 ], startTime=1000000 + 4 * 3600, maxAge=3 * 3600)
+        self.assertEqual(self.countRuns("job"), 2)
+
+        # a lower maxAge applies to older runs, too
+        self.addRuns("job", [ 10 ], startTime=1000000 + 5 * 3600, maxAge=60)
+        self.assertEqual(self.countRuns("job"), 1)
+
+    def testRetentionWithoutMaxAge(self):
+        self.addRuns("job", [ 10, 10 ])
+        self.addRuns("job", [ 10 ], startTime=1000000 + 365 * 86400)
+        self.assertEqual(self.countRuns("job"), 3)
+
+    def testRetentionOfOtherCronjobs(self):
+        # runs of other cronjobs expire, even if the cronjobs don't run anymore
+        self.addRuns("removed", [ 10 ], maxAge=3600)
+        self.addRuns("kept", [ 10 ])
+        self.addRuns("job", [ 10 ], startTime=1000000 + 2 * 3600, maxAge=86400)
+
+        self.assertEqual(self.countRuns("removed"), 0)
+        self.assertEqual(self.countRuns("kept"), 1)
+        self.assertEqual(self.countRuns("job"), 1)
+
+    def testRetentionOnOpen(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            statePath = os.path.join(tempDir, "state.sqlite")
+
+            self.stateStore = StateStore(statePath)
+            self.addRuns("current", [ 10 ], startTime=time.time() - 1800, maxAge=3600)
+            self.addRuns("expired", [ 10 ], startTime=time.time() - 7200, maxAge=3600)
+            self.assertEqual(self.countRuns("expired"), 1)
+
+            self.stateStore = StateStore(statePath)
+            self.assertEqual(self.countRuns("expired"), 0)
+            self.assertEqual(self.countRuns("current"), 1)
+
+if __name__ == "__main__":
+    unittest.main()
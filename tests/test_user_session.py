@@ -0,0 +1,343 @@
+import datetime, os, pwd, shutil, signal, subprocess, sys, tempfile, time, unittest
+
+from cron_notify import BusManager, Executor, Scheduler, SystemLoad, UserSession, VirtualClock
+
+try:
+    import dbus, dbus.mainloop.glib
+    from gi.repository import GLib
+except ImportError:
+    dbus = None
+
+DBUS_DAEMON = shutil.which("dbus-daemon")
+
+BUS_CONFIG = """<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-Bus Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:path={}</listen>
+  <auth>EXTERNAL</auth>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+</busconfig>
+"""
+
+# a notification server invoking the first action of every notification, and a logind with controllable sessions
+SERVER = """
+import sys, dbus, dbus.service, dbus.mainloop.glib
+from gi.repository import GLib
+
+dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+bus = dbus.bus.BusConnection(sys.argv[1])
+
+class Notifications(dbus.service.Object):
+    lastId = 0
+
+    @dbus.service.method("org.freedesktop.Notifications", in_signature="susssasa{sv}i", out_signature="u")
+    def Notify(self, app, replacesId, icon, summary, body, actions, hints, timeout):
+        self.lastId += 1
+        if actions:
+            GLib.timeout_add(50, self.ActionInvoked, self.lastId, actions[0])
+        return self.lastId
+
+    @dbus.service.method("org.freedesktop.Notifications", in_signature="u")
+    def CloseNotification(self, notificationId):
+        GLib.idle_add(self.NotificationClosed, notificationId, 3)
+
+    @dbus.service.method("org.freedesktop.Notifications", out_signature="as")
+    def GetCapabilities(self):
+        return [ "actions", "body" ]
+
+    @dbus.service.signal("org.freedesktop.Notifications", signature="us")
+    def ActionInvoked(self, notificationId, action):
+        pass
+
+    @dbus.service.signal("org.freedesktop.Notifications", signature="uu")
+    def NotificationClosed(self, notificationId, reason):
+        pass
+
+class Session(dbus.service.Object):
+    idleHint = False
+
+    @dbus.service.method(dbus.PROPERTIES_IFACE, in_signature="ss", out_signature="v")
+    def Get(self, interface, name):
+        return dbus.Boolean(self.idleHint)
+
+    @dbus.service.method("test.Session", in_signature="b")
+    def SetIdleHint(self, idleHint):
+        self.idleHint = idleHint
+        self.PropertiesChanged("org.freedesktop.login1.Session", { "IdleHint": dbus.Boolean(idleHint) }, [])
+
+    @dbus.service.signal(dbus.PROPERTIES_IFACE, signature="sa{sv}as")
+    def PropertiesChanged(self, interface, changedProperties, invalidatedProperties):
+        pass
+
+class User(dbus.service.Object):
+    display = ( "", "/" )
+
+    @dbus.service.method(dbus.PROPERTIES_IFACE, in_signature="ss", out_signature="v")
+    def Get(self, interface, name):
+        return dbus.Struct(( self.display[0], dbus.ObjectPath(self.display[1]) ), signature="so")
+
+class Manager(dbus.service.Object):
+    users = {}
+
+    def getUser(self, uid):
+        if uid not in self.users:
+            self.users[uid] = User(bus, "/org/freedesktop/login1/user/_{}".format(uid))
+        return self.users[uid]
+
+    @dbus.service.method("org.freedesktop.login1.Manager", in_signature="u", out_signature="o")
+    def GetUser(self, uid):
+        return self.getUser(uid).__dbus_object_path__
+
+    @dbus.service.method("test.Manager", in_signature="us")
+    def AddSession(self, uid, sessionId):
+        sessionPath = "/org/freedesktop/login1/session/" + sessionId
+        Session(bus, sessionPath)
+
+        self.getUser(uid).display = ( sessionId, sessionPath )
+        self.SessionNew(sessionId, sessionPath)
+
+    @dbus.service.signal("org.freedesktop.login1.Manager", signature="so")
+    def SessionNew(self, sessionId, sessionPath):
+        pass
+
+Notifications(bus, "/org/freedesktop/Notifications")
+Manager(bus, "/org/freedesktop/login1")
+bus.request_name("org.freedesktop.Notifications")
+bus.request_name("org.freedesktop.login1")
+
+print("ready", flush=True)
+GLib.MainLoop().run()
+"""
+
+def iterate(condition, timeout=10):
+    mainContext = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        if not mainContext.iteration(False):
+            time.sleep(0.01)
+    return True
+
+class PrivateBus(object):
+    def __init__(self, user=None):
+        self.tempDir = tempfile.mkdtemp()
+        self.address = "unix:path=" + os.path.join(self.tempDir, "bus")
+        self.processes = []
+
+        userArgs = {}
+        if user is not None:
+            os.chown(self.tempDir, user.pw_uid, user.pw_gid)
+            userArgs = { "user": user.pw_uid, "group": user.pw_gid, "extra_groups": [] }
+
+        configPath = os.path.join(self.tempDir, "bus.conf")
+        with open(configPath, "wt") as configFile:
+            configFile.write(BUS_CONFIG.format(os.path.join(self.tempDir, "bus")))
+
+        self.spawn([ DBUS_DAEMON, "--nofork", "--print-address", "--config-file=" + configPath ], **userArgs)
+
+    def spawn(self, command, **kwargs):
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                cwd=self.tempDir, **kwargs)
+        except OSError:
+            self.close()
+            raise unittest.SkipTest("Unable to run `{}`".format(command[0]))
+
+        self.processes.append(process)
+
+        if not process.stdout.readline():
+            self.close()
+            raise unittest.SkipTest("Unable to run `{}`".format(command[0]))
+
+        return process
+
+    def startServer(self):
+        self.spawn([ sys.executable, "-c", SERVER, self.address ])
+
+    def close(self):
+        for process in reversed(self.processes):
+            process.terminate()
+            process.wait()
+            process.stdout.close()
+
+        self.processes = []
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+@unittest.skipIf(dbus is None, "dbus-python or PyGObject is not installed")
+@unittest.skipIf(DBUS_DAEMON is None, "dbus-daemon is not installed")
+class UserSessionTest(unittest.TestCase):
+    def setUp(self):
+        dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.user = pwd.getpwuid(os.geteuid())
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def getForeignUser(self):
+        if os.geteuid() != 0:
+            self.skipTest("Impersonating other users requires root privileges")
+
+        try:
+            return pwd.getpwnam("nobody")
+        except KeyError:
+            self.skipTest("There's no user 'nobody'")
+
+    def testNotificationDelivery(self):
+        privateBus = PrivateBus()
+        self.addCleanup(privateBus.close)
+        privateBus.startServer()
+
+        session = UserSession(self.user.pw_name, busAddress=privateBus.address)
+        notificationService = session.notificationService
+        self.assertTrue(notificationService.init("cron-notify"))
+        self.assertIn("actions", notificationService.get_server_caps())
+
+        actions, closed = [], []
+        notification = notificationService.Notification("cron-notify", "It's time to execute cronjob!")
+        notification.add_action("start", "Start", lambda notification, action: actions.append(action))
+        notification.connect("closed", lambda notification: closed.append(notification))
+
+        self.assertTrue(notification.show())
+        self.assertNotEqual(notification.id, 0)
+
+        self.assertTrue(iterate(lambda: actions))
+        self.assertEqual(actions, [ "start" ])
+
+        notification.close()
+        self.assertTrue(iterate(lambda: closed))
+        self.assertIs(closed[0], notification)
+
+    def testImpersonatedBusConnection(self):
+        foreignUser = self.getForeignUser()
+
+        privateBus = PrivateBus(foreignUser)
+        self.addCleanup(privateBus.close)
+
+        session = UserSession(foreignUser.pw_name, busAddress=privateBus.address)
+        self.assertTrue(session.foreign)
+
+        bus = session.connectBus()
+        self.addCleanup(bus.close)
+        self.assertEqual(bus.get_unix_user(bus.get_unique_name()), foreignUser.pw_uid)
+
+        # the session bus rejects connections of other users, including root
+        with self.assertRaises(dbus.exceptions.DBusException):
+            dbus.bus.BusConnection(privateBus.address)
+
+    def testImpersonatedSpawn(self):
+        foreignUser = self.getForeignUser()
+        session = UserSession(foreignUser.pw_name)
+
+        outputPath = os.path.join(self.tempDir.name, "output")
+        executor = Executor(scheduler=Scheduler(VirtualClock(datetime.datetime(2024, 1, 1))))
+
+        spawnArgs = session.getSpawnArgs()
+        spawnArgs["cwd"] = self.tempDir.name
+
+        finished = []
+        with open(outputPath, "wt") as outputFile:
+            executor.spawn(
+                [ "sh", "-c", "id -u; id -g; echo \"$USER\"" ],
+                lambda process, resourceUsage: finished.append(process.returncode),
+                stdout=outputFile,
+                **spawnArgs
+            )
+
+        self.assertTrue(iterate(lambda: finished))
+        self.assertEqual(finished, [ 0 ])
+
+        with open(outputPath, "rt") as outputFile:
+            output = outputFile.read().split()
+        self.assertEqual(output, [ str(foreignUser.pw_uid), str(foreignUser.pw_gid), foreignUser.pw_name ])
+
+@unittest.skipIf(dbus is None, "dbus-python or PyGObject is not installed")
+@unittest.skipIf(DBUS_DAEMON is None, "dbus-daemon is not installed")
+class SessionIdleHintTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.privateBus = PrivateBus()
+        cls.privateBus.startServer()
+
+        # the private bus replaces the system bus; it mustn't take the tests down when it's closed
+        cls.systemBusAddress = os.environ.get("DBUS_SYSTEM_BUS_ADDRESS")
+        os.environ["DBUS_SYSTEM_BUS_ADDRESS"] = cls.privateBus.address
+
+        cls.busManager = BusManager()
+        cls.busManager.bus.set_exit_on_disconnect(False)
+
+        cls.bus = dbus.bus.BusConnection(cls.privateBus.address)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.bus.close()
+        cls.privateBus.close()
+
+        if cls.systemBusAddress is not None:
+            os.environ["DBUS_SYSTEM_BUS_ADDRESS"] = cls.systemBusAddress
+        else:
+            del os.environ["DBUS_SYSTEM_BUS_ADDRESS"]
+
+    def setUp(self):
+        self.systemLoad = SystemLoad(self.busManager, Scheduler(VirtualClock(datetime.datetime(2024, 1, 1))))
+
+    def callTest(self, path, interface, method, *args):
+        getattr(self.bus.get_object("org.freedesktop.login1", path), method)(*args, dbus_interface=interface)
+
+    def addSession(self, uid, sessionId):
+        self.callTest("/org/freedesktop/login1", "test.Manager", "AddSession", dbus.UInt32(uid), sessionId)
+
+    def setIdleHint(self, sessionId, idleHint):
+        self.callTest("/org/freedesktop/login1/session/" + sessionId, "test.Session", "SetIdleHint", idleHint)
+
+    def testIdleHintPerUser(self):
+        self.addSession(2001, "c1")
+        self.addSession(2002, "c2")
+        self.setIdleHint("c2", True)
+
+        self.assertTrue(self.systemLoad.isIdleAvailable(2001))
+        self.assertFalse(self.systemLoad.getIdleHint(2001))
+        self.assertFalse(self.systemLoad.isSatisfied(idle=True, uid=2001))
+
+        self.assertTrue(self.systemLoad.isIdleAvailable(2002))
+        self.assertTrue(self.systemLoad.getIdleHint(2002))
+        self.assertTrue(self.systemLoad.isSatisfied(idle=True, uid=2002))
+
+    def testIdleHintChange(self):
+        self.addSession(2003, "c3")
+
+        calls = []
+        callback = lambda: calls.append(self.systemLoad.isSatisfied(idle=True, uid=2003))
+        self.systemLoad.addWaiter(callback, idle=True, uid=2003)
+        self.addCleanup(self.systemLoad.removeWaiter, callback)
+        self.assertFalse(self.systemLoad.isSatisfied(idle=True, uid=2003))
+
+        self.setIdleHint("c3", True)
+        self.assertTrue(iterate(lambda: calls))
+        self.assertEqual(calls, [ True ])
+
+    def testUserWithoutGraphicalSession(self):
+        # without a graphical session, there's no idle hint to wait for
+        self.assertFalse(self.systemLoad.isIdleAvailable(2004))
+        self.assertTrue(self.systemLoad.isSatisfied(idle=True, uid=2004))
+
+        calls = []
+        callback = lambda: calls.append(self.systemLoad.isIdleAvailable(2004))
+        self.systemLoad.addWaiter(callback, idle=True, uid=2004)
+        self.addCleanup(self.systemLoad.removeWaiter, callback)
+
+        # the user's graphical session is resolved again after the user logged in
+        self.addSession(2004, "c4")
+        self.assertTrue(iterate(lambda: calls))
+        self.assertEqual(calls, [ True ])
+        self.assertFalse(self.systemLoad.isSatisfied(idle=True, uid=2004))
+
+if __name__ == "__main__":
+    unittest.main()